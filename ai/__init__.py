@@ -1 +1,6 @@
-from .command import CommandQueue, Command
+from .command import CommandQueue, DequeCommandQueue, Command, CommandPool, GroupCommand
+from .scheduler import Scheduler, TimerWheel, Timer
+from .spatial import SpatialIndex
+
+# the optional subsystems (ai.batch, ai.combat, ai.profiling, ai.sharding, ai.snapshot, ai.lod,
+# ai.memo, ai.sensors, ai.components, ai.telemetry, ai.replay) are imported from their modules.
@@ -0,0 +1,120 @@
+"""
+Batch stepping of behaviours: all the live behaviours are grouped by Behaviour subclass, and
+each group is stepped at once. Preconditions are evaluated through their vectorized versions
+(see mark.vectorized) over the whole group, and the next nodes are sampled for the whole group
+from a seeded numpy.random.Generator.
+Behaviours whose graph has non-vectorized preconditions (or update/abort hooks, or coroutine
+actions) fall back to the per-agent Behaviour.step.
+"""
+
+from collections import defaultdict
+import attr
+import numpy as np
+from .behaviours.behaviour import Behaviour, EXIT
+
+
+@attr.s(frozen=True)
+class _EdgeTable:
+    """outgoing edges of one node, laid out for scoring a group of behaviours at once"""
+    posts = attr.ib() # array of the distinct post indices
+    edges = attr.ib() # ((pre name or None, weight, column in posts), ...)
+
+    @classmethod
+    def build(cls, tm, node):
+        posts = []
+        edges = []
+        for pre, (_, weight, post) in zip(tm.pres[node], tm.edges[node]):
+            if post not in posts:
+                posts.append(post)
+            edges.append((pre, weight, posts.index(post)))
+        return cls(np.array(posts), tuple(edges))
+
+
+@attr.s
+class BatchStepper:
+    """
+    Steps every live top-level behaviour (i.e. not delegated to by another behaviour);
+    the step goes to the behaviour that is actually in control, as Behaviour.step would.
+    """
+    seed = attr.ib(default=None)
+    rng = attr.ib(init=False, repr=False)
+    _tables = attr.ib(factory=dict, init=False, repr=False) # (behaviour class, node) -> _EdgeTable
+
+    def __attrs_post_init__(self):
+        self.rng = np.random.default_rng(self.seed)
+
+    @staticmethod
+    def population():
+        """the behaviours in control, grouped by class"""
+        groups = defaultdict(list)
+        for b in list(Behaviour._live.values()):
+            if b._parent is not None and b._parent.sub is b:
+                continue # stepped through its parent
+            active = b.active
+            groups[type(active)].append(active)
+        return groups
+
+    def step(self, classes=None):
+        """steps all the live behaviours (of `classes`, if given); returns the number of behaviours stepped"""
+        stepped = 0
+        for cls, behaviours in self.population().items():
+            if classes is None or cls in classes:
+                self.step_group(cls, behaviours)
+                stepped += len(behaviours)
+        return stepped
+
+    def step_group(self, cls, behaviours):
+        tm = cls.tm
+        if not tm.batchable or tm.update is not None or tm.abort is not None or tm.asynchronous:
+            for b in behaviours:
+                b.step()
+            return
+
+        batch = []
+        for b in behaviours:
+            if b._next is not None:
+                b.step() # skip() overrides the transition rules
+            else:
+                batch.append(b)
+        if not batch:
+            return
+
+        states = np.fromiter((EXIT if b.state is None else b.state for b in batch), int, len(batch))
+        new = np.full(len(batch), EXIT)
+        for node in np.unique(states).tolist():
+            idx = np.flatnonzero(states == node)
+            if node == EXIT:
+                new[idx] = tm.root
+            elif tm.edges[node]:
+                new[idx] = self._choose(cls, node, [batch[i] for i in idx])
+            # leaves: out of the graph
+
+        for b, state in zip(batch, new.tolist()):
+            b.state = state
+            if state == EXIT:
+                b.halt()
+            else:
+                b._halted = False
+                tm.actions[state](b)
+
+    def _choose(self, cls, node, group):
+        key = (cls, node)
+        table = self._tables.get(key)
+        if table is None:
+            table = self._tables[key] = _EdgeTable.build(cls.tm, node)
+        if len(table.posts) == 1:
+            return table.posts[0]
+
+        scores = np.zeros((len(group), len(table.posts)))
+        values = {}
+        for pre, weight, col in table.edges:
+            scores[:, col] += weight
+            if pre is not None:
+                if pre not in values:
+                    values[pre] = cls.tm.vectorized[pre](group)
+                scores[:, col] += values[pre]
+
+        # the best post wins; ties are broken randomly
+        ties = scores == scores.max(axis=1, keepdims=True)
+        pick = np.where(ties, self.rng.random(scores.shape), -1).argmax(axis=1)
+        return table.posts[pick]
@@ -1,4 +1,4 @@
 from .behaviour import get_behaviours, Behaviour, TransitionModel, Transition, mark
 
-# import the modules containing the Behaviour subclasses = the actual behaviour implementations.
-from .ship_b import *
+# the modules containing the Behaviour subclasses (= the actual behaviour implementations)
+# are imported lazily by get_behaviours: see settings.behaviour_modules.
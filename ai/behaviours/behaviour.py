@@ -4,171 +4,313 @@ Each agent gets thus assigned the set of all behaviours that are to be made avai
 """
 
 
+import asyncio
+import inspect
 import random
+import weakref
+import importlib
 import attr
-from enum import Enum
+from collections import defaultdict
 from functools import wraps
+from operator import attrgetter, methodcaller
+from types import MappingProxyType
+import settings
+from logger import getLogger
+from .trace import TraceBuffer
+from ..memo import MEMO_PREFIX, memo, memoize_predicates
+from ..profiling import profiler
+from ..tasks import check_loop, log_exception, start_task
+
+try:
+    from importlib.metadata import entry_points
+except ImportError: # python < 3.8
+    entry_points = None
 
 
 Transition = attr.make_class('Transition', ['pre', 'weight', 'post'])
 
+# node index standing for 'out of the graph' (transitions with post=None)
+EXIT = -1
+
+
+logger = getLogger(__name__)
+
+
+# entry point group through which packages can provide behaviour modules: the entry point name
+# is the agent class name, its value the module to import.
+ENTRY_POINT_GROUP = 'behaviour_dummy.behaviours'
+
+# agent class name -> behaviour classes: the subclasses of the behaviour groups, i.e. of the
+# direct Behaviour subclasses having that _agentclass. Filled as the classes are defined.
+_registry = defaultdict(list)
+_cache = {} # agent class name -> tuple of behaviour classes; invalidated by new registrations
+_loaded = set() # agent class names whose behaviour modules have been imported
+
+
+def _register(cls):
+    for base in cls.__bases__:
+        if Behaviour in base.__bases__ and base._agentclass:
+            _registry[base._agentclass].append(cls)
+            _cache.pop(base._agentclass, None)
+
+
+def _behaviour_modules(name):
+    """the modules implementing the behaviours of agent class `name`: from settings.behaviour_modules
+    and from the ENTRY_POINT_GROUP entry points"""
+    modules = list(settings.behaviour_modules.get(name, ()))
+    if entry_points is not None:
+        eps = entry_points()
+        group = eps.select(group=ENTRY_POINT_GROUP) if hasattr(eps, 'select') else eps.get(ENTRY_POINT_GROUP, ())
+        modules += [ep.value for ep in group if ep.name == name]
+    return modules
+
 
 def get_behaviours(cls):
-    groups = [b for b in Behaviour.__subclasses__() if b._agentclass == cls.__name__]
-    return [a for b in groups for a in b.__subclasses__()]
+    """the behaviour classes for agent class cls; their modules are imported on first request"""
+    name = cls.__name__
+    try:
+        return _cache[name]
+    except KeyError:
+        pass
+    if name not in _loaded:
+        for module in _behaviour_modules(name):
+            importlib.import_module(module)
+        _loaded.add(name) # (not before: after a failed import, the next request tries again)
+    behaviours = _cache[name] = tuple(_registry[name])
+    return behaviours
 
 
 class mark:
-    """Collection of decorators to help the definition of behaviours."""
+    """Collection of decorators to help the definition of behaviours.
+    They only attach metadata to the methods: the transition model graph is compiled
+    out of it when the Behaviour subclass is created."""
 
     @staticmethod
     def trace(f):
         """Marks behaviour methods that we want to trace -- for following the graph traversal (debug)"""
+        if getattr(f, '_traced', False):
+            return f
+        name = f.__name__
         @wraps(f)
         def wrapper(self,*args,**kwargs):
-            self.trace.append(f)
-            f(self,*args,**kwargs)
+            trace = self.trace
+            if trace is not None: # (not sampled for tracing, otherwise)
+                trace.append(self.tm.trace_index[name])
+            return f(self,*args,**kwargs)
+        wrapper._traced = True
         return wrapper
 
     @staticmethod
     def action(f):
         """"Marks behaviour methods that represent transition model nodes"""
-        @wraps(f)
-        def wrapper(self,*args,**kwargs):
-            self.__class__.actions.append(f)
-            f(self,*args,**kwargs)
-        return wrapper
+        f._action = True
+        return f
 
     @staticmethod
     def transition(pre=None, weight=None, post=None, root=False):
         """"
         Marks behaviour methods that are part of the transition model graph.
-        pre: method name to call to determine whether this transition should be selected.
-        post: the next node in the behaviour graph.
+        pre: method (or property) name to call to determine whether this transition should be selected.
+        post: the name of the next node in the behaviour graph (None leaves the graph).
         weight: attach a probability weight (any number) to the transition.
         pass root=True to signal that this node is the root: to override the
         default root-finder (necessary foor cyclic, rootless behaviours)
         """
         def partial(f):
-            @wraps(f)
-            @mark.action # transition entails action and trace by default
-            @mark.trace
-            def wrapper(self,*args,**kwargs):
-
-                if root and not self.__root:
-                    print(f'setting __root to {f}')
-                    self.__root = f
-                elif self.__root:
-                    raise TypeError(f'cannot override: {self.__root.__name__} is {self}.root already')
-
-                pre = getattr(self.__class__, pre)
-                post = getattr(self.__class__, post)
-                weight = weight if weight else 0.5
-                self.__class__.tm.add(f, Transition(pre, weight, post))
-                f(self,*args,**kwargs)
-                # self.validate()
-            return wrapper
+            f = mark.action(mark.trace(f)) # transition entails action and trace by default
+            # decorators apply bottom-up: prepend, so that transitions keep the order they are written in
+            f._transitions = [Transition(pre, weight if weight else 0.5, post)] + getattr(f, '_transitions', [])
+            if root:
+                f._root = True
+            return f
+        return partial
+
+    @staticmethod
+    def volatile(f):
+        """
+        Marks a precondition that must not be memoized for the tick (see ai.memo): it has side
+        effects, or must see the changes made within the tick.
+        """
+        f._volatile = True
+        return f
+
+    @staticmethod
+    def vectorized(pre):
+        """
+        Marks a function as the vectorized version of the precondition `pre`, for batch stepping
+        (see ai.batch). It takes a sequence of behaviours and returns a numpy array with one value each.
+        Use it below @staticmethod.
+        """
+        def partial(f):
+            f._vectorizes = pre
+            return f
         return partial
 
     @staticmethod
     def abort(f):
         """"
-        registers global abort conditions checker methods within the behaviour
+        registers global abort conditions checker methods within the behaviour:
+        if it returns True, the behaviour halts.
         """
-        f = wraps(f)(mark.action(mark.trace(f))) # we stack action and trace decorators
-        f.__self__.tm.abort_condition = f
+        f = mark.trace(f)
+        f._abort = True
         return f
 
     @staticmethod
     def update(f):
         """"
-        registers an update method to the underlying transition model
+        registers an update method to the underlying transition model: it is called before each step.
         """
-        assert f.__self__.tm.__update is None, f'__update already defined for {f.__self__}'
-        f.__self__.tm.update = f
+        f._update = True
         return f
 
 
-@attr.s
-class TransitionModel:
-    """a behaviour execution graph"""
-    transitions = attr.ib(factory=dict, init=False)
-    __root = attr.ib(default=None, init=False)
-    __update = attr.ib(default=None, init=False)
+def _getter(cls, name):
+    """precomputes how to evaluate the precondition `name` on instances of cls"""
+    if name is None:
+        return None
+    if isinstance(getattr(cls, name, None), property):
+        return attrgetter(name)
+    return methodcaller(name)
 
-    def _find_root(self):
-        return [a for a in self.transitions if self.get_transitions_to(a) == []][0]
 
-    @property
-    def root(self):
-        if not self.__root:
-            self.__root = self._find_root()
-        return self.__root
+@attr.s(frozen=True)
+class TransitionModel:
+    """
+    A behaviour execution graph, compiled once per Behaviour subclass (see TransitionModel.compile).
 
-    def _find_leaves(self):
-        return [a for a in self.transitions if self.get_transitions_from(a) == [None]]
+    Nodes are the action methods of the behaviour, and are addressed by integer index; the
+    root, the leaves and the outgoing edges of every node are precomputed, so that a step only
+    touches the edges of the current node.
+    """
+    names = attr.ib(default=()) # node index -> method name
+    actions = attr.ib(default=(), repr=False) # node index -> function
+    index = attr.ib(default=MappingProxyType({}), repr=False) # method name -> node index
+    root = attr.ib(default=None)
+    leaves = attr.ib(default=()) # indices of the nodes without outgoing transitions
+    is_leaf = attr.ib(default=(), repr=False) # node index -> bool
+    edges = attr.ib(default=(), repr=False) # node index -> ((pre getter or None, weight, post index), ...)
+    pres = attr.ib(default=(), repr=False) # node index -> (pre name, ...), aligned with edges
+    vectorized = attr.ib(default=MappingProxyType({}), repr=False) # pre name -> batch version (see mark.vectorized)
+    # ids of the traced methods, as recorded in Behaviour.trace: the nodes come first, with the same index
+    trace_ids = attr.ib(default=(), repr=False) # id -> method name
+    trace_index = attr.ib(default=MappingProxyType({}), repr=False) # method name -> id
+    update = attr.ib(default=None) # name of the update method, if any
+    abort = attr.ib(default=None) # name of the abort condition checker, if any
+    asynchronous = attr.ib(default=False) # whether any action is a coroutine (see Behaviour.run)
+
+    @classmethod
+    def compile(cls, behaviour_cls):
+        nodes = {}
+        traced = {}
+        vectorized = {}
+        update = abort = None
+        for klass in reversed(behaviour_cls.__mro__):
+            for name, f in vars(klass).items():
+                if isinstance(f, staticmethod):
+                    f = f.__func__
+                if getattr(f, '_action', False):
+                    nodes[name] = f
+                if getattr(f, '_traced', False):
+                    traced[name] = f
+                if getattr(f, '_vectorizes', None):
+                    vectorized[f._vectorizes] = f
+                if getattr(f, '_update', False):
+                    update = name
+                if getattr(f, '_abort', False):
+                    abort = name
+
+        names = tuple(nodes)
+        index = {name: i for i, name in enumerate(names)}
+        trace_ids = names + tuple(name for name in traced if name not in index)
+        for name, f in nodes.items():
+            for t in getattr(f, '_transitions', ()):
+                if t.post is not None and t.post not in index:
+                    raise TypeError(f'{behaviour_cls.__name__}.{name}: unknown transition target {t.post!r}')
+
+        transitions = [getattr(nodes[name], '_transitions', ()) for name in names]
+        edges = tuple(
+            tuple((_getter(behaviour_cls, t.pre), t.weight, index[t.post] if t.post is not None else EXIT)
+                  for t in ts)
+            for ts in transitions)
+        pres = tuple(tuple(t.pre for t in ts) for ts in transitions)
+        is_leaf = tuple(not e for e in edges)
+
+        roots = [name for name in names if getattr(nodes[name], '_root', False)]
+        if len(roots) > 1:
+            raise TypeError(f'{behaviour_cls.__name__}: more than one root marked ({roots})')
+        if not roots:
+            # default root-finder: the first node no transition leads to
+            targets = {post for e in edges for _, _, post in e}
+            roots = [name for name in names if index[name] not in targets]
+
+        return cls(names=names,
+                   actions=tuple(nodes[name] for name in names),
+                   index=MappingProxyType(index),
+                   root=index[roots[0]] if roots else None,
+                   leaves=tuple(i for i, leaf in enumerate(is_leaf) if leaf),
+                   is_leaf=is_leaf,
+                   edges=edges,
+                   pres=pres,
+                   vectorized=MappingProxyType(vectorized),
+                   trace_ids=trace_ids,
+                   trace_index=MappingProxyType({name: i for i, name in enumerate(trace_ids)}),
+                   update=update,
+                   abort=abort,
+                   asynchronous=any(inspect.iscoroutinefunction(inspect.unwrap(f)) for f in nodes.values()))
 
     @property
-    def leaves(self):
-        return self._find_leaves()
+    def batchable(self):
+        """True if every precondition in the graph has a vectorized version"""
+        return all(pre is None or pre in self.vectorized for pres in self.pres for pre in pres)
 
     @property
-    def actions(self):
-        return list(self.transitions.keys()) + [self.leaves]
-
-    def add(self, action, conditions, weight, post):
-        if action not in self.transitions:
-            self.transitions[action] = {}
-        self.transitions[action].update({condition: post for condition in conditions})
-
-    def get_transitions_to(self, action):
-        for ori, ts in self.transitions.items():
-            for condition, post in ts:
-                if post == action:
-                    yield (ori, condition)
-
-    def get_transitions_from(self, action):
-        for ts in self.transitions[action]:
-            for condition, post in ts:
-                yield (condition, post)
-
-    def update(self):
-        if hasattr(self.__update):
-            return self.__update()
-
-    def step(self, current_state=None):
-        # if step is called without arguments we are at the root
-        if current_state is None:
-            print(f"{self}: started")
-            current_state = self.root
-
-        # terminate if we reach a leaf node
-        if current_state in self.leaves:
-            print(f"{self}: completed")
-
-        self.update()
-
-        candidates = self.get_transitions_from(current_state)
-
-        choicemap = {post: weight for pre, weight, post in candidates}
-        for pre, post in candidates:
-            # we preuate candidates based on their own pre rule
-            choicemap[post] = choicemap.get(post,0) + pre()
-
-        # sort choicemap by cumulative preuation of transition conditions
-        ranking = sorted(choicemap.items(), key=lambda x: choicemap[x[0]])
+    def transitions(self):
+        """node name -> list of Transition(pre name, weight, post name); for introspection"""
+        return {name: [Transition(pre, weight, self.names[post] if post != EXIT else None)
+                       for pre, (_, weight, post) in zip(self.pres[i], self.edges[i])]
+                for i, name in enumerate(self.names)}
+
+    def node(self, state):
+        """resolves a node given as index, name or method to its index"""
+        if state is None or isinstance(state, int):
+            return state
+        if not isinstance(state, str):
+            state = state.__name__
+        return self.index[state]
+
+    def step(self, behaviour, state=None, timed=None):
+        """
+        Chooses the node that follows `state` (None, or EXIT, for the root) and returns its index,
+        or EXIT if the graph is left.
+        Candidates are scored by weight + pre(); the best one wins, ties are broken randomly
+        (with behaviour.rng). timed(name, pre, behaviour), if given, evaluates the
+        preconditions instead (see ai.profiling).
+        """
+        if state is None or state == EXIT:
+            return self.root
+        edges = self.edges[state]
+        if not edges:
+            return EXIT # we reached a leaf
+        if len(edges) == 1:
+            return edges[0][2]
+
+        scores = {}
+        for name, (pre, weight, post) in zip(self.pres[state], edges):
+            if pre is not None:
+                weight += pre(behaviour) if timed is None else timed(name, pre, behaviour)
+            scores[post] = scores.get(post, 0) + weight
+        return self.best(scores, behaviour.rng)
 
-        top = [el for el in ranking if el[1] == ranking[-1][1]]
+    @staticmethod
+    def best(scores, rng=random):
+        """the node with the best score, in a {node index: score} mapping"""
+        best = max(scores.values())
+        top = [post for post, score in scores.items() if score == best]
         if len(top) > 1:
             # if there is more than one best choice, we choose randomly
-            return random.choice(top)
-        else:
-            # return best choice
-            return top[0]
-
-    def validate(self):
-        assert len(self._root) == 1
-        assert len(self._exit) == 1
+            return rng.choice(top)
+        return top[0]
 
 
 @attr.s
@@ -181,6 +323,8 @@ class Behaviour:
     When a Behaviour is evaluated it will determine, given the circumstances,
     what the best next action is.
     Behaviours have an enter and an exit states, which are the root and leaves of the graph.
+    The graph is compiled once, when the Behaviour subclass is created, into cls.tm; the
+    state of a behaviour is the index of the node it last executed.
 
     Behaviours can delegate to other behaviours, meaning they will step the other
     behaviour until its halt flag goes true. At that point they will resume stepping
@@ -192,47 +336,260 @@ class Behaviour:
         """raised when behaviour validation fails"""
         pass
 
+    # all the live behaviour instances, by id (see ai.batch)
+    _live = weakref.WeakValueDictionary()
+
     _agentclass = None # the class for which this behaviour (subclass) is meant
+    _timer = None # settings.timers entry at which the behaviour is stepped (None: every frame)
+    _trace_rate = None # fraction of the instances that keep a trace; None means settings.trace_sample_rate
+    _lod_summary = None # name of a cheap method standing in for step() in the slowed-down AI LOD tiers (see ai.lod)
+    tm = TransitionModel() # compiled for each subclass
 
     agent = attr.ib(init=True) # the actor behind this behaviour
-    tm = attr.ib(factory=TransitionModel, init=False, repr=False)
     transitions = property(lambda self: self.tm.transitions)
-    trace = attr.ib(factory=list, init=False, repr=False)
+    # last traced methods (ids in tm.trace_ids), if this instance is sampled for tracing; else None
+    trace = attr.ib(default=attr.Factory(lambda self: self._new_trace(), takes_self=True), init=False, repr=False)
     state = attr.ib(default=None, init=False)
+    sub = attr.ib(default=None, init=False, repr=False) # behaviour we delegated to, if any
 
     # flag to terminate behaviour execution
     _halted = attr.ib(default=False, init=False)
+    # node to go to at the next step, overriding the transition rules (see skip())
+    _next = attr.ib(default=None, init=False, repr=False)
+    # behaviour that delegated to self, if any
+    _parent = attr.ib(default=None, init=False, repr=False)
+    # task running the current (coroutine) action, if any: the behaviour does not step until it is done
+    _busy = attr.ib(default=None, init=False, repr=False)
+    # whether self came from the behaviour_pool, and goes back to it once replaced (see delegate)
+    _pooled = attr.ib(default=False, init=False, repr=False)
+
+    def __attrs_post_init__(self):
+        Behaviour._live[id(self)] = self
+
+    def __setstate__(self, state):
+        # unpickled (e.g. along with its agent, migrating to another process)
+        self.__dict__.update(state)
+        Behaviour._live[id(self)] = self
+
+    def _new_trace(self):
+        old = self.__dict__.get('trace')
+        if old is not None: # reinitialized in place (see reset): the buffer is reused
+            old.clear()
+            return old
+        rate = self._trace_rate if self._trace_rate is not None else settings.trace_sample_rate
+        if rate >= 1 or (rate > 0 and random.random() < rate):
+            return TraceBuffer(settings.trace_capacity)
+        return None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.tm = TransitionModel.compile(cls)
+        memoize_predicates(cls)
+        _register(cls)
+
+    @property
+    def rng(self):
+        """random stream of the choices of the behaviour: the agent's (see ControllableObject.rng)"""
+        return getattr(self.agent, 'rng', random)
+
+    @property
+    def node(self):
+        """name of the current node"""
+        return self.tm.names[self.state] if self.state not in (None, EXIT) else None
 
     def step(self):
         """
-        steps the underlying transition model.
+        steps the underlying transition model: moves to the next node and executes it.
         If a sub_behaviour is present, it takes control.
         """
-        if self.sub and not self.sub._halted:
+        if self.sub is not None and not self.sub._halted:
             return self.sub.step()
-
-        self.state = self.tm.step(self.state)
+        if self._busy is not None:
+            if not self._busy.done():
+                return
+            log_exception(self._busy, logger, self, self.node)
+            self._busy = None
+        if profiler.enabled:
+            return profiler.step(self)
+
+        state = self._advance(self.tm.step)
+        if state is not None:
+            result = self.tm.actions[state](self)
+            if result is not None:
+                self._await(result)
+
+    def _await(self, result):
+        """an action returned result: if it is awaitable (a coroutine action), it is run as a task,
+        which the behaviour waits for before stepping on"""
+        if inspect.isawaitable(result):
+            self._busy = start_task(result)
+
+    def _advance(self, choose):
+        """
+        runs the update and abort hooks, and moves to the next node (as chosen by
+        `choose`, i.e. TransitionModel.step, unless skip()ped to): returns it, or None if
+        there is nothing to execute.
+        """
+        tm = self.tm
+        if tm.update is not None:
+            getattr(self, tm.update)()
+        if tm.abort is not None and getattr(self, tm.abort)():
+            return self.halt()
+
+        state = self._next if self._next is not None else choose(self, self.state)
+        if tm.asynchronous and state != EXIT:
+            # a coroutine action needs a running event loop: without one, we do not move at all
+            check_loop(tm.actions[state])
+        self._next = None
+        self.state = state
+        if state == EXIT:
+            logger.debug(self, 'completed')
+            return self.halt()
+        if state == tm.root:
+            logger.debug(self, 'started')
+        self._halted = False
+        return state
 
     def skip(self, state):
-        """allows to override transition rules"""
-        self.state = state
+        """allows to override transition rules: `state` (a node, or its name) is executed at the next step"""
+        self._next = self.tm.node(state)
 
-    def delegate(self, sub_behaviour):
+    def reset(self, **args):
+        """
+        reinitializes self in place, as if constructed anew with args (and self.agent, unless
+        given): the init arguments are set from args, and everything else back to its default
+        """
+        if self._busy is not None:
+            self._busy.cancel()
+        if memo.active: # (values cached earlier in the tick are stale)
+            for name in [name for name in self.__dict__ if name.startswith(MEMO_PREFIX)]:
+                del self.__dict__[name]
+        args.setdefault('agent', self.agent)
+        self.__init__(**args)
+        return self
+
+    def delegate(self, sub_behaviour, **args):
+        """
+        hands control over to sub_behaviour until it halts. If sub_behaviour is a Behaviour
+        subclass, it is taken from the behaviour_pool (reset with self.agent and args) and
+        goes back to it once replaced by the next delegation.
+        """
+        old = self.sub
+        if old is not None and old._pooled and old is not sub_behaviour:
+            behaviour_pool.release(old)
+        if isinstance(sub_behaviour, type):
+            sub_behaviour = behaviour_pool.acquire(sub_behaviour, self.agent, **args)
         self.sub = sub_behaviour
+        sub_behaviour._parent = self
+
+    @property
+    def stack(self):
+        """the delegation stack: self, the sub-behaviour it delegated to, and so on down to the active one"""
+        stack = [self]
+        while stack[-1].sub is not None and not stack[-1].sub._halted:
+            stack.append(stack[-1].sub)
+        return stack
+
+    @property
+    def active(self):
+        """the behaviour that is actually in control: self, or the sub-behaviour we delegated to"""
+        b = self
+        while b.sub is not None and not b.sub._halted:
+            b = b.sub
+        return b
 
     def halt(self):
         """gives control back to super-behaviour if present -- or has no effect whatsoever"""
         self._halted = True
+        if self._busy is not None:
+            self._busy.cancel()
+            self._busy = None
+
+    @property
+    def period(self):
+        """seconds between two steps, as given by _timer"""
+        return settings.timers[self._timer] / 1000 if self._timer else 1 / settings.FPS
+
+    async def run(self, period=None):
+        """
+        Steps the behaviour, every `period` seconds (default: self.period), until it halts.
+        Coroutine actions are awaited before the next step; they can themselves await
+        sub-behaviours (`await SubBehaviour(self.agent)`), instead of delegating to them.
+        """
+        period = self.period if period is None else period
+        self._halted = False
+        while not self._halted:
+            self.step()
+            busy = self.active._busy
+            if busy is not None:
+                await asyncio.wait([busy])
+            else:
+                await asyncio.sleep(period)
+
+    def __await__(self):
+        """awaiting a behaviour runs it until it halts (see run)"""
+        return self.run().__await__()
 
     def update(self):
         """subclass this method to write belief management or precondition checking
         (i.e. decide whether to halt()) or delegate()"""
         pass
 
+    def _validate(self):
+        tm = self.tm
+        assert tm.names, 'no actions defined'
+        assert tm.root is not None, 'no root found: mark one with @mark.transition(root=True)'
+        for pre in (pre for pres in tm.pres for pre in pres if pre is not None):
+            assert hasattr(self, pre), f'unknown precondition {pre!r}'
+
     def validate(self):
         for cls in self.__class__.mro():
-            if hasattr(cls, '_validate'):
+            if '_validate' in vars(cls):
                 try:
                     cls._validate(self)
                 except AssertionError as e:
                     raise Behaviour.ValidationError(f'{self} failed validation at {cls} level: {e}')
+
+
+@attr.s
+class BehaviourPool:
+    """
+    Free lists of sub-behaviours, by class, for reuse: see Behaviour.delegate.
+    A pooled behaviour is released when its parent delegates to the next one, so it must not
+    be held on to (but through its parent's sub) once halted.
+    """
+    size = attr.ib(default=attr.Factory(lambda: settings.behaviour_pool_size)) # max free behaviours kept per class
+    created = attr.ib(default=0, init=False) # number of behaviours allocated because the pool was empty
+    reused = attr.ib(default=0, init=False)
+    _free = attr.ib(factory=lambda: defaultdict(list), init=False, repr=False) # class -> free behaviours
+
+    def __len__(self):
+        return sum(map(len, self._free.values()))
+
+    def acquire(self, cls, agent, **args):
+        free = self._free.get(cls)
+        if free:
+            self.reused += 1
+            b = free.pop().reset(agent=agent, **args)
+        else:
+            self.created += 1
+            b = cls(agent, **args)
+        b._pooled = True
+        return b
+
+    def release(self, b):
+        if b.sub is not None and b.sub._pooled:
+            self.release(b.sub)
+        b.halt()
+        b._parent = b.sub = None
+        Behaviour._live.pop(id(b), None) # (not to be batch-stepped, nor traced, while free)
+        free = self._free[type(b)]
+        if len(free) < self.size:
+            free.append(b)
+
+    def clear(self):
+        self._free.clear()
+        self.created = self.reused = 0
+
+
+behaviour_pool = BehaviourPool()
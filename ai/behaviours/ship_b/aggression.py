@@ -1,27 +1,49 @@
-import random
 import attr
+import numpy as np
 from . import ShipBehaviour, Behaviour, mark
+from ...combat import fraction_in_range, paired_fraction_in_range
+from ...memo import memoized
 
 
 @attr.s
 class Aggressive(ShipBehaviour):
     """Endless search and target loop.
     Spawns alternate Search and ApproachAndAttack behaviours, forever."""
+    _timer = 'fight_update_timer'
     found = attr.ib(init=False, default=None)
 
     @mark.transition(post='kill', root=True) # need to mark the root, because this graph is cyclic
     def search(self):
-        candidates = self.agent.scan()
-        if candidates:
-            self.found = sorted(candidates, key=lambda x: self.agent.distance(x))[0]
+        world = getattr(self.agent, 'world', None)
+        sensors = getattr(world, 'sensors', None)
+        spatial = getattr(world, 'spatial', None)
+        if sensors is not None and self.agent in sensors.tracks:
+            # the contacts of the world-level sensor sweep (shared with the fleet, if any)
+            candidates = [c for c in sensors.contacts(self.agent) if self.hostile(c)]
+            self.found = min(candidates, key=self.agent.distance) if candidates else None
+        elif spatial is not None:
+            # single nearest-neighbour lookup in the world's index
+            nearest = spatial.nearest(self.agent.pos, radius=getattr(self.agent, 'scan_range', None),
+                                      exclude=self.agent, predicate=self.hostile)
+            self.found = nearest[0] if nearest else None
+        else:
+            candidates = self.agent.scan()
+            self.found = min(candidates, key=self.agent.distance) if candidates else None
+        if self.found is not None:
             self.skip(self.kill) # jump to kill routine
 
+    def hostile(self, other):
+        """whether other is a valid target"""
+        return not getattr(other, 'destroyed', False)
+
     @mark.transition(post='search')
     def kill(self):
-        # choose a more specific sub-behaviour to implement
-        aggressive_sub = ApproachAndAttack(self.agent, self.found)
-        # delegate execution
-        self.delegate(aggressive_sub)
+        if self.found is None:
+            # nothing to kill: back to searching
+            self.skip(self.search)
+            return
+        # delegate execution to a more specific sub-behaviour (recycled from the pool)
+        self.delegate(ApproachAndAttack, target=self.found)
 
 
 @attr.s
@@ -36,16 +58,36 @@ class ApproachAndAttack(Behaviour):
     def enemyoutofrange(self):
         return self.enemyinrange() == 0
 
+    @memoized # (evaluated twice per choice: as is, and through enemyoutofrange)
     def enemyinrange(self):
-        ranges = [h.range for h in self.agent.hardpoints]
-        dist = self.agent.pos - self.target.pos # fix
-        inrange = [r for r in ranges if r < dist]
-        return len(inrange) / len(ranges) == 0
+        """fraction of the hardpoints that have the target in range"""
+        return fraction_in_range(self.agent, self.agent.distance(self.target))
+
+    def enemydestroyed(self):
+        return self.target.destroyed
+
+    # vectorized preconditions, for batch stepping (see ai.batch)
+
+    @staticmethod
+    @mark.vectorized('enemyinrange')
+    def enemyinrange_batch(behaviours):
+        return paired_fraction_in_range([b.agent for b in behaviours], [b.target for b in behaviours])
+
+    @staticmethod
+    @mark.vectorized('enemyoutofrange')
+    def enemyoutofrange_batch(behaviours):
+        return ApproachAndAttack.enemyinrange_batch(behaviours) == 0
+
+    @staticmethod
+    @mark.vectorized('enemydestroyed')
+    def enemydestroyed_batch(behaviours):
+        return np.fromiter((b.target.destroyed for b in behaviours), bool, len(behaviours))
 
     @mark.transition(pre='enemyoutofrange', post='approach')
     @mark.transition(pre='enemyinrange', post='attack')
     def choosetarget(self):
-        self.target = self.agent
+        if self.target is None:
+            self.target = min(self.get_possible_targets(), key=self.agent.distance)
 
     @mark.transition(pre='enemyoutofrange', post='approach')
     @mark.transition(pre='enemyinrange', post='attack')
@@ -53,6 +95,8 @@ class ApproachAndAttack(Behaviour):
     def approach(self):
         self.agent.move(self.target.pos)
 
+    @mark.transition(pre='enemyoutofrange', post='approach')
+    @mark.transition(pre='enemyinrange', post='attack')
     @mark.transition(pre='enemydestroyed', post=None)
     def attack(self):
         self.agent.attack(self.target)
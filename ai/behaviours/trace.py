@@ -0,0 +1,142 @@
+"""
+Bounded traces of the behaviour graph traversal (see mark.trace), and their export for
+offline analysis.
+"""
+
+import json
+import struct
+import sys
+from array import array
+import settings
+
+
+class TraceBuffer:
+    """
+    Fixed-capacity ring buffer of node ids (see TransitionModel.trace_ids): once full, each
+    new entry overwrites the oldest one.
+    """
+    __slots__ = ('_ids', '_next', 'total')
+
+    def __init__(self, capacity=None):
+        self._ids = array('h', [0]) * (capacity or settings.trace_capacity)
+        self._next = 0
+        self.total = 0 # number of entries ever appended
+
+    @property
+    def capacity(self):
+        return len(self._ids)
+
+    def __len__(self):
+        return min(self.total, len(self._ids))
+
+    def __iter__(self):
+        """oldest entry first"""
+        if self.total <= len(self._ids):
+            return iter(self._ids[:self.total])
+        return iter(self._ids[self._next:] + self._ids[:self._next])
+
+    def __repr__(self):
+        return f'<TraceBuffer {list(self)}>'
+
+    def append(self, node_id):
+        self._ids[self._next] = node_id
+        self._next = (self._next + 1) % len(self._ids)
+        self.total += 1
+
+    def recent(self, n=None):
+        """the last n entries (all of them, by default), oldest first"""
+        ids = list(self)
+        return ids if n is None else ids[-n:]
+
+    def clear(self):
+        self._next = self.total = 0
+
+
+def _traced(behaviours):
+    return [b for b in behaviours if b.trace is not None and len(b.trace)]
+
+
+def _class_name(b):
+    """'module:qualname' of the class of b (classes of the same name, in different modules, stay apart)"""
+    cls = type(b)
+    return f'{cls.__module__}:{cls.__qualname__}'
+
+
+def _agent_id(agent):
+    return getattr(agent, 'uid', id(agent))
+
+
+def export_traces(path, behaviours=None, fmt='jsonl', n=None):
+    """
+    Writes the recent traces (the last n entries; all the buffer, by default) of behaviours
+    (all the live ones, by default) to path. Returns the number of traces written.
+    fmt='jsonl': one {"behaviour" ('module:qualname'), "agent", "total", "nodes": [node names]}
+    object per line.
+    fmt='bin': see read_binary_traces.
+    """
+    if behaviours is None:
+        from .behaviour import Behaviour
+        behaviours = list(Behaviour._live.values())
+    behaviours = _traced(behaviours)
+
+    if fmt == 'jsonl':
+        with open(path, 'w') as f:
+            for b in behaviours:
+                names = b.tm.trace_ids
+                f.write(json.dumps({'behaviour': _class_name(b),
+                                    'agent': _agent_id(b.agent),
+                                    'total': b.trace.total,
+                                    'nodes': [names[i] for i in b.trace.recent(n)]}) + '\n')
+    elif fmt == 'bin':
+        _write_binary(path, behaviours, n)
+    else:
+        raise ValueError(f'unknown trace format {fmt!r}')
+    return len(behaviours)
+
+
+# binary layout: MAGIC, header length (I), JSON header {'module:qualname': [node names]}, then one
+# record per trace: class index (H), agent id (q), total (Q), number of ids (H), node ids (h each).
+# All little-endian.
+MAGIC = b'BTRC'
+_RECORD = struct.Struct('<HqQH')
+
+
+def _write_binary(path, behaviours, n):
+    classes = {}
+    for b in behaviours:
+        classes.setdefault(_class_name(b), list(b.tm.trace_ids))
+    class_index = {name: i for i, name in enumerate(classes)}
+    header = json.dumps(classes).encode()
+    with open(path, 'wb') as f:
+        f.write(MAGIC + struct.pack('<I', len(header)) + header)
+        for b in behaviours:
+            ids = array('h', b.trace.recent(n))
+            if sys.byteorder == 'big':
+                ids.byteswap()
+            f.write(_RECORD.pack(class_index[_class_name(b)], _agent_id(b.agent), b.trace.total, len(ids)))
+            f.write(ids.tobytes())
+
+
+def read_binary_traces(path):
+    """reads back a fmt='bin' export, as the same dicts the jsonl export writes"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data[:4] != MAGIC:
+        raise ValueError(f'{path} is not a binary trace export')
+    size, = struct.unpack_from('<I', data, 4)
+    offset = 8 + size
+    classes = json.loads(data[8:offset])
+    names = list(classes)
+    traces = []
+    while offset < len(data):
+        cls, agent, total, count = _RECORD.unpack_from(data, offset)
+        offset += _RECORD.size
+        ids = array('h')
+        ids.frombytes(data[offset:offset + 2 * count])
+        if sys.byteorder == 'big':
+            ids.byteswap()
+        offset += 2 * count
+        nodes = classes[names[cls]]
+        traces.append({'behaviour': names[cls], 'agent': agent, 'total': total,
+                       'nodes': [nodes[i] for i in ids]})
+    return traces
@@ -0,0 +1,106 @@
+"""
+Range checks between armed agents and their targets, over numpy arrays.
+"""
+
+from bisect import bisect_left
+import numpy as np
+
+
+class Armed:
+    """
+    Mixin for agents carrying hardpoints.
+    The hardpoint ranges are kept, sorted, in a compact numpy array (self.hardpoint_ranges),
+    which is rebuilt whenever the loadout changes: i.e. when hardpoints are set, equipped
+    or unequipped. If a hardpoint's range changes in place, call refit().
+    """
+    _hardpoints = ()
+    hardpoint_ranges = np.empty(0)
+    _ranges = () # same, as a tuple: cheaper than numpy for one-off scalar checks
+
+    @property
+    def hardpoints(self):
+        return self._hardpoints
+
+    @hardpoints.setter
+    def hardpoints(self, hardpoints):
+        self._hardpoints = tuple(hardpoints)
+        self.refit()
+
+    def equip(self, hardpoint):
+        self.hardpoints = self._hardpoints + (hardpoint,)
+
+    def unequip(self, hardpoint):
+        self.hardpoints = tuple(h for h in self._hardpoints if h is not hardpoint)
+
+    def refit(self):
+        ranges = np.fromiter((h.range for h in self._hardpoints), float, len(self._hardpoints))
+        ranges.sort()
+        self.hardpoint_ranges = ranges
+        self._ranges = tuple(ranges.tolist())
+
+
+def hardpoint_ranges(agent):
+    """the sorted hardpoint ranges of agent (also for agents that are not Armed)"""
+    ranges = getattr(agent, 'hardpoint_ranges', None)
+    if ranges is None:
+        ranges = np.sort(np.fromiter((h.range for h in agent.hardpoints), float, len(agent.hardpoints)))
+    return ranges
+
+
+def positions(objs):
+    """the .pos of objs, as an (n, 2) array"""
+    store = getattr(type(objs[0]), 'components', None) if len(objs) else None
+    if store is not None and 'pos' in store.fields and all(cls.components is store for cls in set(map(type, objs))):
+        return store.gather('pos', objs) # (see ai.components)
+    return np.fromiter((c for o in objs for c in o.pos), float, 2 * len(objs)).reshape(len(objs), 2)
+
+
+def fraction_in_range(agent, dist):
+    """fraction of the hardpoints of agent that reach `dist`"""
+    ranges = getattr(agent, '_ranges', None)
+    if ranges is None:
+        ranges = sorted(h.range for h in agent.hardpoints)
+    if not ranges:
+        return 0.
+    return (len(ranges) - bisect_left(ranges, dist)) / len(ranges)
+
+
+def _flat_ranges(agents):
+    """the hardpoint ranges of all agents, concatenated; and the number of hardpoints of each"""
+    ranges = [hardpoint_ranges(a) for a in agents]
+    counts = np.fromiter((len(r) for r in ranges), int, len(ranges))
+    return (np.concatenate(ranges) if ranges else np.empty(0)), counts
+
+
+def _per_agent(inrange, counts):
+    """sums the per-hardpoint inrange rows by agent, and normalises by the number of hardpoints"""
+    if inrange.ndim == 1:
+        owners = np.repeat(np.arange(len(counts)), counts)
+        totals = np.bincount(owners, weights=inrange, minlength=len(counts))
+    else:
+        totals = np.zeros((len(counts), inrange.shape[1]))
+        armed = counts > 0
+        if armed.any():
+            starts = np.cumsum(counts) - counts
+            totals[armed] = np.add.reduceat(inrange, starts[armed], axis=0)
+        counts = counts[:, None]
+    return np.divide(totals, counts, out=np.zeros_like(totals), where=counts > 0)
+
+
+def paired_fraction_in_range(agents, targets):
+    """for each agent, the fraction of its hardpoints that have the corresponding target in range"""
+    offsets = positions(agents) - positions(targets)
+    dist = np.hypot(offsets[:, 0], offsets[:, 1])
+    ranges, counts = _flat_ranges(agents)
+    return _per_agent(ranges >= np.repeat(dist, counts), counts)
+
+
+def fleet_fraction_in_range(agents, targets):
+    """
+    For a whole fleet against a set of targets: the fraction of the hardpoints of each agent
+    that have each target in range, as an array of shape (len(agents), len(targets)).
+    """
+    offsets = positions(agents)[:, None, :] - positions(targets)[None, :, :]
+    dist = np.hypot(offsets[..., 0], offsets[..., 1])
+    ranges, counts = _flat_ranges(agents)
+    return _per_agent(ranges[:, None] >= np.repeat(dist, counts, axis=0), counts)
@@ -1,14 +1,32 @@
+import asyncio
 import attr
-from collections import deque, defaultdict, namedtuple
+import heapq
+import inspect
+import itertools
+import random
+from collections import deque, namedtuple
 import settings
 from logger import getLogger
 from .behaviours import get_behaviours
+from .tasks import NoLoopError, check_loop, log_exception, start_task
 
 
 logger = getLogger(__name__)
 
 
-command_dir = namedtuple('commands', 'incoming outgoing')
+command_dir = namedtuple('command_dir', 'incoming outgoing')
+
+
+class _Signalled:
+    def __repr__(self):
+        return 'SIGNALLED'
+
+    def __reduce__(self):
+        return 'SIGNALLED' # unpickles to the module singleton
+
+# completion_check of the commands whose completion is signalled by calling cmd.resolve(),
+# instead of being polled for
+SIGNALLED = _Signalled()
 
 
 class ControllableObject:
@@ -17,18 +35,74 @@ class ControllableObject:
     that can be overridden by human control).
     """
 
+    # backend for the incoming and outgoing command queues
+    _queue_factory = None # None means CommandQueue
+
+    # periodic jobs run by ai.scheduler.Scheduler: method name -> settings.timers entry
+    # (None means every frame). Jobs the agent does not implement are skipped.
+    _timers = {'update': None, 'scan': 'scan_rate'}
+    world = None # the Scheduler owning this agent, if any
+    command_pool = None # a CommandPool to recycle the commands we emit and execute, if any
+    _uids = itertools.count() # source of the agents' uids (see ai.sharding)
+    _wakeup = None # asyncio.Event, while run_commands() runs
+    recorder = None # an ai.replay.Recorder logging the commands, if any
+    telemetry = None # the ai.telemetry.Telemetry timing the commands, while enabled
+    _rng = None
+    # an ai.components.ComponentStore holding the hot state of the instances (opt-in, per class)
+    components = None
+
+    @staticmethod
+    def seed_uids(first=0, step=1):
+        """the agents created from now on get the uids first, first + step, ... (see ai.replay and
+        ai.sharding: worlds built the same way after the same seed_uids get the same uids)"""
+        ControllableObject._uids = itertools.count(first, step)
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if cls.__dict__.get('components') is not None:
+            cls.components.register(cls)
+
     def __init__(self):
+        self.uid = next(ControllableObject._uids) # identifies the agent, also across processes
         self.behaviours = []
-        self.commands = command_dir(CommandQueue(self), CommandQueue(self))
+        factory = self._queue_factory or CommandQueue
+        self.commands = command_dir(factory(self), factory(self))
         self.executing = None
         try:
             pri = settings.command_priority_order.index(self.__class__.__name__.lower())
         except:
-            error(f'command priority order for {self.__class__} unset')
+            logger.error(f'command priority order for {self.__class__} unset')
             pri = 0
         self._cmd_priority = pri
         self.gather_behaviours()
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('world', None) # set again by the Scheduler the agent is added to
+        state.pop('_wakeup', None)
+        if state.pop('_eid', None) is not None: # (the stored fields travel as plain values)
+            state.update((name, getattr(self, name)) for name in self.components.fields)
+        return state
+
+    def __setstate__(self, state):
+        if self.components is not None:
+            stored = {name: state.pop(name) for name in self.components.fields if name in state}
+            self.__dict__.update(state)
+            for name, value in stored.items():
+                setattr(self, name, value)
+        else:
+            self.__dict__.update(state)
+
+    @property
+    def rng(self):
+        """random stream of the agent and its behaviours: seeded with settings.ai_seed and the
+        uid, if ai_seed is set; else the global random module"""
+        if self._rng is None:
+            if settings.ai_seed is None:
+                return random
+            self._rng = random.Random(f'{settings.ai_seed}/{self.uid}')
+        return self._rng
+
     def gather_behaviours(self):
         b_factories = get_behaviours(self.__class__)
         for b in b_factories:
@@ -41,75 +115,250 @@ class ControllableObject:
         b = b_factory(self)
         b.validate() # check that some preconditions hold
         self.behaviours.append(b)
+        if self.world is not None:
+            self.world.add_behaviour(self, b)
         return b
 
     def execute_next_command(self):
+        """
+        Starts the next incoming command. A coroutine action needs a running event loop (see
+        run_commands): without one, NoLoopError is raised and the command stays queued.
+        """
+        incoming = self.commands.incoming
         try:
-            cmd = self.commands.incoming.get_next_command()
-        except self.commands.incoming.EmptyQueueError as e:
-            print(f'no commands: {self} is idling.')
+            check_loop(incoming.get_next_command(keep=True).action)
+            cmd = incoming.get_next_command()
+        except incoming.EmptyQueueError:
+            logger.debug('no commands:', self, 'is idling.')
             return
 
-        cmd.execute()
+        source = cmd.source # (the command may complete, and go back to the pool, while executing)
         self.executing = cmd
+        if self.recorder is not None:
+            self.recorder.executed(cmd)
+        telemetry = self.telemetry
+        if telemetry is not None:
+            telemetry.dequeued(cmd)
+        result = cmd.execute()
+        if telemetry is not None:
+            telemetry.executed(cmd)
+        if result is not None and inspect.isawaitable(result):
+            # coroutine action: runs as a task on the running event loop; done when it returns
+            cmd.completion_check = SIGNALLED
+            start_task(result).add_done_callback(cmd._task_done)
         # inform the sender that the order has been carried out.
-        cmd.source._handle_command_execution(cmd)
+        source._handle_command_execution(cmd)
         return cmd
 
+    def _finish_command(self, cmd):
+        """the command we were executing is done"""
+        self.executing = None
+        if self.recorder is not None:
+            self.recorder.completed(cmd)
+        if self.telemetry is not None:
+            self.telemetry.completed(cmd)
+        if cmd.group is not None:
+            cmd.group._member_finished()
+        elif cmd.source.command_pool is not None:
+            cmd.source.command_pool.release(cmd) # (back where it came from)
+
+    def _handle_command_completion(self, cmd):
+        """cmd signalled its completion (see Command.resolve)"""
+        if cmd is self.executing:
+            self._finish_command(cmd)
+            if self.world is not None and self.commands.incoming:
+                self.world.wake(self)
+            if self._wakeup is not None:
+                self._wakeup.set()
+
     def _handle_command_execution(self, cmd):
         """order has been carried out: remove it from pending orders"""
-        self.commands.outgoing.remove(cmd)
+        if cmd.group is not None:
+            cmd.group._member_executed()
+            return
+        try:
+            self.commands.outgoing.remove(cmd)
+        except ValueError:
+            pass # superseded, while the subject (in another process) was executing it
 
-    def emit_command(self, action, completion_check, *args, priority=False, **kwargs):
-        cmd = Command(self, action, completion_check, *args, **kwargs)
-        self.commands.outgoing.queue(cmd, priority=priority)
+    def emit_command(self, action, completion_check, *args, priority=False, coalesce=None, **kwargs):
+        """
+        Sends the command action(*args, **kwargs) to the subject of action.
+        coalesce: if given, a newer command with the same coalesce key (and the same source,
+        subject and action) takes the place of the queued one, in both queues: repeated
+        orders (a goto a moving target, every tick) do not pile up.
+        """
+        if self.command_pool is not None:
+            cmd = self.command_pool.acquire(self, action, completion_check, *args, **kwargs)
+        else:
+            cmd = Command(self, action, completion_check, *args, **kwargs)
+        if coalesce is not None:
+            cmd.key = (self.uid, action.__self__.uid, action.__name__, coalesce)
+        if self.recorder is not None:
+            self.recorder.emitted(cmd, priority)
+        if self.telemetry is not None:
+            self.telemetry.emitted(cmd)
+        if cmd.key is None or self.commands.outgoing.supersede(cmd) is None:
+            self.commands.outgoing.queue(cmd, priority=priority)
         cmd.subject.receive_command(cmd, priority=priority)
         return cmd
 
+    def emit_group_command(self, subjects, action, completion_check, *args, priority=False, **kwargs):
+        """
+        Sends the same command to all of subjects: action and completion_check are method
+        names (or unbound methods; completion_check can also be None or SIGNALLED).
+        Returns the GroupCommand, which is our single outgoing record of the order.
+        """
+        group = GroupCommand(self, action, completion_check, args, kwargs)
+        for subject in subjects:
+            cmd = group._member(subject)
+            if self.recorder is not None:
+                self.recorder.emitted(cmd, priority)
+            if self.telemetry is not None:
+                self.telemetry.emitted(cmd)
+            subject.receive_command(cmd, priority=priority)
+        if group.members:
+            self.commands.outgoing.queue(group, priority=priority)
+        return group
+
     def receive_command(self, cmd, priority=False):
+        if cmd.key is not None:
+            old = self.commands.incoming.supersede(cmd)
+            if old is not None:
+                # (not released to the pool: its emitter may still hold it, e.g. to resolve() it,
+                # which is a no-op for a command that is not executing)
+                return
         self.commands.incoming.queue(cmd, priority=priority)
+        if self.world is not None:
+            self.world.wake(self)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def moved(self):
+        """to be called by whatever changes self.pos: keeps the world's spatial index up to date"""
+        if self.world is not None and self in self.world.spatial:
+            self.world.spatial.update(self)
+
+    @property
+    def idle(self):
+        """True if updating is pointless: there is no command to start, and the one
+        executing (if any) will signal its completion"""
+        if self.executing is None:
+            return not self.commands.incoming
+        return self.executing.completion_check is SIGNALLED
 
     def update(self):
+        cmd = None
         if self.executing and self.executing.is_done:
-            self.executing = None # await completion
+            self._finish_command(self.executing)
         if self.executing is None:
-            return self.execute_next_command()
+            try:
+                cmd = self.execute_next_command()
+            except NoLoopError as e:
+                # (e.g. ticked by a Scheduler: the command waits for run_commands, and we for a new command)
+                logger.warning(self, 'cannot start its next command:', e)
+                if self.world is not None:
+                    self.world.sleep(self)
+                return None
         else:
-            debug('{self} is still executing {self.executing}')
+            logger.debug(self, 'is still executing', self.executing)
+        if self.world is not None and self.idle:
+            # stop polling until a command comes in, or completes
+            self.world.sleep(self)
+        return cmd
+
+    async def run_commands(self, poll=None):
+        """
+        Runs the incoming commands as an asyncio task, instead of through update(): waits
+        (for free) for commands to come in, and for each one to be done before starting the
+        next. Coroutine actions are awaited, SIGNALLED commands wait for resolve(), and the
+        others have their completion_check polled every `poll` seconds (default: a frame).
+        """
+        poll = 1 / settings.FPS if poll is None else poll
+        wakeup = self._wakeup = asyncio.Event()
+        try:
+            while True:
+                wakeup.clear()
+                if self.executing is not None and self.executing.is_done:
+                    self._finish_command(self.executing)
+                if self.executing is None and self.execute_next_command() is not None:
+                    continue # (it may be done already)
+                if self.executing is not None and self.executing.completion_check is not SIGNALLED:
+                    await asyncio.sleep(poll)
+                else:
+                    await wakeup.wait()
+        finally:
+            self._wakeup = None
+
+    async def run(self, poll=None):
+        """runs the commands (see run_commands) and the behaviours (see Behaviour.run) of the agent"""
+        await asyncio.gather(self.run_commands(poll), *(b.run() for b in self.behaviours))
 
 
 
 class Command:
+    # commands are created and dropped in large numbers: keep them small
+    __slots__ = ('source', 'action', 'completion_check', 'args', 'kwargs', 'priority', 'key', 'group', '_done',
+                 'stamps', '__weakref__')
+
+    SIGNALLED = SIGNALLED
+
     def __repr__(self):
         return f"<Cmd {self.source}:: {self.subject} {self.action.__name__} ({self.args})>"
 
     def __init__(self, source, action, completion_check, *args, **kwargs):
         """
         source: origin of the command
-        action: a bound method of the recipient of the command
-        completion_check: a function to execute to verify if the command has completed
+        action: a bound method of the recipient of the command. It can be a coroutine method
+            (async def): the command then runs as a task on the running event loop, and is done
+            when the coroutine returns (completion_check is then ignored).
+        completion_check: a function to execute to verify if the command has completed; or None,
+            if it is done as soon as executed; or SIGNALLED, if the subject calls cmd.resolve()
+            when it is done (for instance, the action can hand subject.executing.resolve over
+            as a callback), which spares the subject from polling.
         args, kwargs: arguments to be passed to action() call
+        Arguments are only validated if settings.debug_commands is set.
         """
-
-        assert hasattr(action, "__call__"), f"action needs to be a function, got {action} instead"
-        assert hasattr(action, "__self__"), f'action needs to be a bound method, got {action} instead'
-        if completion_check is not None:
-            assert hasattr(completion_check, "__call__"), f"""completion check
-            needs to be a function (or None), got {completion_check} instead"""
+        if settings.debug_commands:
+            self.validate(action, completion_check)
 
         self.source = source
         self.action = action
         self.completion_check = completion_check
         self.args = args
         self.kwargs = kwargs
+        self.priority = source._cmd_priority
+        self.key = None # coalescing key (see ControllableObject.emit_command)
+        self.group = None # the GroupCommand we are a member of, if any
+        self._done = False
+        self.stamps = None # emit, dequeue, execute and completion times, while telemetry is on (see ai.telemetry)
+
+    @staticmethod
+    def validate(action, completion_check):
+        assert hasattr(action, "__call__"), f"action needs to be a function, got {action} instead"
+        assert hasattr(action, "__self__"), f'action needs to be a bound method, got {action} instead'
+        if completion_check is not None and completion_check is not SIGNALLED:
+            assert hasattr(completion_check, "__call__"), f"""completion check
+            needs to be a function (or None, or SIGNALLED), got {completion_check} instead"""
 
     @property
     def is_done(self):
-        return self.completion_check() if self.completion_check else True
-
-    @property
-    def priority(self):
-        return self.source._cmd_priority
+        check = self.completion_check
+        if check is None:
+            return True
+        if check is SIGNALLED:
+            return self._done
+        return check()
+
+    def resolve(self):
+        """signals that the command is done (for completion_check=SIGNALLED commands)"""
+        self._done = True
+        self.subject._handle_command_completion(self)
+
+    def _task_done(self, task):
+        """done callback of the task running a coroutine action"""
+        log_exception(task, logger, self)
+        self.resolve()
 
     @property
     def subject(self):
@@ -117,17 +366,253 @@ class Command:
         return self.action.__self__
 
     def execute(self):
-        self.action(*self.args, **self.kwargs)
+        """runs the action; returns its result (a coroutine, for async actions)"""
+        return self.action(*self.args, **self.kwargs)
+
+
+class GroupCommand:
+    """
+    One order to many subjects (see ControllableObject.emit_group_command). The source
+    queues only this record; each subject gets a member Command of its own (sharing the
+    arguments), which reports to the group when it is executed and when it finishes.
+    The group leaves the source's outgoing queue once all the members have been executed.
+    The subjects are expected to live in the process of the source (see ai.sharding).
+    """
+    __slots__ = ('source', 'action', 'completion_check', 'args', 'kwargs', 'priority', 'key',
+                 'members', 'executed', 'finished', '__weakref__')
+
+    def __repr__(self):
+        return f"<GroupCmd {self.source}:: {len(self.members)} x {self.action} ({self.args})>"
+
+    def __init__(self, source, action, completion_check, args, kwargs):
+        self.source = source
+        self.action = getattr(action, '__name__', action)
+        if completion_check is not None and completion_check is not SIGNALLED:
+            completion_check = getattr(completion_check, '__name__', completion_check)
+        self.completion_check = completion_check
+        self.args = args
+        self.kwargs = kwargs
+        self.priority = source._cmd_priority
+        self.key = None
+        self.members = []
+        self.executed = 0 # number of members executed (or executing)
+        self.finished = 0 # number of members done
+
+    def __len__(self):
+        return len(self.members)
+
+    def _member(self, subject):
+        check = self.completion_check
+        if isinstance(check, str):
+            check = getattr(subject, check)
+        cmd = Command(self.source, getattr(subject, self.action), check)
+        cmd.args, cmd.kwargs, cmd.group = self.args, self.kwargs, self
+        self.members.append(cmd)
+        return cmd
+
+    @property
+    def pending(self):
+        """number of members not done yet"""
+        return len(self.members) - self.finished
+
+    @property
+    def is_done(self):
+        return self.finished == len(self.members)
+
+    def _member_executed(self):
+        self.executed += 1
+        if self.executed == len(self.members) and self in self.source.commands.outgoing:
+            self.source.commands.outgoing.remove(self)
+
+    def _member_finished(self):
+        self.finished += 1
+
+
+@attr.s
+class CommandPool:
+    """
+    Free list of Command objects, for reuse: see ControllableObject.command_pool.
+    The commands a source emits come from its pool, and go back to it when their subject is
+    done executing them, so a pooled command must not be held on to after its completion.
+    """
+    size = attr.ib(default=4096) # max number of free commands kept around
+    created = attr.ib(default=0, init=False) # number of commands allocated because the pool was empty
+    _free = attr.ib(factory=list, init=False, repr=False)
+
+    def __len__(self):
+        return len(self._free)
+
+    def acquire(self, source, action, completion_check, *args, **kwargs):
+        if not self._free:
+            self.created += 1
+            return Command(source, action, completion_check, *args, **kwargs)
+        if settings.debug_commands:
+            Command.validate(action, completion_check)
+        cmd = self._free.pop()
+        cmd.source = source
+        cmd.action = action
+        cmd.completion_check = completion_check
+        cmd.args = args
+        cmd.kwargs = kwargs
+        cmd.priority = source._cmd_priority
+        cmd.key = None
+        cmd.group = None
+        cmd._done = False
+        cmd.stamps = None
+        return cmd
+
+    def release(self, cmd):
+        if len(self._free) < self.size:
+            # drop the references, not to keep anything alive through the pool
+            cmd.source = cmd.action = cmd.completion_check = cmd.args = cmd.kwargs = None
+            self._free.append(cmd)
 
 
 @attr.s
 class CommandQueue:
+    """
+    Priority queue of commands, backed by a binary heap plus an index.
+
+    Commands are served by (cmd.priority, arrival order): the lowest priority wins,
+    and among commands of equal priority the first queued is the first served;
+    unless a command is queued with priority=True, in which case it jumps the line.
+    Removal is lazy: the heap entry is only flagged as dead, and is dropped when it
+    reaches the top of the heap (or when the heap gets compacted).
+    """
     owner = attr.ib(init=True)
-    _commands = attr.ib(factory=deque, init=False)
+    _heap = attr.ib(factory=list, init=False, repr=False)
+    _index = attr.ib(factory=dict, init=False, repr=False) # cmd -> heap entry
+    _keys = attr.ib(factory=dict, init=False, repr=False) # cmd.key -> cmd, for the keyed commands
+    _head = attr.ib(default=0, init=False, repr=False) # arrival counter for line-jumpers
+    _tail = attr.ib(default=0, init=False, repr=False) # arrival counter for everybody else
+    _dead = attr.ib(default=0, init=False, repr=False) # number of lazily deleted entries
+
+    # marks a lazily deleted heap entry
+    _REMOVED = None
+    # compact the heap when dead entries outnumber the live ones (and there are at least this many)
+    _COMPACT_THRESHOLD = 64
 
     class EmptyQueueError(StopIteration):
         pass
 
+    def __repr__(self):
+        return f"<Command Queue {list(self)}>"
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, cmd):
+        return cmd in self._index
+
+    def __iter__(self):
+        """iterates over the queued commands in execution order"""
+        for entry in sorted(e for e in self._heap if e[-1] is not self._REMOVED):
+            yield entry[-1]
+
+    def __getitem__(self, item):
+        try:
+            return list(self)[item]
+        except IndexError:
+            raise self.EmptyQueueError(f'Empty queue ({item})')
+
+    def queue(self, cmd, priority=False):
+        if cmd in self._index:
+            # re-queueing a command moves it
+            self.remove(cmd)
+        if priority:
+            self._head -= 1
+            seq = self._head
+        else:
+            self._tail += 1
+            seq = self._tail
+        entry = [cmd.priority, seq, cmd]
+        self._index[cmd] = entry
+        if cmd.key is not None:
+            self._keys[cmd.key] = cmd
+        heapq.heappush(self._heap, entry)
+        return cmd
+
+    def supersede(self, cmd):
+        """
+        Puts cmd in the place in line of the queued command with the same key, which is
+        dropped and returned. Returns None (and queues nothing) if there is none.
+        """
+        old = self._keys.get(cmd.key)
+        if old is None:
+            return None
+        entry = self._index.pop(old)
+        self._keys[cmd.key] = cmd
+        if entry[0] == cmd.priority:
+            entry[-1] = cmd
+        else:
+            new = [cmd.priority, entry[1], cmd]
+            entry[-1] = self._REMOVED
+            self._dead += 1
+            heapq.heappush(self._heap, new)
+            entry = new
+        self._index[cmd] = entry
+        return old
+
+    def remove(self, cmd):
+        try:
+            entry = self._index.pop(cmd)
+        except KeyError:
+            raise ValueError(f'{cmd} not in {self}')
+        if cmd.key is not None and self._keys.get(cmd.key) is cmd:
+            del self._keys[cmd.key]
+        entry[-1] = self._REMOVED
+        self._dead += 1
+        if self._dead > max(len(self._index), self._COMPACT_THRESHOLD):
+            self._compact()
+
+    def _compact(self):
+        self._heap = [e for e in self._heap if e[-1] is not self._REMOVED]
+        heapq.heapify(self._heap)
+        self._dead = 0
+
+    def _prune(self):
+        """drops the dead entries sitting at the top of the heap"""
+        heap = self._heap
+        while heap and heap[0][-1] is self._REMOVED:
+            heapq.heappop(heap)
+            self._dead -= 1
+
+    def get_next_command(self, keep=False):
+        """
+        Returns the command with the lowest cmd.priority; ties are broken by order
+        of arrival (priority=True commands having jumped the line).
+        If keep is False, the command is also removed from the queue.
+        """
+        self._prune()
+        if not self._heap:
+            raise self.EmptyQueueError('Empty queue')
+
+        cmd = self._heap[0][-1]
+        if not keep:
+            heapq.heappop(self._heap)
+            del self._index[cmd]
+            if cmd.key is not None and self._keys.get(cmd.key) is cmd:
+                del self._keys[cmd.key]
+        return cmd
+
+    def clear(self):
+        self._heap = []
+        self._index = {}
+        self._keys = {}
+        self._dead = 0
+
+
+@attr.s
+class DequeCommandQueue:
+    """
+    The original, deque-backed command queue: O(n) selection and removal.
+    Kept as a reference implementation (see benchmarks/bench_command_queue.py).
+    """
+    owner = attr.ib(init=True)
+    _commands = attr.ib(factory=deque, init=False)
+
+    EmptyQueueError = CommandQueue.EmptyQueueError
+
     def __repr__(self):
         return f"<Command Queue {repr(self._commands)}>"
 
@@ -143,13 +628,20 @@ class CommandQueue:
     def queue(self, cmd, priority=False):
         if priority:
             self._commands.appendleft(cmd)
-            return
+            return cmd
         self._commands.append(cmd)
         return cmd
 
     def remove(self, cmd):
         self._commands.remove(cmd)
 
+    def supersede(self, cmd):
+        for i, old in enumerate(self._commands):
+            if old.key is not None and old.key == cmd.key:
+                self._commands[i] = cmd
+                return old
+        return None
+
     def get_next_command(self, keep=False):
         """
         queue gets executed from left to right by default
@@ -0,0 +1,159 @@
+"""
+Struct-of-arrays storage for the hot state of agents (position, velocity, hull...): each
+field lives in a contiguous numpy array, indexed by entity id, and the agents' attributes of
+the same name become thin views on those arrays. Bulk queries (range checks, physics,
+spatial sweeps) can then work on whole arrays instead of chasing attributes agent by agent.
+
+Opt in by giving a ControllableObject subclass a store:
+
+    class Ship(ControllableObject):
+        components = ComponentStore(pos=(float, 2), velocity=(float, 2), hull=float)
+
+    ship.pos = (10, 20)                      # written to Ship.components['pos'][ship._eid]
+    Ship.components.gather('pos', ships)     # (n, 2) array
+    Ship.components.integrate('pos', 'velocity', dt)
+
+An agent gets its entity id when one of its fields is first set; the id is freed (and
+reused) once the agent is garbage collected. Unset float fields read as None (they are
+stored as NaN), as do the fields set to None.
+"""
+
+import weakref
+from operator import attrgetter
+import numpy as np
+from logger import getLogger
+
+
+logger = getLogger(__name__)
+
+
+class _Owner(weakref.ref):
+    """weak reference to the agent holding an entity id"""
+    __slots__ = ('eid',)
+
+
+class Component:
+    """descriptor of a field of a ComponentStore, installed on the registered classes"""
+
+    def __init__(self, store, name):
+        self.store = store
+        self.name = name
+        self.vector = len(store.fields[name][1]) > 0
+
+    def __get__(self, obj, cls=None):
+        if obj is None:
+            return self
+        eid = obj.__dict__.get('_eid')
+        if eid is None:
+            return None
+        if self.vector:
+            value = tuple(self.store.arrays[self.name][eid].tolist())
+            return None if value[0] != value[0] else value
+        value = self.store.arrays[self.name].item(eid)
+        return None if value != value else value
+
+    def __set__(self, obj, value):
+        eid = obj.__dict__.get('_eid')
+        if eid is None:
+            eid = self.store.alloc(obj)
+        self.store.arrays[self.name][eid] = np.nan if value is None else value
+
+
+_eid = attrgetter('_eid')
+
+
+class ComponentStore:
+    """
+    The arrays of the fields (name=dtype, or name=(dtype, shape)) of the entities of one or
+    more agent classes. Views of the arrays (see __getitem__) are invalidated by growth.
+    """
+
+    class Error(AttributeError):
+        pass
+
+    def __init__(self, capacity=1024, **fields):
+        self.fields = {name: (np.dtype(spec[0]), tuple(np.atleast_1d(spec[1])))
+                       if isinstance(spec, tuple) else (np.dtype(spec), ())
+                       for name, spec in fields.items()}
+        self.arrays = {}
+        self.size = 0 # high-water mark of the entity ids
+        self._owners = [] # entity id -> weakref to its agent (or None, if free)
+        self._free = []
+        self._collected = lambda owner: self.free(owner.eid)
+        self._grow(capacity)
+
+    def __len__(self):
+        return self.size - len(self._free)
+
+    def __getitem__(self, name):
+        """the array of field `name`, up to the highest entity id in use (a view)"""
+        return self.arrays[name][:self.size]
+
+    def register(self, cls):
+        """makes the fields attributes of cls (and its subclasses) stored here"""
+        for name in self.fields:
+            setattr(cls, name, Component(self, name))
+        return cls
+
+    def _grow(self, capacity):
+        for name, (dtype, shape) in self.fields.items():
+            array = np.zeros((capacity,) + shape, dtype)
+            if dtype.kind == 'f':
+                array.fill(np.nan)
+            old = self.arrays.get(name)
+            if old is not None:
+                array[:len(old)] = old
+            self.arrays[name] = array
+
+    def alloc(self, obj):
+        """gives obj an entity id"""
+        if self._free:
+            eid = self._free.pop()
+        else:
+            eid = self.size
+            self.size += 1
+            if eid == len(self._owners):
+                self._owners.append(None)
+            capacity = len(next(iter(self.arrays.values())))
+            if eid >= capacity:
+                self._grow(2 * capacity)
+        owner = self._owners[eid] = _Owner(obj, self._collected)
+        owner.eid = eid
+        obj.__dict__['_eid'] = eid
+        return eid
+
+    def free(self, eid):
+        self._owners[eid] = None
+        for name, (dtype, _) in self.fields.items():
+            self.arrays[name][eid] = np.nan if dtype.kind == 'f' else 0
+        self._free.append(eid)
+
+    def owner(self, eid):
+        ref = self._owners[eid]
+        return ref() if ref is not None else None
+
+    def ids(self, agents):
+        """the entity ids of agents, as an array (agents without one raise Error)"""
+        try:
+            return np.fromiter(map(_eid, agents), np.intp, len(agents))
+        except AttributeError:
+            raise ComponentStore.Error('agent not in the store (none of its fields was set)')
+
+    def gather(self, name, agents):
+        """the values of field `name` for agents, as an array"""
+        return self.arrays[name][self.ids(agents)]
+
+    def scatter(self, name, agents, values):
+        self.arrays[name][self.ids(agents)] = values
+
+    def within(self, pos, radius, field='pos'):
+        """the agents within radius from pos, by a sweep over the whole `field` array"""
+        points = self[field]
+        inside = np.hypot(points[:, 0] - pos[0], points[:, 1] - pos[1]) <= radius # (NaN: never)
+        return [self.owner(eid) for eid in np.flatnonzero(inside).tolist()]
+
+    def integrate(self, field, rate, dt):
+        """field += rate * dt, for all the entities at once (e.g. positions by velocities)"""
+        live = self[field]
+        step = self[rate] * dt
+        np.add(live, step, out=live, where=~np.isnan(step))
@@ -0,0 +1,121 @@
+"""
+Level of detail of the AI: the behaviours of the agents far from every player-controlled
+agent (the viewers) are stepped less often, or summarized.
+
+The view radius is settings.render_distance tiles, widened by the preload window padding
+(map_gen_params['preload_window_padding']): what the player sees, or may see next, stays at
+full fidelity. Farther agents go into the settings.lod_tiers by distance; in the slowed-down
+tiers, behaviours that define _lod_summary have that (cheap) method called instead of step().
+Agents coming near again are back to full fidelity within one normal period.
+
+    lod = LevelOfDetail(world, viewers=[player_ship])
+"""
+
+import math
+import attr
+import settings
+from logger import getLogger
+
+
+logger = getLogger(__name__)
+
+
+def view_radius():
+    return settings.render_distance * settings.tile_size * (1 + settings.map_gen_params['preload_window_padding'])
+
+
+@attr.s
+class LevelOfDetail:
+    """
+    Sorts the positioned agents of world (a Scheduler) into tiers, every settings.timers
+    ['lod_update'], and paces their behaviours accordingly. The agents without a position,
+    and the viewers themselves, always run at full fidelity.
+    """
+    world = attr.ib()
+    viewers = attr.ib(factory=list) # the player-controlled agents (add and remove as they come and go)
+    tiers = attr.ib(default=attr.Factory(lambda: settings.lod_tiers)) # ((distance in view radii, slowdown), ...)
+    # agent -> tier index, for the agents not in the last tier
+    tier = attr.ib(factory=dict, init=False, repr=False)
+    _timer = attr.ib(default=None, init=False, repr=False)
+
+    def __attrs_post_init__(self):
+        radius = view_radius()
+        self._radii = [radius * d if d is not None else math.inf for d, _ in self.tiers]
+        self.world.lod = self
+        self._timer = self.world.every('lod_update', self.update)
+        for agent in list(self.world.agents):
+            self.admit(agent)
+
+    def stop(self):
+        """back to full fidelity for everybody"""
+        self._timer.cancel()
+        self.world.lod = None
+        for agent in list(self.world.agents):
+            self._pace(agent, 0)
+        self.tier.clear()
+
+    def tier_of(self, agent):
+        return self.tier.get(agent, len(self.tiers) - 1)
+
+    def _pace(self, agent, tier):
+        slowdown = self.tiers[tier][1]
+        for b in agent.behaviours:
+            summary = b._lod_summary and slowdown > 1 and getattr(b, b._lod_summary)
+            self.world.pace(agent, b, slowdown, summary or None)
+
+    def _set(self, agent, tier):
+        if getattr(agent, 'pos', None) is None:
+            return
+        if tier == self.tier_of(agent):
+            return
+        self._pace(agent, tier)
+        if tier == len(self.tiers) - 1:
+            self.tier.pop(agent, None)
+        else:
+            self.tier[agent] = tier
+
+    def _tier(self, agent, distance):
+        """the tier of agent, at `distance` from the nearest viewer"""
+        current = self.tier_of(agent)
+        for i, radius in enumerate(self._radii):
+            # (hysteresis: the current tier reaches a bit farther)
+            if distance <= (radius * (1 + settings.lod_hysteresis) if i == current else radius):
+                return i
+        return len(self.tiers) - 1
+
+    def _distance(self, agent):
+        x, y = agent.pos
+        return min((math.hypot(v.pos[0] - x, v.pos[1] - y) for v in self.viewers
+                    if getattr(v, 'pos', None) is not None), default=math.inf)
+
+    def admit(self, agent):
+        """agent was added to the world (at full fidelity)"""
+        if getattr(agent, 'pos', None) is not None:
+            self.tier.pop(agent, None)
+            tier = self._tier(agent, self._distance(agent))
+            self.tier[agent] = 0
+            self._set(agent, tier)
+
+    def discard(self, agent):
+        self.tier.pop(agent, None)
+
+    def update(self):
+        """re-sorts the agents near the viewers (and those that were), into tiers"""
+        reach = self._radii[-2] * (1 + settings.lod_hysteresis) if len(self._radii) > 1 else 0
+        distances = {}
+        for v in self.viewers:
+            pos = getattr(v, 'pos', None)
+            if pos is None:
+                continue
+            for agent in self.world.spatial.within(pos, reach):
+                d = math.hypot(agent.pos[0] - pos[0], agent.pos[1] - pos[1])
+                if d < distances.get(agent, math.inf):
+                    distances[agent] = d
+        for v in self.viewers:
+            distances[v] = 0
+        for agent in list(self.tier):
+            if agent not in distances:
+                self._set(agent, len(self.tiers) - 1)
+        for agent, d in distances.items():
+            if agent in self.world.agents:
+                self._set(agent, self._tier(agent, d))
@@ -0,0 +1,115 @@
+"""
+Tick-scoped memoization of behaviour predicates and agent queries: within a tick, a
+memoized method called again on the same object with the same arguments returns the
+value computed the first time.
+
+Agent queries and expensive preconditions opt in with @memoized; with
+settings.memoize_predicates, every transition precondition of the behaviours is memoized
+(but those marked @mark.volatile: they have side effects, or must see the changes made
+within the tick). Caching is only on while a tick runs (see Scheduler.tick; elsewhere,
+wrap the steps in `with memo.tick():`), and can be switched off with settings.memoize.
+
+    print(memo.report()) # hits and misses, per method
+"""
+
+import inspect
+from contextlib import contextmanager
+from functools import wraps
+from types import FunctionType
+import settings
+
+
+class Memo:
+    """the tick clock of the caches, and their hit/miss counters"""
+
+    def __init__(self):
+        self.enabled = settings.memoize
+        self.active = False # True within a tick
+        self.epoch = 0 # tick number: the caches of older ticks are stale
+        self.stats = {} # method qualname -> [hits, misses]
+
+    def begin(self):
+        """a tick starts: drops (lazily) the cached values"""
+        self.epoch += 1
+        self.active = self.enabled
+
+    def end(self):
+        self.active = False
+
+    @contextmanager
+    def tick(self):
+        self.begin()
+        try:
+            yield self
+        finally:
+            self.end()
+
+    def reset(self):
+        for counts in self.stats.values():
+            counts[0] = counts[1] = 0
+
+    def report(self):
+        lines = [f'{"method":<48} {"hits":>10} {"misses":>10} {"hit rate":>9}']
+        for name, (hits, misses) in sorted(self.stats.items(), key=lambda item: -sum(item[1])):
+            if hits or misses:
+                lines.append(f'{name:<48} {hits:>10} {misses:>10} {hits / (hits + misses):>9.1%}')
+        return '\n'.join(lines)
+
+
+memo = Memo()
+
+# of the instance attributes holding the cached values
+MEMO_PREFIX = '_memo:'
+
+
+def memoized(f):
+    """
+    Caches the results of the method f for the current tick, per instance and arguments
+    (which must be hashable), in the instance's __dict__ (under MEMO_PREFIX + the name of f).
+    """
+    if getattr(f, '_memoized', False):
+        return f
+    name = f.__qualname__
+    slot = MEMO_PREFIX + f.__name__
+    args_slot = slot + '(*)' # the values by arguments
+    counts = memo.stats.setdefault(name, [0, 0])
+
+    @wraps(f)
+    def wrapper(self, *args, **kwargs):
+        if not memo.active or kwargs:
+            return f(self, *args, **kwargs)
+        d = self.__dict__
+        if not args:
+            cached = d.get(slot)
+            if cached is not None and cached[0] == memo.epoch:
+                counts[0] += 1
+                return cached[1]
+            counts[1] += 1
+            value = f(self)
+            d[slot] = (memo.epoch, value)
+            return value
+        cached = d.get(args_slot)
+        if cached is None or cached[0] != memo.epoch:
+            cached = d[args_slot] = (memo.epoch, {})
+        values = cached[1]
+        if args in values:
+            counts[0] += 1
+            return values[args]
+        counts[1] += 1
+        value = values[args] = f(self, *args)
+        return value
+    wrapper._memoized = True
+    return wrapper
+
+
+def memoize_predicates(cls):
+    """
+    memoizes the methods of (behaviour class) cls that are transition preconditions, unless
+    volatile; if settings.memoize_predicates is set
+    """
+    if not settings.memoize_predicates:
+        return
+    for name in {pre for pres in cls.tm.pres for pre in pres if pre is not None}:
+        f = inspect.getattr_static(cls, name, None)
+        if isinstance(f, FunctionType) and not getattr(f, '_volatile', False) and not getattr(f, '_memoized', False):
+            setattr(cls, name, memoized(f))
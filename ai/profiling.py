@@ -0,0 +1,158 @@
+"""
+Opt-in latency instrumentation of the behaviours: how long Behaviour.step, the transition
+choice (TransitionModel.step) and each precondition take, by behaviour class and node.
+
+    from ai.profiling import profiler
+    profiler.enable()
+    ...
+    print(profiler.report(10))
+
+While disabled (the default, unless settings.profile_behaviours is set), the hooks cost one
+attribute check per step.
+"""
+
+from time import perf_counter_ns
+import settings
+
+
+class Histogram:
+    """
+    Latency histogram with power-of-two buckets: bucket i counts the values v (integers,
+    e.g. nanoseconds) with v.bit_length() == i, i.e. 2**(i-1) <= v < 2**i.
+    Recording is O(1); quantiles are approximate (to the upper bound of their bucket).
+    """
+    __slots__ = ('buckets', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.buckets = [0] * 64
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def add(self, value):
+        self.buckets[min(int(value).bit_length(), 63)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        for i, n in enumerate(other.buckets):
+            self.buckets[i] += n
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.
+
+    def quantile(self, q):
+        """upper bound of the bucket holding the q-th quantile (0 <= q <= 1)"""
+        if not self.count:
+            return 0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if n and seen >= rank:
+                return min(1 << i, self.max)
+        return self.max
+
+    def summary(self, scale=1e-3):
+        """count, total, mean, p50, p99 and max; scaled by `scale` (default: ns to µs)"""
+        return {'count': self.count,
+                'total': self.total * scale,
+                'mean': self.mean * scale,
+                'p50': self.quantile(.5) * scale,
+                'p99': self.quantile(.99) * scale,
+                'max': self.max * scale}
+
+
+class Profiler:
+    """
+    Collects one Histogram (in ns) per (behaviour class name, kind, name), where kind is:
+    - 'step': a whole Behaviour.step (name None)
+    - 'action': the execution of the node `name`
+    - 'transition': the choice of the node that follows `name` (preconditions included)
+    - 'pre': the evaluation of the precondition `name`.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.stats = {}
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        self.stats = {}
+
+    def _hist(self, key):
+        hist = self.stats.get(key)
+        if hist is None:
+            hist = self.stats[key] = Histogram()
+        return hist
+
+    def step(self, behaviour):
+        """instrumented Behaviour.step (delegation already resolved)"""
+        cls = type(behaviour).__name__
+        start = perf_counter_ns()
+        state = behaviour._advance(self._choose)
+        if state is not None:
+            mid = perf_counter_ns()
+            result = behaviour.tm.actions[state](behaviour)
+            end = perf_counter_ns()
+            if result is not None:
+                behaviour._await(result) # (the time of coroutine actions is not accounted for)
+            self._hist((cls, 'action', behaviour.tm.names[state])).add(end - mid)
+        else:
+            end = perf_counter_ns()
+        self._hist((cls, 'step', None)).add(end - start)
+
+    def _choose(self, behaviour, state):
+        """instrumented TransitionModel.step"""
+        tm = behaviour.tm
+        if state is None or state < 0 or len(tm.edges[state]) < 2:
+            return tm.step(behaviour, state)
+        cls = type(behaviour).__name__
+
+        def timed(name, pre, behaviour):
+            start = perf_counter_ns()
+            score = pre(behaviour)
+            self._hist((cls, 'pre', name)).add(perf_counter_ns() - start)
+            return score
+
+        start = perf_counter_ns()
+        chosen = tm.step(behaviour, state, timed)
+        self._hist((cls, 'transition', tm.names[state])).add(perf_counter_ns() - start)
+        return chosen
+
+    def snapshot(self):
+        """{behaviour class name: {kind: {name: Histogram.summary() (µs)}}}"""
+        snap = {}
+        for (cls, kind, name), hist in self.stats.items():
+            snap.setdefault(cls, {}).setdefault(kind, {})[name] = hist.summary()
+        return snap
+
+    def top(self, n=10, kinds=('action', 'transition'), by='total'):
+        """the n slowest nodes, as ((class name, kind, name), summary) pairs; `by` is a summary key"""
+        rows = [(key, hist.summary()) for key, hist in self.stats.items() if key[1] in kinds]
+        rows.sort(key=lambda row: row[1][by], reverse=True)
+        return rows[:n]
+
+    def report(self, n=10, by='total'):
+        lines = [f'{"behaviour":<24} {"kind":<10} {"node":<24} {"count":>9} '
+                 f'{"total ms":>10} {"mean µs":>9} {"p50 µs":>9} {"p99 µs":>9}']
+        for (cls, kind, name), s in self.top(n, by=by):
+            lines.append(f'{cls:<24} {kind:<10} {name:<24} {s["count"]:>9} {s["total"] / 1000:>10.2f} '
+                         f'{s["mean"]:>9.2f} {s["p50"]:>9.2f} {s["p99"]:>9.2f}')
+        return '\n'.join(lines)
+
+
+profiler = Profiler()
+if settings.profile_behaviours:
+    profiler.enable()
@@ -0,0 +1,287 @@
+"""
+Record and replay of the command streams of a world (an ai.scheduler.Scheduler), for
+reproducible load tests.
+
+The Recorder appends every emit_command, command execution and completion to a compact
+binary log, with the tick it happened at, and the first uid of the recorded world. The
+Replayer rebuilds nothing: given a world built the same way, after Replayer.seed_uids()
+(so that its agents get the recorded uids), it feeds the recorded *external* commands
+(those emitted between two ticks: players' orders) back at their ticks, and runs the
+world headless as fast as it can. Everything else follows, deterministically, provided
+that settings.ai_seed is set (behaviours then break ties with per-agent seeded random
+streams, see ControllableObject.rng) and that the world runs without a time budget.
+
+    with Recorder('session.log', world):
+        ... # play
+    replayer = Replayer('session.log').seed_uids()
+    world = ... # built as the recorded one was
+    stats = replayer.replay(world)
+"""
+
+import struct
+import time
+import weakref
+import attr
+import settings
+from logger import getLogger
+from .command import ControllableObject, SIGNALLED
+from .snapshot import dumps, loads
+
+
+logger = getLogger(__name__)
+
+MAGIC = b'BRPL'
+VERSION = 3
+_FILE_HEADER = struct.Struct('<4sH')
+
+# records: kind, tick, then a kind-specific body
+STRING, EMIT, EXECUTE, COMPLETE, STOP, UIDS = range(6)
+_RECORD = struct.Struct('<BI')
+_STRING = struct.Struct('<H') # length, followed by the utf-8 string (its id is its rank)
+_EMIT = struct.Struct('<QqqIiBBI') # cmd id, source, subject, action, check, priority, external, payload length
+_ID = struct.Struct('<Q') # cmd id (execute and complete; stop has no body), or first uid (uids)
+
+# EMIT check field (otherwise: the string id of the name of a method of the subject)
+NO_CHECK, SIGNALLED_CHECK, CHECK_IN_PAYLOAD = -1, -2, -3
+
+
+@attr.s
+class Recorder:
+    """
+    Logs the commands of all the ControllableObjects to `path` (appended to), while started.
+    Ticks are read from world.tick_count; without a world, set recorder.tick yourself.
+    """
+    path = attr.ib()
+    world = attr.ib(default=None)
+    tick = attr.ib(default=0)
+    _file = attr.ib(default=None, init=False, repr=False)
+    _strings = attr.ib(factory=dict, init=False, repr=False)
+    _ids = attr.ib(factory=weakref.WeakKeyDictionary, init=False, repr=False) # command -> id
+    _next_id = attr.ib(default=0, init=False, repr=False)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        self._file = open(self.path, 'ab')
+        if not self._file.tell():
+            self._file.write(_FILE_HEADER.pack(MAGIC, VERSION))
+        if self.world is not None and self.world.agents:
+            first = min(agent.uid for agent in self.world.agents)
+            self._file.write(_RECORD.pack(UIDS, self._tick()) + _ID.pack(first))
+        ControllableObject.recorder = self
+        return self
+
+    def stop(self):
+        if ControllableObject.recorder is self:
+            ControllableObject.recorder = None
+        if self._file is not None:
+            self._file.write(_RECORD.pack(STOP, self._tick()))
+            self._file.close()
+            self._file = None
+
+    def _tick(self):
+        return self.world.tick_count if self.world is not None else self.tick
+
+    def _string(self, s):
+        sid = self._strings.get(s)
+        if sid is None:
+            sid = self._strings[s] = len(self._strings)
+            data = s.encode()
+            self._file.write(_RECORD.pack(STRING, self._tick()) + _STRING.pack(len(data)) + data)
+        return sid
+
+    def emitted(self, cmd, priority=False):
+        cid = self._next_id
+        self._next_id += 1
+        self._ids[cmd] = cid # (pooled commands are reused: ids are per emission)
+        check, payload = cmd.completion_check, (cmd.args, cmd.kwargs, cmd.key and cmd.key[-1])
+        if check is None:
+            check = NO_CHECK
+        elif check is SIGNALLED:
+            check = SIGNALLED_CHECK
+        elif getattr(check, '__self__', None) is cmd.subject:
+            check = self._string(check.__name__)
+        else:
+            check = CHECK_IN_PAYLOAD
+            payload += (cmd.completion_check,)
+        external = self.world is None or not self.world.ticking
+        data = dumps(payload)
+        self._file.write(_RECORD.pack(EMIT, self._tick())
+                         + _EMIT.pack(cid, cmd.source.uid, cmd.subject.uid, self._string(cmd.action.__name__),
+                                      check, priority, external, len(data)) + data)
+
+    def _event(self, kind, cmd):
+        cid = self._ids.get(cmd)
+        if cid is not None: # (else, emitted before we started)
+            self._file.write(_RECORD.pack(kind, self._tick()) + _ID.pack(cid))
+
+    def executed(self, cmd):
+        self._event(EXECUTE, cmd)
+
+    def completed(self, cmd):
+        self._event(COMPLETE, cmd)
+
+
+@attr.s(frozen=True)
+class Emit:
+    tick = attr.ib()
+    id = attr.ib()
+    source = attr.ib() # uid
+    subject = attr.ib() # uid
+    action = attr.ib() # method name
+    check = attr.ib() # method name, None, SIGNALLED, or CHECK_IN_PAYLOAD
+    priority = attr.ib()
+    external = attr.ib() # emitted between two ticks
+    payload = attr.ib(repr=False) # encoded (args, kwargs, coalesce key[, completion check])
+
+
+def read_log(path):
+    """yields the records of the log at path: Emit instances, and (kind, tick, cmd id) tuples
+    (cmd id None for STOP; the first uid of the world, for UIDS)"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    magic, version = _FILE_HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise Replayer.Error(f'{path} is not a version {VERSION} command log')
+    strings = []
+    offset = _FILE_HEADER.size
+    while offset < len(data):
+        kind, tick = _RECORD.unpack_from(data, offset)
+        offset += _RECORD.size
+        if kind == STRING:
+            n, = _STRING.unpack_from(data, offset)
+            offset += _STRING.size
+            strings.append(data[offset:offset + n].decode())
+            offset += n
+        elif kind == EMIT:
+            cid, source, subject, action, check, priority, external, n = _EMIT.unpack_from(data, offset)
+            offset += _EMIT.size
+            if check >= 0:
+                check = strings[check]
+            else:
+                check = {NO_CHECK: None, SIGNALLED_CHECK: SIGNALLED}.get(check, check)
+            yield Emit(tick, cid, source, subject, strings[action], check, bool(priority), bool(external),
+                       data[offset:offset + n])
+            offset += n
+        elif kind == STOP:
+            yield kind, tick, None
+        else:
+            cid, = _ID.unpack_from(data, offset)
+            offset += _ID.size
+            yield kind, tick, cid
+
+
+class _Tally:
+    """stands in for the Recorder during a replay: counts the executions and completions per tick"""
+
+    def __init__(self, world):
+        self.world = world
+        self.counts = {}
+
+    def emitted(self, cmd, priority=False):
+        pass
+
+    def _count(self, i):
+        counts = self.counts.setdefault(self.world.tick_count, [0, 0])
+        counts[i] += 1
+
+    def executed(self, cmd):
+        self._count(0)
+
+    def completed(self, cmd):
+        self._count(1)
+
+
+@attr.s
+class Replayer:
+    """Replays the log at `path` onto a world (see the module docstring)."""
+
+    class Error(ValueError):
+        """raised when a file is not a command log"""
+        pass
+
+    path = attr.ib()
+
+    @property
+    def first_uid(self):
+        """the first uid of the recorded world (None if it was recorded without a world)"""
+        return next((uid for kind, _, uid in (r for r in read_log(self.path) if not isinstance(r, Emit))
+                     if kind == UIDS), None)
+
+    def seed_uids(self):
+        """makes the agents created from now on get the uids of the recorded ones: to be called
+        before building the world to replay onto. Returns self."""
+        first = self.first_uid
+        if first is not None:
+            ControllableObject.seed_uids(first)
+        return self
+
+    def replay(self, world, external=None):
+        """
+        Feeds the external commands of the log to world (a Scheduler holding the same agents
+        as the recorded one), each at its tick, and ticks the world up to the last recorded
+        tick (that of the end of the recording). `external`: a predicate on Emit records, to choose the commands to feed
+        instead (default: those emitted between two ticks).
+        Returns {ticks, injected, seconds, ticks_per_s, diverged}: diverged is the first tick
+        at which the executions and completions differ from the recorded ones (or None).
+        """
+        if settings.ai_seed is None:
+            logger.warning('settings.ai_seed is not set: the replay will not be deterministic')
+        agents = {agent.uid: agent for agent in world.agents}
+        first = self.first_uid
+        if first is not None and agents and min(agents) != first:
+            logger.warning('the agents do not have the recorded uids: build the world after seed_uids()')
+        external = external or (lambda emit: emit.external)
+        feed, expected, last = [], {}, 0
+        for record in read_log(self.path):
+            if isinstance(record, Emit):
+                if external(record):
+                    feed.append(record)
+                last = max(last, record.tick)
+            else:
+                kind, tick, _ = record
+                if kind in (EXECUTE, COMPLETE):
+                    expected.setdefault(tick, [0, 0])[kind == COMPLETE] += 1
+                last = max(last, tick)
+
+        tally = _Tally(world)
+        previous, ControllableObject.recorder = ControllableObject.recorder, tally
+        injected = len(feed)
+        start, first = time.perf_counter(), world.tick_count
+        try:
+            feed.reverse()
+            while True:
+                while feed and feed[-1].tick <= world.tick_count:
+                    self._emit(feed.pop(), agents)
+                if world.tick_count >= last:
+                    break
+                world.tick()
+        finally:
+            ControllableObject.recorder = previous
+        seconds = time.perf_counter() - start
+
+        diverged = next((tick for tick in sorted(set(expected) | set(tally.counts))
+                         if expected.get(tick) != tally.counts.get(tick)), None)
+        ticks = world.tick_count - first
+        return {'ticks': ticks, 'injected': injected, 'seconds': seconds, 'ticks_per_s': ticks / seconds if seconds else float('inf'),
+                'diverged': diverged}
+
+    @staticmethod
+    def _emit(emit, agents):
+        source, subject = agents.get(emit.source), agents.get(emit.subject)
+        if source is None or subject is None:
+            logger.warning('cannot replay', emit, ': no such agent')
+            return
+        payload = loads(emit.payload, agents)
+        check = emit.check
+        if check == CHECK_IN_PAYLOAD:
+            check = payload[3]
+        elif isinstance(check, str):
+            check = getattr(subject, check)
+        args, kwargs, coalesce = payload[:3]
+        source.emit_command(getattr(subject, emit.action), check, *args, priority=emit.priority,
+                            coalesce=coalesce, **kwargs)
@@ -0,0 +1,283 @@
+"""
+World-level scheduler: owns the agents (ControllableObjects) and fires their periodic jobs
+(command execution, scans, behaviour steps) only when the corresponding settings.timers
+entry is due.
+Timers live in a hierarchical timer wheel, so the cost of a frame is proportional to the
+number of jobs that are due, not to the number of agents in the world.
+"""
+
+import time
+from collections import deque
+import attr
+import settings
+from logger import getLogger
+from .memo import memo
+from .spatial import SpatialIndex
+
+
+logger = getLogger(__name__)
+
+
+def frame_ms(fps=None):
+    """duration of a frame (= of a timer wheel tick), in milliseconds"""
+    return 1000 / (fps or settings.FPS)
+
+
+@attr.s(slots=True)
+class Timer:
+    callback = attr.ib()
+    period = attr.ib(default=0) # in ticks; 0 for one-shot timers
+    owner = attr.ib(default=None, repr=False)
+    expires = attr.ib(default=0) # tick at which the timer is due
+    cancelled = attr.ib(default=False)
+
+    def cancel(self):
+        self.cancelled = True
+
+
+@attr.s
+class TimerWheel:
+    """
+    Hierarchical timer wheel (Varghese & Lauck).
+    Level 0 has one slot per tick; each higher level has slots spanning a whole turn of
+    the level below, and its timers are cascaded down one level when their slot comes up.
+    Scheduling and cancelling are O(1); advancing one tick costs O(due timers), plus an
+    amortised O(1) per timer for the cascades.
+    """
+    bits = attr.ib(default=(8, 6, 6, 6)) # log2 of the number of slots of each level
+    now = attr.ib(default=0, init=False)
+    _wheels = attr.ib(init=False, repr=False)
+    _shifts = attr.ib(init=False, repr=False)
+
+    def __attrs_post_init__(self):
+        self._wheels = [[[] for _ in range(1 << b)] for b in self.bits]
+        self._shifts = [sum(self.bits[:i]) for i in range(len(self.bits) + 1)]
+
+    @property
+    def span(self):
+        """number of ticks covered by the wheel; timers further away are parked at the top level"""
+        return 1 << self._shifts[-1]
+
+    def schedule(self, timer, delay):
+        """schedules timer to fire in `delay` ticks (at least 1)"""
+        timer.expires = self.now + max(int(delay), 1)
+        timer.cancelled = False
+        self._place(timer)
+        return timer
+
+    def _place(self, timer):
+        delta = min(timer.expires - self.now, self.span - 1)
+        when = self.now + delta
+        for level, bits in enumerate(self.bits):
+            if delta < 1 << self._shifts[level + 1]:
+                slot = (when >> self._shifts[level]) & ((1 << bits) - 1)
+                self._wheels[level][slot].append(timer)
+                return
+
+    def _cascade(self, level):
+        """re-places the timers of the current slot of `level`; returns the slot index"""
+        slot = (self.now >> self._shifts[level]) & ((1 << self.bits[level]) - 1)
+        timers = self._wheels[level][slot]
+        self._wheels[level][slot] = []
+        for timer in timers:
+            if not timer.cancelled:
+                self._place(timer)
+        return slot
+
+    def advance(self):
+        """moves to the next tick and returns the timers that are due (not cancelled)"""
+        self.now += 1
+        if self.now & ((1 << self.bits[0]) - 1) == 0:
+            for level in range(1, len(self.bits)):
+                if self._cascade(level) != 0:
+                    break
+
+        slot = self.now & ((1 << self.bits[0]) - 1)
+        timers = self._wheels[0][slot]
+        self._wheels[0][slot] = []
+        due = []
+        for timer in timers:
+            if timer.cancelled:
+                continue
+            if timer.expires > self.now:
+                # was parked beyond the span of the wheel
+                self._place(timer)
+                continue
+            due.append(timer)
+        return due
+
+
+@attr.s
+class Scheduler:
+    """
+    Owns the agents of a world, and steps them when their timers are due:
+    - agent jobs, as declared by ControllableObject._timers (e.g. update, scan)
+    - each of the agent's behaviours, at the rate given by Behaviour._timer.
+
+    Each tick is one frame (1000 / settings.FPS ms). The jobs run in a frame are capped by
+    a time budget (by default, the frame time): the due jobs that do not fit are carried
+    over to the next frame, ahead of the jobs that become due then.
+
+    Agents can drop out of their 'update' job while they have nothing to do (see sleep()
+    and wake()), so that idle agents cost nothing per frame.
+
+    The agents that have a position are also kept in a spatial index (self.spatial), which
+    behaviours can query through agent.world. Agents report their moves (see
+    ControllableObject.moved); the whole index is only refreshed every
+    settings.timers['spatial_refresh'], to catch the moves that went unreported.
+    """
+    fps = attr.ib(default=attr.Factory(lambda: settings.FPS))
+    budget = attr.ib(default=None) # seconds; None means one frame
+    wheel = attr.ib(factory=TimerWheel, init=False, repr=False)
+    spatial = attr.ib(factory=SpatialIndex, init=False, repr=False)
+    agents = attr.ib(factory=dict, init=False, repr=False) # agent -> {job name or id(behaviour): timer}
+    _backlog = attr.ib(factory=deque, init=False, repr=False) # due jobs deferred by the budget
+    _stagger = attr.ib(default=0, init=False, repr=False)
+    ticking = attr.ib(default=False, init=False, repr=False) # True while tick() runs the jobs
+    lod = attr.ib(default=None, init=False, repr=False) # ai.lod.LevelOfDetail, if any
+    sensors = attr.ib(default=None, init=False, repr=False) # ai.sensors.Sensors, if any
+    _refresh_period = attr.ib(default=1, init=False, repr=False) # ticks between spatial.refresh()es
+
+    def __attrs_post_init__(self):
+        if self.budget is None:
+            self.budget = 1 / self.fps
+        self._refresh_period = self.ticks('spatial_refresh')
+        if settings.command_telemetry:
+            from .telemetry import telemetry # (only imported when asked for)
+            telemetry.enable()
+            if telemetry.world is None:
+                telemetry.watch(self)
+
+    @property
+    def tick_count(self):
+        return self.wheel.now
+
+    def ticks(self, timer_name):
+        """converts the settings.timers entry `timer_name` to a number of ticks (None -> 1)"""
+        if timer_name is None:
+            return 1
+        return max(1, round(settings.timers[timer_name] / frame_ms(self.fps)))
+
+    def _start(self, agent, key, callback, timer_name):
+        period = self.ticks(timer_name)
+        timer = Timer(callback, period, agent)
+        # spread the first firing of same-period jobs over the period,
+        # so that they do not all come due on the same frame
+        self._stagger += 1
+        self.wheel.schedule(timer, 1 + self._stagger % period)
+        self.agents[agent][key] = timer
+        return timer
+
+    def add(self, agent):
+        """takes ownership of agent and starts its jobs"""
+        if agent in self.agents:
+            return agent
+        self.agents[agent] = {}
+        agent.world = self
+        if getattr(agent, 'pos', None) is not None:
+            self.spatial.insert(agent)
+        for job, timer_name in agent._timers.items():
+            callback = getattr(agent, job, None)
+            if callback is not None:
+                self._start(agent, job, callback, timer_name)
+        for behaviour in agent.behaviours:
+            self.add_behaviour(agent, behaviour)
+        if self.lod is not None:
+            self.lod.admit(agent)
+        if self.sensors is not None:
+            self.sensors.admit(agent)
+        return agent
+
+    def add_behaviour(self, agent, behaviour):
+        """starts stepping behaviour, which belongs to agent"""
+        return self._start(agent, id(behaviour), behaviour.step, behaviour._timer)
+
+    def pace(self, agent, behaviour, slowdown=1, callback=None):
+        """
+        Steps behaviour once every `slowdown` times its period, calling `callback` (default:
+        behaviour.step). Speeding up takes effect within one (normal) period.
+        """
+        timer = self.agents[agent].get(id(behaviour))
+        if timer is None:
+            return
+        base = self.ticks(behaviour._timer)
+        period = base * slowdown
+        callback = callback or behaviour.step
+        if period < timer.period and not timer.cancelled:
+            # do not wait for the slow timer to come due
+            timer.cancel()
+            timer = self.agents[agent][id(behaviour)] = Timer(callback, period, agent)
+            self._stagger += 1
+            self.wheel.schedule(timer, 1 + self._stagger % base)
+        else:
+            timer.period = period
+            timer.callback = callback
+        return timer
+
+    def every(self, timer_name, callback):
+        """runs callback periodically, at the settings.timers entry timer_name; returns its Timer"""
+        timer = Timer(callback, self.ticks(timer_name))
+        self.wheel.schedule(timer, 1)
+        return timer
+
+    def sleep(self, agent, job='update'):
+        """stops running agent's job, until wake()"""
+        timer = self.agents[agent].get(job)
+        if timer is not None:
+            timer.cancel()
+
+    def wake(self, agent, job='update'):
+        """resumes running agent's job, from the next frame"""
+        timer = self.agents[agent].get(job)
+        if timer is None or not timer.cancelled:
+            return
+        # the cancelled timer may still sit in the wheel: start a new one
+        timer = self.agents[agent][job] = Timer(timer.callback, timer.period, agent)
+        self.wheel.schedule(timer, 1)
+
+    def remove(self, agent):
+        for timer in self.agents.pop(agent).values():
+            timer.cancel()
+        if self.lod is not None:
+            self.lod.discard(agent)
+        if self.sensors is not None:
+            self.sensors.discard(agent)
+        if agent in self.spatial:
+            self.spatial.remove(agent)
+        agent.world = None
+
+    def tick(self):
+        """advances one frame and runs the due jobs, within budget. Returns the number of jobs run."""
+        deadline = time.perf_counter() + self.budget
+        if self.wheel.now % self._refresh_period == 0:
+            self.spatial.refresh()
+        due = self._backlog
+        due.extend(self.wheel.advance())
+        ran = 0
+        self.ticking = True
+        memo.begin()
+        try:
+            while due:
+                timer = due.popleft()
+                if timer.cancelled:
+                    continue
+                try:
+                    timer.callback()
+                except Exception as e:
+                    # (one failing job must not take the others down, nor lose its timer)
+                    logger.error(timer.owner or timer.callback, 'job failed:', repr(e))
+                ran += 1
+                if timer.period and not timer.cancelled:
+                    self.wheel.schedule(timer, timer.period)
+                if time.perf_counter() > deadline:
+                    break
+        finally:
+            self.ticking = False
+            memo.end()
+        if due:
+            logger.debug('frame', self.tick_count, 'over budget:', len(due), 'jobs deferred')
+        return ran
+
+    def run(self, frames):
+        """runs `frames` ticks; returns the number of jobs run"""
+        return sum(self.tick() for _ in range(frames))
@@ -0,0 +1,125 @@
+"""
+World-level sensor sweep: instead of every agent scanning its surroundings on its own 'scan'
+job, the scans that come due in a tick are answered together, with one batched spatial query
+(see SpatialIndex.within_many).
+
+Each agent (or group of agents sharing their contacts, e.g. the ships of a fleet: see share())
+is scanned every settings.timers['scan_rate'], with a single walk over the index. A contact that is not seen any more stays in
+the contact list until it has been missed settings.tracking_timeout scans in a row, so that
+contacts do not blink in and out of sight between scans. The scan radius is the agent's
+scan_range, or settings.scan_range.
+
+    sensors = Sensors(world)
+    sensors.share(fleet.ships)
+    sensors.contacts(ship)
+"""
+
+import attr
+import settings
+from logger import getLogger
+
+
+logger = getLogger(__name__)
+
+
+@attr.s(eq=False)
+class Track:
+    """the contacts of an agent, or of a group of agents sharing them"""
+    members = attr.ib(factory=list)
+    # contact -> scans left before it is lost, if it is not seen again
+    timeouts = attr.ib(factory=dict, repr=False)
+
+    @property
+    def contacts(self):
+        return list(self.timeouts)
+
+    def update(self, seen):
+        """a scan saw `seen`"""
+        timeouts = dict.fromkeys(seen, settings.tracking_timeout)
+        for contact, left in self.timeouts.items():
+            if left > 1 and contact not in timeouts:
+                timeouts[contact] = left - 1
+        self.timeouts = timeouts
+
+
+@attr.s
+class Sensors:
+    """
+    Scans the positioned agents of world (a Scheduler), in place of their own 'scan' jobs:
+    every tick, the tracks that are due are swept at once.
+    """
+    world = attr.ib()
+    tracks = attr.ib(factory=dict, init=False, repr=False) # agent -> Track
+    _slots = attr.ib(factory=list, init=False, repr=False) # tick % period -> tracks scanned then
+    _stagger = attr.ib(default=0, init=False, repr=False)
+    _timer = attr.ib(default=None, init=False, repr=False)
+
+    def __attrs_post_init__(self):
+        self._slots = [[] for _ in range(self.world.ticks('scan_rate'))]
+        self.world.sensors = self
+        self._timer = self.world.every(None, self.sweep)
+        for agent in list(self.world.agents):
+            self.admit(agent)
+
+    def stop(self):
+        """back to the agents' own scan jobs"""
+        self._timer.cancel()
+        self.world.sensors = None
+        for agent in self.tracks:
+            self.world.wake(agent, 'scan')
+        self.tracks.clear()
+
+    def _place(self, track):
+        self._slots[self._stagger % len(self._slots)].append(track)
+        self._stagger += 1
+
+    def admit(self, agent):
+        """agent was added to the world"""
+        if getattr(agent, 'pos', None) is None or agent in self.tracks:
+            return
+        track = self.tracks[agent] = Track([agent])
+        self._place(track)
+        self.world.sleep(agent, 'scan')
+
+    def discard(self, agent):
+        track = self.tracks.pop(agent, None)
+        if track is not None:
+            track.members.remove(agent) # (emptied tracks are dropped by the next sweep)
+
+    def share(self, agents):
+        """the (positioned) agents share one track from now on: each one sees what any of them sees"""
+        agents = [a for a in agents if a in self.tracks]
+        if not agents:
+            return None
+        shared = Track()
+        for agent in agents:
+            track = self.tracks[agent]
+            for contact, left in track.timeouts.items():
+                shared.timeouts[contact] = max(left, shared.timeouts.get(contact, 0))
+            track.members.remove(agent)
+            shared.members.append(agent)
+            self.tracks[agent] = shared
+        for member in agents:
+            shared.timeouts.pop(member, None)
+        self._place(shared)
+        return shared
+
+    def contacts(self, agent):
+        """what agent has in sight (or lost sight of, less than tracking_timeout scans ago)"""
+        track = self.tracks.get(agent)
+        return track.contacts if track is not None else []
+
+    def sweep(self):
+        """scans the tracks due at this tick"""
+        slot = self._slots[self.world.tick_count % len(self._slots)]
+        slot[:] = [track for track in slot if track.members]
+        if not slot:
+            return
+        queries = [([agent.pos for agent in track.members], self._range(track), track.members) for track in slot]
+        for track, seen in zip(slot, self.world.spatial.within_many(queries)):
+            track.update(seen)
+
+    @staticmethod
+    def _range(track):
+        # (a track scans as far as its widest sensor reaches)
+        return max(getattr(agent, 'scan_range', None) or settings.scan_range for agent in track.members)
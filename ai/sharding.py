@@ -0,0 +1,499 @@
+"""
+Sharded simulation: the agents (ControllableObjects) of a world are split by spatial region
+across several shards, each running its own Scheduler -- by default, each in its own process.
+
+- Agents are addressed by their uid. In a shard, the agents living elsewhere are represented
+  by RemoteAgents: they can be sent commands (emit_command(remote.goto, ...) works as usual),
+  but not observed.
+- Commands to agents of other shards are batched by the ShardedWorld and delivered at the
+  start of the next tick, as are the notifications of their execution back to the sender.
+  Their completion check must be None, SIGNALLED, or a method of the subject.
+- Agents whose position moves them out of the region of their shard migrate, at the end of
+  the tick, with their command queues and behaviours; they resume in their new shard from
+  the next tick. Behaviours drop their references to agents that went out of reach (and
+  the sub-behaviours that had one halt), since they could not observe them any more.
+
+    world = ShardedWorld(Strips(4, width=1000))
+    for agent in agents:
+        world.add(agent)
+    with world:
+        world.run(1000)
+        agents = world.collect()
+"""
+
+import io
+import itertools
+import multiprocessing
+import pickle
+import traceback
+import weakref
+from collections import defaultdict
+import attr
+from logger import getLogger
+from .command import Command, ControllableObject, SIGNALLED
+from .scheduler import Scheduler
+
+
+logger = getLogger(__name__)
+
+
+@attr.s(frozen=True)
+class Strips:
+    """splits the plane in `shards` vertical strips, `width` wide, starting from x=0
+    (the first and last strips extend indefinitely to the left and right)"""
+    shards = attr.ib()
+    width = attr.ib()
+
+    def __call__(self, pos):
+        return min(max(int(pos[0] // self.width), 0), self.shards - 1)
+
+
+class RemoteMethod:
+    """a method of a RemoteAgent: only good as the action (or completion check) of a command"""
+
+    def __init__(self, agent, name):
+        self.__self__ = agent
+        self.__name__ = name
+
+    def __repr__(self):
+        return f'<RemoteMethod {self.__name__} of {self.__self__}>'
+
+    def __reduce__(self):
+        return getattr, (self.__self__, self.__name__)
+
+    def __call__(self, *args, **kwargs):
+        raise TypeError(f'{self} runs in another shard: send it as a command')
+
+
+class RemoteAgent:
+    """
+    Stand-in for an agent living in another shard: its methods can be sent as commands,
+    but its state cannot be read.
+    """
+    world = None
+    command_pool = None # (the commands it sends are built on delivery, outside of any pool)
+    _cmd_priority = 0 # (the priority of the commands it sends travels with them)
+
+    def __init__(self, uid, cls=None, router=None):
+        self.uid = uid
+        self._cls = cls # class of the agent, if known
+        self._router = router
+
+    def __repr__(self):
+        return f'<RemoteAgent {self.uid}>'
+
+    def __getattr__(self, name):
+        if not name.startswith('_') and (self._cls is None or callable(getattr(self._cls, name, None))):
+            return RemoteMethod(self, name)
+        raise AttributeError(f'{name!r}: {self} lives in another shard, and cannot be observed')
+
+    def receive_command(self, cmd, priority=False):
+        self._router.send_command(self.uid, cmd, priority)
+
+    def _handle_command_execution(self, cmd):
+        self._router.send_executed(self.uid, cmd)
+
+    def _handle_command_completion(self, cmd):
+        pass # commands complete where they run
+
+
+@attr.s
+class Router:
+    """
+    The messaging side of a shard: collects the messages for the agents of other shards,
+    and tracks the commands that cross shards, by token.
+    """
+    index = attr.ib() # of the shard, for the tokens to be unique across shards
+    outbox = attr.ib(factory=list) # (uid, pickled (uid, message))
+    tokens = attr.ib(factory=weakref.WeakKeyDictionary) # cross-shard command -> token
+    commands = attr.ib(factory=weakref.WeakValueDictionary) # token -> cross-shard command
+    _proxies = attr.ib(factory=dict) # uid -> RemoteAgent
+    _count = attr.ib(factory=itertools.count, repr=False)
+
+    def proxy(self, uid, cls=None):
+        agent = self._proxies.get(uid)
+        if agent is None:
+            agent = self._proxies[uid] = RemoteAgent(uid, cls, self)
+        return agent
+
+    def token(self, cmd):
+        token = self.tokens.get(cmd)
+        if token is None:
+            token = (self.index, next(self._count))
+            self.link(cmd, token)
+        return token
+
+    def link(self, cmd, token):
+        self.tokens[cmd] = token
+        self.commands[token] = cmd
+
+    def unlink(self, token):
+        """forgets token: returns its command (None if unknown)"""
+        cmd = self.commands.pop(token, None)
+        if cmd is not None:
+            self.tokens.pop(cmd, None)
+        return cmd
+
+    def post(self, uid, message):
+        self.outbox.append((uid, dumps((uid, message), self)))
+
+    def send_command(self, uid, cmd, priority=False):
+        check = cmd.completion_check
+        if isinstance(check, RemoteMethod):
+            check = check.__name__
+        elif check is not None and check is not SIGNALLED:
+            raise ValueError(f'{cmd}: the completion check of a command to another shard must be '
+                             f'None, SIGNALLED, or a method of the subject')
+        self.post(uid, ('command', cmd.source.uid, cmd.priority, cmd.action.__name__, check,
+                        cmd.args, cmd.kwargs, cmd.key, self.token(cmd), priority))
+
+    def send_executed(self, uid, cmd):
+        token = self.tokens.pop(cmd, None)
+        if token is None:
+            logger.warning(cmd, 'executed, but its sender', uid, 'is unknown')
+            return
+        self.commands.pop(token, None)
+        self.post(uid, ('executed', token))
+
+    def become_proxy(self, agent):
+        """turns agent, which left, into its RemoteAgent: whatever still refers to it now refers to the proxy"""
+        uid, cls = agent.uid, type(agent)
+        agent.__dict__.clear()
+        try:
+            agent.__class__ = RemoteAgent
+        except TypeError: # (e.g. a __slots__ layout)
+            logger.warning('cannot turn', cls.__name__, uid, 'into a RemoteAgent: stale references remain')
+            return
+        agent.__init__(uid, cls, self)
+        self._proxies[uid] = agent
+
+
+class _Pickler(pickle.Pickler):
+    """pickles the agents (and the router) by reference"""
+
+    def __init__(self, file, router):
+        super().__init__(file, pickle.HIGHEST_PROTOCOL)
+        self.router = router
+        self._agent_types = {} # type -> whether it is an agent's: this is called for every object
+
+    def persistent_id(self, obj):
+        cls = type(obj)
+        agent = self._agent_types.get(cls)
+        if agent is None:
+            agent = self._agent_types[cls] = issubclass(cls, (ControllableObject, RemoteAgent))
+        if agent:
+            return 'agent', obj.uid, obj._cls if cls is RemoteAgent else cls
+        if obj is self.router:
+            return 'router'
+        return None
+
+
+class _Unpickler(pickle.Unpickler):
+    """resolves the references to agents to the local ones, or to RemoteAgents"""
+
+    def __init__(self, file, router, local, shells=None):
+        super().__init__(file)
+        self.router = router
+        self.local = local
+        self.shells = shells or {} # agents being restored
+
+    def persistent_load(self, pid):
+        if pid == 'router':
+            return self.router
+        _, uid, cls = pid
+        agent = self.shells.get(uid) or self.local.get(uid)
+        return agent if agent is not None else self.router.proxy(uid, cls)
+
+
+def dumps(obj, router):
+    f = io.BytesIO()
+    _Pickler(f, router).dump(obj)
+    return f.getvalue()
+
+
+def loads(data, router, local=None):
+    return _Unpickler(io.BytesIO(data), router, {} if local is None else local).load()
+
+
+def export(agents, router):
+    """
+    Pickles agents, which move together to the same shard, along with their command queues
+    and behaviours. The commands they exchange with the agents staying behind get tokens,
+    for their execution to be notified across shards.
+    The agents are pickled as empty shells first, then their states: since agents refer to
+    each other by reference, pickling a crowd does not recurse through all of it.
+    """
+    batch = {id(agent) for agent in agents}
+    links = []
+    for agent in agents:
+        pending = [(cmd, cmd.source) for cmd in agent.commands.incoming]
+        pending += [(cmd, cmd.subject) for cmd in agent.commands.outgoing]
+        for cmd, other in pending:
+            if id(other) not in batch:
+                links.append((cmd, router.token(cmd)))
+    f = io.BytesIO()
+    pickle.dump([(agent.uid, type(agent)) for agent in agents], f, pickle.HIGHEST_PROTOCOL)
+    _Pickler(f, router).dump(([agent.__getstate__() for agent in agents], links))
+    return f.getvalue()
+
+
+def restore(data, router, local):
+    """unpickles an export(): returns the agents and the tokens of their cross-shard commands"""
+    f = io.BytesIO(data)
+    shells = {uid: cls.__new__(cls) for uid, cls in pickle.load(f)}
+    agents = list(shells.values())
+    states, links = _Unpickler(f, router, local, shells).load()
+    for agent, state in zip(agents, states):
+        agent.__setstate__(state)
+    return agents, links
+
+
+def _drop_remote(behaviour):
+    """drops the references of behaviour (and of the behaviours it delegated to) to RemoteAgents;
+    the sub-behaviours that had any halt"""
+    b = behaviour
+    while b is not None:
+        for name, value in list(vars(b).items()):
+            if name != 'agent' and isinstance(value, RemoteAgent):
+                setattr(b, name, None)
+                if b._parent is not None:
+                    b.halt()
+        b = b.sub
+
+
+class Shard:
+    """the agents of a region, their Scheduler, and their messages to other shards"""
+
+    def __init__(self, index, partition, fps=None, budget=None):
+        self.index = index
+        self.partition = partition
+        kwargs = {'budget': budget} if fps is None else {'fps': fps, 'budget': budget}
+        self.world = Scheduler(**kwargs)
+        self.router = Router(index)
+        self.local = {} # uid -> agent
+
+    def step(self, inbox, immigrants):
+        """
+        Settles the immigrants, delivers the messages and runs a tick. Returns the messages
+        for the other shards, as (uid, pickled message) pairs, and the agents leaving, as
+        (shard, uids, pickled agents) triples.
+        """
+        for data in immigrants:
+            self.settle(data)
+        for data in inbox:
+            self.deliver(*loads(data, self.router, self.local))
+        self.world.tick()
+        outbox, self.router.outbox = self.router.outbox, []
+        return outbox, self.emigrate()
+
+    def settle(self, data):
+        agents, links = restore(data, self.router, self.local)
+        for cmd, token in links:
+            self.router.link(cmd, token)
+        for agent in agents:
+            self.local[agent.uid] = agent
+            self.router._proxies.pop(agent.uid, None)
+        for agent in agents:
+            for b in agent.behaviours:
+                _drop_remote(b)
+            self.world.add(agent)
+
+    def deliver(self, uid, message):
+        agent = self.local.get(uid)
+        if agent is None:
+            logger.warning('message for unknown agent', uid, 'in shard', self.index, ':', message[0])
+            return
+        if message[0] == 'command':
+            _, source, priority, action, check, args, kwargs, key, token, first = message
+            if isinstance(check, str):
+                check = getattr(agent, check)
+            cmd = Command(self.router.proxy(source), getattr(agent, action), check, *args, **kwargs)
+            cmd.priority = priority
+            cmd.key = key # (coalesced: supersedes the queued command with the same key)
+            self.router.link(cmd, token)
+            agent.receive_command(cmd, priority=first)
+        elif message[0] == 'executed':
+            cmd = self.router.unlink(message[1])
+            if cmd is not None and cmd.source is agent:
+                agent._handle_command_execution(cmd)
+
+    def emigrate(self):
+        leaving = defaultdict(list)
+        for agent in self.local.values():
+            pos = getattr(agent, 'pos', None)
+            if pos is not None:
+                shard = self.partition(pos)
+                if shard != self.index:
+                    leaving[shard].append(agent)
+        if not leaving:
+            return []
+
+        emigrants = [(shard, [a.uid for a in agents], export(agents, self.router))
+                     for shard, agents in leaving.items()]
+        for agents in leaving.values():
+            for agent in agents:
+                self.world.remove(agent)
+                del self.local[agent.uid]
+                self.router.become_proxy(agent)
+        for agent in self.local.values():
+            for b in agent.behaviours:
+                _drop_remote(b)
+        return emigrants
+
+    def collect(self):
+        return export(list(self.local.values()), Router(self.index))
+
+
+def _serve(conn, index, partition, fps, budget, first_uid):
+    """main loop of a shard process"""
+    # agents created in the shards get uids that cannot collide with the other shards'
+    ControllableObject.seed_uids(first_uid + index, partition.shards)
+    shard = Shard(index, partition, fps, budget)
+    while True:
+        op, args = conn.recv()
+        if op == 'close':
+            break
+        try:
+            conn.send((True, getattr(shard, op)(*args)))
+        except Exception:
+            conn.send((False, traceback.format_exc()))
+    conn.close()
+
+
+class _LocalShard:
+    """runs a Shard in the calling process"""
+
+    def __init__(self, *args):
+        self.shard = Shard(*args[:4])
+        self._result = None
+
+    def send(self, op, *args):
+        self._result = getattr(self.shard, op)(*args)
+
+    def recv(self):
+        return self._result
+
+    def close(self):
+        pass
+
+
+class _ProcessShard:
+    """runs a Shard in a child process"""
+
+    def __init__(self, *args):
+        self.conn, child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_serve, args=(child,) + args, daemon=True)
+        self.process.start()
+        child.close()
+
+    def send(self, op, *args):
+        self.conn.send((op, args))
+
+    def recv(self):
+        ok, result = self.conn.recv()
+        if not ok:
+            raise ShardedWorld.ShardError(result)
+        return result
+
+    def close(self):
+        self.conn.send(('close', ()))
+        self.process.join()
+
+
+@attr.s
+class ShardedWorld:
+    """
+    Coordinates the shards: starts them, ticks them in lockstep, and routes the messages and
+    migrating agents between them.
+    Agents are added before start(); from then on, they live in the shards (see collect()).
+    """
+    partition = attr.ib() # position -> shard index; with a `shards` attribute (e.g. Strips)
+    processes = attr.ib(default=True) # False: run all the shards in this process
+    fps = attr.ib(default=None)
+    budget = attr.ib(default=None) # per shard; see Scheduler
+    directory = attr.ib(factory=dict, init=False, repr=False) # uid -> shard index
+    _added = attr.ib(factory=list, init=False, repr=False) # (agent, shard) added before start()
+    _shards = attr.ib(factory=list, init=False, repr=False)
+    _inboxes = attr.ib(default=None, init=False, repr=False)
+    _immigrants = attr.ib(default=None, init=False, repr=False)
+    tick_count = attr.ib(default=0, init=False)
+
+    class ShardError(RuntimeError):
+        """raised when a shard process fails (with its traceback as message)"""
+        pass
+
+    def __enter__(self):
+        if not self._shards:
+            self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add(self, agent, shard=None):
+        """agent goes to `shard` (by default, the one of its position; 0 if it has none)"""
+        if self._shards:
+            raise RuntimeError('agents can only be added before start()')
+        if shard is None:
+            pos = getattr(agent, 'pos', None)
+            shard = self.partition(pos) if pos is not None else 0
+        self._added.append((agent, shard))
+        return agent
+
+    def start(self):
+        n = self.partition.shards
+        handle = _ProcessShard if self.processes else _LocalShard
+        first_uid = next(ControllableObject._uids)
+        self._shards = [handle(i, self.partition, self.fps, self.budget, first_uid) for i in range(n)]
+
+        groups = defaultdict(list)
+        for agent, shard in self._added:
+            groups[shard].append(agent)
+            self.directory[agent.uid] = shard
+        self._added = []
+        router = Router(-1)
+        self._inboxes = [[] for _ in range(n)]
+        self._immigrants = [[export(groups[i], router)] if groups[i] else [] for i in range(n)]
+
+    def tick(self):
+        for shard, inbox, immigrants in zip(self._shards, self._inboxes, self._immigrants):
+            shard.send('step', inbox, immigrants)
+        results = [shard.recv() for shard in self._shards]
+
+        n = len(self._shards)
+        self._inboxes = [[] for _ in range(n)]
+        self._immigrants = [[] for _ in range(n)]
+        for _, emigrants in results:
+            for shard, uids, data in emigrants:
+                self._immigrants[shard].append(data)
+                for uid in uids:
+                    self.directory[uid] = shard
+        for outbox, _ in results:
+            for uid, message in outbox:
+                shard = self.directory.get(uid)
+                if shard is None:
+                    logger.warning('message for unknown agent', uid, 'dropped')
+                    continue
+                self._inboxes[shard].append(message)
+        self.tick_count += 1
+
+    def run(self, frames):
+        for _ in range(frames):
+            self.tick()
+
+    def collect(self):
+        """copies of the agents, as they are in the shards: uid -> agent (for inspection)"""
+        for shard in self._shards:
+            shard.send('collect')
+        router, agents = Router(-1), {}
+        exports = [shard.recv() for shard in self._shards]
+        exports += itertools.chain(*self._immigrants) # (migrating: they settle at the next tick)
+        for data in exports:
+            for agent in restore(data, router, agents)[0]:
+                agents[agent.uid] = agent
+        return agents
+
+    def close(self):
+        for shard in self._shards:
+            shard.close()
+        self._shards = []
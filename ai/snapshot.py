@@ -0,0 +1,458 @@
+"""
+Compact snapshots of the AI state of a population of agents: their command queues, their
+behaviours (with their sub-behaviour stacks) and the behaviour traces.
+
+A snapshot file holds a few struct-packed tables (numpy structured arrays: one row per
+agent, per queued command and per behaviour), a flat int16 array of trace ids and a blob
+of marshalled values (command arguments, behaviour fields), plus a JSON string table.
+Commands are stored as their action name and arguments, not as pickled bound methods;
+references to agents, as their uid. Files are memory-mapped when read: the tables are views
+on the file, and only the rows that are restored are decoded.
+
+The state is restored onto existing agents (as rebuilt by the game), matched by uid. The
+members of a group command (see ai.command.GroupCommand) are restored as plain commands.
+
+    checkpoints = Checkpoints('saves/')
+    checkpoints.save(agents) # full snapshot
+    ...
+    checkpoints.save(agents) # delta: only the agents that changed since the previous save
+    ...
+    checkpoints.restore(agents)
+"""
+
+import hashlib
+import io
+import json
+import marshal
+import mmap
+import os
+import pickle
+import struct
+import weakref
+from itertools import count
+import attr
+import numpy as np
+import settings
+from logger import getLogger
+from .command import Command, ControllableObject, GroupCommand, SIGNALLED
+from .behaviours.behaviour import Behaviour
+from .behaviours.trace import TraceBuffer
+from .memo import MEMO_PREFIX
+
+
+logger = getLogger(__name__)
+
+MAGIC = b'BSNP'
+VERSION = 2
+_HEADER = struct.Struct('<4sHBxIQ') # magic, version, full (1) or delta (0), checkpoint number, JSON length
+
+AGENT = np.dtype([('uid', '<i8'), ('cls', '<u4'), ('executing', '<i8'),
+                  ('cmd_start', '<u8'), ('cmd_count', '<u4'), ('b_start', '<u8'), ('b_count', '<u4')])
+COMMAND = np.dtype([('id', '<i8'), ('queue', 'u1'), ('source', '<i8'), ('subject', '<i8'),
+                    ('action', '<u4'), ('check', '<i4'), ('priority', '<i4'), ('done', 'u1'),
+                    ('payload', '<u8'), ('size', '<u4')])
+BEHAVIOUR = np.dtype([('cls', '<u4'), ('depth', 'u1'), ('state', '<i2'), ('halted', 'u1'), ('next', '<i2'),
+                      ('trace', '<u8'), ('trace_len', '<u4'), ('trace_total', '<i8'),
+                      ('payload', '<u8'), ('size', '<u4')])
+
+# command queues
+INCOMING, OUTGOING, EXECUTING = 0, 1, 2
+# COMMAND check column
+NO_CHECK, SIGNALLED_CHECK, CHECK_IN_PAYLOAD = -1, -2, -3
+# BEHAVIOUR state / next columns
+NO_STATE = -32768
+
+# behaviour attributes that have columns of their own, or that are rebuilt on restore
+_BEHAVIOUR_BASE = {'agent', 'trace', 'state', 'sub', '_halted', '_next', '_parent', '_busy', '_pooled'}
+
+
+# payloads: marshalled values, prefixed with _PLAIN, or with _PACKED if they hold values that
+# marshal cannot store as they are (see _pack), which are then tagged with these markers
+_PLAIN, _PACKED = b'=', b'&'
+_AGENT_REF = '\0agent'
+_METHOD_REF = '\0method'
+_PICKLED = '\0pickle'
+_SCALARS = {type(None), bool, int, float, str, bytes}
+
+
+def dumps(value):
+    """encodes value (which may reference agents, by uid) as a payload: see loads()"""
+    try:
+        return _PLAIN + marshal.dumps(value, 2) # (version 2: no back-references, equal values dump alike)
+    except ValueError:
+        return _PACKED + marshal.dumps(_pack(value), 2)
+
+
+def _digest(rows):
+    """digest of the rows of an agent (see _Writer.agent): of their marshalled bytes, payloads included"""
+    return hashlib.blake2b(marshal.dumps(rows, 2), digest_size=16).digest()
+
+
+def loads(data, agents):
+    """decodes a dumps() payload, resolving agent references through agents (uid -> agent)"""
+    value = marshal.loads(data[1:])
+    return value if data[:1] == _PLAIN else _unpack(value, agents)
+
+
+def _pack(value):
+    """value, with the agents replaced by their uid (and anything marshal would choke on, pickled)"""
+    cls = type(value)
+    if cls in _SCALARS:
+        return value
+    if cls is tuple:
+        return tuple([_pack(v) for v in value])
+    if cls is list:
+        return [_pack(v) for v in value]
+    if cls is dict:
+        return {_pack(k): _pack(v) for k, v in value.items()}
+    if isinstance(value, ControllableObject):
+        return (_AGENT_REF, value.uid)
+    if isinstance(getattr(value, '__self__', None), ControllableObject):
+        return (_METHOD_REF, value.__self__.uid, value.__name__)
+    return (_PICKLED, pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+
+
+def _unpack(value, agents):
+    cls = type(value)
+    if cls is tuple:
+        tag = value[0] if value else None
+        if tag == _AGENT_REF:
+            return agents.get(value[1])
+        if tag == _METHOD_REF:
+            agent = agents.get(value[1])
+            return getattr(agent, value[2]) if agent is not None else None
+        if tag == _PICKLED:
+            return pickle.loads(value[1])
+        return tuple([_unpack(v, agents) for v in value])
+    if cls is list:
+        return [_unpack(v, agents) for v in value]
+    if cls is dict:
+        return {_unpack(k, agents): _unpack(v, agents) for k, v in value.items()}
+    return value
+
+
+class _Writer:
+    """accumulates the rows of a snapshot"""
+
+    def __init__(self, ids, strings):
+        self.ids = ids # command -> id, shared by the snapshots of a series
+        self.strings = strings # string -> index, idem
+        self.agents = []
+        self.commands = []
+        self.behaviours = []
+        self.traces = []
+        self.payload = io.BytesIO()
+        self._trace_len = 0
+
+    def string(self, s):
+        index = self.strings.get(s)
+        if index is None:
+            index = self.strings[s] = len(self.strings)
+        return index
+
+    def blob(self, data):
+        offset = self.payload.tell()
+        self.payload.write(data)
+        return offset, len(data)
+
+    def command_id(self, cmd):
+        cid = self.ids.get(cmd)
+        if cid is None:
+            cid = self.ids[cmd] = next(self.ids.count)
+        return cid
+
+    def command(self, cmd, queue):
+        check = cmd.completion_check
+        payload = (cmd.args, cmd.kwargs, cmd.key)
+        if check is None:
+            check = NO_CHECK
+        elif check is SIGNALLED:
+            check = SIGNALLED_CHECK
+        elif getattr(check, '__self__', None) is cmd.subject:
+            check = self.string(check.__name__)
+        else:
+            check = CHECK_IN_PAYLOAD
+            payload += (cmd.completion_check,)
+        return (self.command_id(cmd), queue, cmd.source.uid, cmd.subject.uid, self.string(cmd.action.__name__),
+                check, cmd.priority, cmd._done), dumps(payload)
+
+    def behaviour(self, b, depth):
+        cls = type(b)
+        fields = {name: value for name, value in vars(b).items()
+                  if name not in _BEHAVIOUR_BASE and not name.startswith(MEMO_PREFIX)}
+        state = NO_STATE if b.state is None else b.state
+        nxt = NO_STATE if b._next is None else b._next
+        trace = (-1, ()) if b.trace is None else (b.trace.total, tuple(b.trace.recent()))
+        return ((self.string(f'{cls.__module__}:{cls.__qualname__}'), depth, state, b._halted, nxt),
+                trace, dumps(fields))
+
+    def agent(self, agent):
+        """the rows of agent, payloads included (but not placed in the file yet)"""
+        commands = [self.command(cmd, INCOMING) for cmd in agent.commands.incoming]
+        commands += [self.command(cmd, OUTGOING) for cmd in agent.commands.outgoing
+                     if type(cmd) is not GroupCommand] # (the members are restored as plain commands)
+        executing = -1
+        if agent.executing is not None:
+            commands.append(self.command(agent.executing, EXECUTING))
+            executing = commands[-1][0][0]
+        behaviours = []
+        for b in agent.behaviours:
+            depth = 0
+            while b is not None:
+                behaviours.append(self.behaviour(b, depth))
+                b, depth = b.sub, depth + 1
+        cls = type(agent)
+        return (agent.uid, self.string(f'{cls.__module__}:{cls.__qualname__}'), executing), commands, behaviours
+
+    def add(self, rows):
+        (uid, cls, executing), commands, behaviours = rows
+        self.agents.append((uid, cls, executing, len(self.commands), len(commands),
+                            len(self.behaviours), len(behaviours)))
+        for row, payload in commands:
+            self.commands.append(row + self.blob(payload))
+        for row, (total, ids), payload in behaviours:
+            self.behaviours.append(row + (self._trace_len, len(ids), total) + self.blob(payload))
+            self.traces.append(ids)
+            self._trace_len += len(ids)
+
+    def write(self, path, full, number, removed=()):
+        sections = {
+            'agents': np.array(self.agents, dtype=AGENT),
+            'commands': np.array(self.commands, dtype=COMMAND),
+            'behaviours': np.array(self.behaviours, dtype=BEHAVIOUR),
+            'traces': np.fromiter((i for ids in self.traces for i in ids), '<i2', self._trace_len),
+            'removed': np.array(list(removed), dtype='<i8'),
+            'payload': np.frombuffer(self.payload.getvalue(), 'u1'),
+        }
+        layout, offset = {}, 0
+        for name, array in sections.items():
+            layout[name] = [offset, len(array), array.dtype.descr]
+            offset += -(-array.nbytes // 8) * 8 # (8-aligned)
+        strings = sorted(self.strings, key=self.strings.get)
+        header = json.dumps({'strings': strings, 'sections': layout}).encode()
+        header += b' ' * (-(_HEADER.size + len(header)) % 8)
+        with open(path, 'wb') as f:
+            f.write(_HEADER.pack(MAGIC, VERSION, full, number, len(header)) + header)
+            for array in sections.values():
+                f.write(array.tobytes())
+                f.write(b'\0' * (-array.nbytes % 8))
+        return path
+
+
+class Snapshot:
+    """
+    A snapshot file, memory-mapped: the tables (agents, commands, behaviours, traces,
+    removed, payload) are numpy views on the file. Close it (or use it as a context
+    manager) once the views are not needed any more.
+    """
+
+    class Error(ValueError):
+        """raised when a file is not a snapshot (of a version we can read)"""
+        pass
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, version, full, number, size = _HEADER.unpack_from(self._map, 0)
+            if magic != MAGIC or version != VERSION:
+                raise self.Error(f'{path} is not a version {VERSION} snapshot')
+            self.full = bool(full)
+            self.number = number
+            header = json.loads(bytes(self._map[_HEADER.size:_HEADER.size + size]))
+            self.strings = header['strings']
+            base = _HEADER.size + size
+            for name, (offset, length, descr) in header['sections'].items():
+                dtype = np.dtype([tuple(field) for field in descr]) if len(descr) > 1 or descr[0][0] else np.dtype(descr[0][1])
+                setattr(self, name, np.frombuffer(self._map, dtype, length, base + offset))
+        except BaseException:
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """releases our views, then the mapping: if views of the tables are still held elsewhere,
+        the file is unmapped when the last one goes"""
+        for name in ('agents', 'commands', 'behaviours', 'traces', 'removed', 'payload'):
+            self.__dict__.pop(name, None)
+        if self._map is None:
+            return
+        try:
+            self._map.close()
+        except BufferError:
+            logger.debug(self.path, 'still has views in use: unmapped once they are released')
+        finally:
+            self._map = None
+
+    def value(self, offset, size, agents):
+        return loads(self.payload[offset:offset + size].tobytes(), agents)
+
+
+def _resolve(name):
+    """'module:qualname' -> class"""
+    module, qualname = name.split(':')
+    obj = __import__(module, fromlist=['_'])
+    for part in qualname.split('.'):
+        obj = getattr(obj, part)
+    return obj
+
+
+def _restore_behaviour(snap, row, agent, agents, existing):
+    cls, _, state, halted, nxt, trace_start, trace_len, trace_total, offset, size = row
+    cls = _resolve(snap.strings[cls])
+    b = existing if type(existing) is cls else cls.__new__(cls)
+    b.__dict__.clear() # (an existing instance is reused, but nothing of its state)
+    fields = dict.fromkeys(_BEHAVIOUR_BASE)
+    fields.update(snap.value(offset, size, agents))
+    fields.update(agent=agent, _halted=bool(halted),
+                  state=None if state == NO_STATE else state,
+                  _next=None if nxt == NO_STATE else nxt)
+    if trace_total >= 0:
+        trace = fields['trace'] = TraceBuffer(settings.trace_capacity)
+        for i in snap.traces[trace_start:trace_start + trace_len].tolist():
+            trace.append(i)
+        trace.total = trace_total
+    Behaviour.__setstate__(b, fields)
+    return b
+
+
+def restore(paths, agents):
+    """
+    Restores the state saved in the snapshot files `paths` (a full one, then its deltas, in
+    order) onto agents (an iterable, or a {uid: agent} mapping). Returns the restored agents.
+    """
+    agents = agents if isinstance(agents, dict) else {a.uid: a for a in agents}
+    snaps = []
+    try:
+        for path in paths:
+            snaps.append(Snapshot(path))
+        return _restore(snaps, agents)
+    finally:
+        for snap in snaps:
+            snap.close()
+
+
+def _restore(snaps, agents):
+    latest = {} # uid -> (snapshot, agent row): the latest state of each agent
+    for snap in snaps:
+        for uid in snap.removed.tolist():
+            latest.pop(uid, None)
+        for row in snap.agents.tolist():
+            latest[row[0]] = (snap, row)
+
+    commands = {} # id -> Command, shared by the source and the subject
+    restored = []
+    for uid, (snap, (_, _, _, cmd_start, cmd_count, b_start, b_count)) in latest.items():
+        agent = agents.get(uid)
+        if agent is None:
+            logger.warning('snapshot of agent', uid, 'which does not exist: skipped')
+            continue
+        agent.commands.incoming.clear()
+        agent.commands.outgoing.clear()
+        agent.executing = None
+        for row in snap.commands[cmd_start:cmd_start + cmd_count].tolist():
+            cmd = commands.get(row[0])
+            if cmd is None:
+                cmd = commands[row[0]] = _restore_command(snap, row, agents)
+                if cmd is None:
+                    continue
+            if row[1] == INCOMING:
+                agent.commands.incoming.queue(cmd)
+            elif row[1] == OUTGOING:
+                agent.commands.outgoing.queue(cmd)
+            else:
+                agent.executing = cmd
+
+        behaviours, stack = [], []
+        for row in snap.behaviours[b_start:b_start + b_count].tolist():
+            depth = row[1]
+            existing = agent.behaviours[len(behaviours)] if not depth and len(behaviours) < len(agent.behaviours) else None
+            b = _restore_behaviour(snap, row, agent, agents, existing)
+            del stack[depth:]
+            if depth:
+                stack[-1].sub = b
+                b._parent = stack[-1]
+            else:
+                behaviours.append(b)
+            stack.append(b)
+        agent.behaviours[:] = behaviours
+        restored.append(agent)
+    return restored
+
+
+def _restore_command(snap, row, agents):
+    _, _, source, subject, action, check, priority, done, offset, size = row
+    source, subject = agents.get(source), agents.get(subject)
+    if source is None or subject is None:
+        logger.warning('command between', row[2], 'and', row[3], 'lost: no such agent')
+        return None
+    payload = snap.value(offset, size, agents)
+    if check == NO_CHECK:
+        check = None
+    elif check == SIGNALLED_CHECK:
+        check = SIGNALLED
+    elif check == CHECK_IN_PAYLOAD:
+        check = payload[3]
+    else:
+        check = getattr(subject, snap.strings[check])
+    args, kwargs, key = payload[:3]
+    cmd = Command(source, getattr(subject, snap.strings[action]), check, *args, **kwargs)
+    cmd.key = key
+    cmd.priority = priority
+    cmd._done = bool(done)
+    return cmd
+
+
+class _CommandIds(weakref.WeakKeyDictionary):
+    def __init__(self):
+        super().__init__()
+        self.count = count()
+
+
+@attr.s
+class Checkpoints:
+    """
+    A series of snapshots in `directory`: a full one, then deltas. A delta only holds the
+    agents whose saved state differs from the previous save (and the uids of the agents that
+    are gone); pass full=True to save() (or set full_every) to start a new series.
+    """
+    directory = attr.ib()
+    full_every = attr.ib(default=None) # saves between two full snapshots (None: only the first one)
+    number = attr.ib(default=0, init=False) # of the next save
+    _digests = attr.ib(factory=dict, init=False, repr=False) # uid -> digest of its rows at the last save
+    _ids = attr.ib(factory=_CommandIds, init=False, repr=False) # command -> id
+    _strings = attr.ib(factory=dict, init=False, repr=False) # string -> index (the table only grows)
+    _series = attr.ib(factory=list, init=False, repr=False) # paths since the last full snapshot
+
+    def save(self, agents, full=False):
+        """saves the state of agents; returns the path of the snapshot"""
+        full = full or not self._series or bool(self.full_every and self.number % self.full_every == 0)
+        if full:
+            self._strings.clear()
+        writer = _Writer(self._ids, self._strings)
+        digests = {}
+        for agent in agents:
+            rows = writer.agent(agent)
+            digest = digests[agent.uid] = _digest(rows)
+            if full or self._digests.get(agent.uid) != digest:
+                writer.add(rows)
+        removed = () if full else set(self._digests) - set(digests)
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f'{self.number:06d}.{"full" if full else "delta"}.snap')
+        writer.write(path, full, self.number, removed)
+        if full:
+            self._series = []
+        self._series.append(path)
+        self._digests = digests
+        self.number += 1
+        return path
+
+    def restore(self, agents):
+        """restores the last saved state onto agents (see restore())"""
+        return restore(self._series, agents)
@@ -0,0 +1,168 @@
+"""
+Shared spatial index, for nearest-target and radius queries over the agents of a world.
+"""
+
+import heapq
+import math
+import attr
+import numpy as np
+import settings
+
+
+@attr.s
+class SpatialIndex:
+    """
+    Uniform grid over the world plane, with square cells of settings.tile_size.
+    Objects are indexed by their .pos (a 2D point); call update(obj) when obj moves, or
+    refresh() to follow all of them at once: cells are updated incrementally, or rebuilt from
+    scratch when settings.rtree_force_regen is set.
+    """
+    cell_size = attr.ib(default=attr.Factory(lambda: settings.tile_size))
+    _cells = attr.ib(factory=dict, init=False, repr=False) # (i, j) -> {obj: pos}
+    _where = attr.ib(factory=dict, init=False, repr=False) # obj -> (i, j)
+
+    def __len__(self):
+        return len(self._where)
+
+    def __contains__(self, obj):
+        return obj in self._where
+
+    def _cell(self, pos):
+        return int(pos[0] // self.cell_size), int(pos[1] // self.cell_size)
+
+    def insert(self, obj, pos=None):
+        pos = obj.pos if pos is None else pos
+        cell = self._cell(pos)
+        self._cells.setdefault(cell, {})[obj] = pos
+        self._where[obj] = cell
+
+    def remove(self, obj):
+        cell = self._where.pop(obj)
+        members = self._cells[cell]
+        del members[obj]
+        if not members:
+            del self._cells[cell]
+
+    def update(self, obj, pos=None):
+        """moves obj to its current position"""
+        pos = obj.pos if pos is None else pos
+        cell = self._cell(pos)
+        if self._where.get(obj) == cell:
+            self._cells[cell][obj] = pos
+            return
+        if obj in self._where:
+            self.remove(obj)
+        self.insert(obj, pos)
+
+    def rebuild(self, objs=None):
+        objs = list(self._where) if objs is None else objs
+        self._cells = {}
+        self._where = {}
+        for obj in objs:
+            self.insert(obj)
+
+    def refresh(self):
+        """brings the index up to date with the positions of the indexed objects"""
+        if settings.rtree_force_regen:
+            return self.rebuild()
+        for obj in list(self._where):
+            self.update(obj)
+
+    def within(self, pos, radius, exclude=None):
+        """objects within `radius` from pos"""
+        x, y = pos
+        (i0, j0), (i1, j1) = self._cell((x - radius, y - radius)), self._cell((x + radius, y + radius))
+        found = []
+        if (i1 - i0 + 1) * (j1 - j0 + 1) > len(self._cells):
+            cells = self._cells.values() # cheaper to go through all the occupied cells
+        else:
+            cells = (self._cells[c] for c in ((i, j) for i in range(i0, i1 + 1) for j in range(j0, j1 + 1))
+                     if c in self._cells)
+        for members in cells:
+            for obj, p in members.items():
+                if obj is not exclude and math.hypot(p[0] - x, p[1] - y) <= radius:
+                    found.append(obj)
+        return found
+
+    def within_any(self, points, radius, exclude=()):
+        """objects within `radius` from any of points (e.g. the ships of a fleet), but those in exclude"""
+        if len(points) == 1:
+            found = self.within(points[0], radius)
+        else:
+            xs, ys = zip(*points)
+            (i0, j0), (i1, j1) = self._cell((min(xs) - radius, min(ys) - radius)), self._cell((max(xs) + radius, max(ys) + radius))
+            if (i1 - i0 + 1) * (j1 - j0 + 1) > len(self._cells):
+                cells = list(self._cells.values())
+            else:
+                cells = [self._cells[c] for c in ((i, j) for i in range(i0, i1 + 1) for j in range(j0, j1 + 1))
+                         if c in self._cells]
+            objs = [obj for members in cells for obj in members]
+            if not objs:
+                return []
+            where = np.array([p for members in cells for p in members.values()], float)
+            origins = np.array(points, float)
+            # (the nearest of the points, for each object)
+            distances = np.hypot(where[:, 0] - origins[:, :1], where[:, 1] - origins[:, 1:]).min(axis=0)
+            found = [objs[i] for i in np.flatnonzero(distances <= radius).tolist()]
+        return [obj for obj in found if obj not in exclude] if exclude else found
+
+    def within_many(self, queries):
+        """within_any, for each (points, radius, exclude) of queries: the list of the objects found for each"""
+        return [self.within_any(points, radius, exclude) for points, radius, exclude in queries]
+
+    def _ring(self, ci, cj, r):
+        """the occupied cells at Chebyshev distance r from (ci, cj)"""
+        if r == 0:
+            ring = [(ci, cj)]
+        else:
+            ring = [(ci + d, cj - r) for d in range(-r, r + 1)] + [(ci + d, cj + r) for d in range(-r, r + 1)]
+            ring += [(ci - r, cj + d) for d in range(-r + 1, r)] + [(ci + r, cj + d) for d in range(-r + 1, r)]
+        return [self._cells[c] for c in ring if c in self._cells]
+
+    def nearest(self, pos, k=1, radius=None, exclude=None, predicate=None):
+        """
+        the (up to) k objects nearest to pos, closest first.
+        radius: only look this far; exclude: object to leave out (typically, the one asking);
+        predicate: only consider objects for which predicate(obj) holds.
+        """
+        x, y = pos
+        ci, cj = self._cell(pos)
+        best = [] # max-heap (by negated distance) of the k best so far
+        tie = 0 # keeps heap entries comparable
+
+        def consider(members):
+            nonlocal tie
+            for obj, p in members.items():
+                if obj is exclude:
+                    continue
+                d = math.hypot(p[0] - x, p[1] - y)
+                if radius is not None and d > radius:
+                    continue
+                if len(best) == k and d >= -best[0][0]:
+                    continue
+                if predicate is not None and not predicate(obj):
+                    continue
+                tie += 1
+                if len(best) == k:
+                    heapq.heapreplace(best, (-d, tie, obj))
+                else:
+                    heapq.heappush(best, (-d, tie, obj))
+
+        r = 0
+        while True:
+            if 8 * r > len(self._cells):
+                # the rings are now larger than the occupied space: sweep it all instead
+                best.clear()
+                for members in self._cells.values():
+                    consider(members)
+                break
+            for members in self._ring(ci, cj, r):
+                consider(members)
+            # anything in the next ring is at least r cells away
+            reach = r * self.cell_size
+            if len(best) == k and reach >= -best[0][0]:
+                break
+            if radius is not None and reach > radius:
+                break
+            r += 1
+        return [obj for _, _, obj in sorted(best, key=lambda e: (-e[0], e[1]))]
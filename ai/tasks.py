@@ -0,0 +1,43 @@
+"""
+Helpers for the asyncio integration (coroutine actions of commands and behaviours).
+"""
+
+import asyncio
+import inspect
+
+
+def loop_running():
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+class NoLoopError(RuntimeError):
+    """a coroutine action cannot run: there is no running event loop"""
+    pass
+
+
+def check_loop(action):
+    """NoLoopError if action is a coroutine function, and there is no running event loop to run it:
+    raised before the action is called (and before anything else changes)"""
+    if inspect.iscoroutinefunction(inspect.unwrap(action)) and not loop_running():
+        raise NoLoopError(f'{action.__qualname__} is a coroutine: it needs a running asyncio event loop')
+
+
+def log_exception(task, logger, *what):
+    """logs the exception a done task raised, if any (retrieving it, so that asyncio does not warn)"""
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(*what, 'failed:', repr(task.exception()))
+
+
+def start_task(awaitable):
+    """runs awaitable as a task on the running event loop; RuntimeError if there is none"""
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        if inspect.iscoroutine(awaitable):
+            awaitable.close() # (no 'never awaited' warning on top of the error)
+        raise RuntimeError(f'{awaitable} needs a running asyncio event loop') from None
+    return asyncio.ensure_future(awaitable, loop=loop)
@@ -0,0 +1,163 @@
+"""
+Opt-in telemetry of the command pipeline: how long commands wait in the queues, and how deep
+the queues get.
+
+Each command is timestamped when it is emitted, dequeued by its subject, executed and
+completed; the latencies of the stages in between are collected in Histograms (in ns), by
+stage and by the priority class of the source (settings.command_priority_order): e.g. how
+long fleet orders sit in the queues behind player orders.
+
+    from ai.telemetry import telemetry
+    telemetry.enable()
+    telemetry.watch(world) # queue depth gauges (and the periodic dump, if settings.telemetry_path)
+    ...
+    telemetry.snapshot()
+    telemetry.dump('metrics.prom') # Prometheus text exposition format
+
+While disabled (the default), the hooks cost one attribute check per command stage. With
+settings.command_telemetry set, each Scheduler enables it (and the first one is watched).
+"""
+
+import os
+from time import perf_counter_ns
+import settings
+from logger import getLogger
+from .command import ControllableObject
+from .profiling import Histogram
+
+
+logger = getLogger(__name__)
+
+# stage -> (the stamp it starts from, the stamp it ends at): indices in Command.stamps
+STAGES = {'queued': (0, 1), # emitted -> dequeued by the subject
+          'execute': (1, 2), # dequeued -> the action returned
+          'complete': (2, 3), # executed -> done
+          'total': (0, 3)}
+QUEUES = ('incoming', 'outgoing')
+
+
+def source_class(cmd):
+    """the priority class of the source of cmd (e.g. 'fleet')"""
+    order = settings.command_priority_order
+    return order[cmd.priority] if 0 <= cmd.priority < len(order) else str(cmd.priority)
+
+
+class Telemetry:
+    """
+    Latency Histograms per (stage, source priority class), and queue depth gauges of the
+    agents of the watched world.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.stats = {}
+        self.world = None
+        self._timer = None
+
+    def enable(self):
+        self.enabled = True
+        ControllableObject.telemetry = self
+
+    def disable(self):
+        self.enabled = False
+        ControllableObject.telemetry = None
+
+    def reset(self):
+        self.stats = {}
+
+    def watch(self, world):
+        """world (a Scheduler) is the one whose queues are gauged; and dumped every
+        settings.timers['telemetry_dump'], if settings.telemetry_path is set"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self.world = world
+        if world is not None and settings.telemetry_path:
+            self._timer = world.every('telemetry_dump', lambda: self.dump(settings.telemetry_path))
+
+    # hooks (see ControllableObject)
+
+    def emitted(self, cmd):
+        cmd.stamps = [perf_counter_ns(), 0, 0, 0]
+
+    def dequeued(self, cmd):
+        if cmd.stamps is not None:
+            cmd.stamps[1] = perf_counter_ns()
+
+    def executed(self, cmd):
+        if cmd.stamps is not None:
+            cmd.stamps[2] = perf_counter_ns()
+
+    def completed(self, cmd):
+        stamps = cmd.stamps
+        if stamps is None:
+            return
+        now = stamps[3] = perf_counter_ns()
+        if not stamps[2]: # (it completed within its action)
+            stamps[2] = now
+        source = source_class(cmd)
+        for stage, (start, end) in STAGES.items():
+            hist = self.stats.get((stage, source))
+            if hist is None:
+                hist = self.stats[(stage, source)] = Histogram()
+            hist.add(stamps[end] - stamps[start])
+        cmd.stamps = None
+
+    # metrics
+
+    def depths(self, agents=None):
+        """{queue: (total length, longest)} over agents (default: those of the watched world)"""
+        if agents is None:
+            agents = self.world.agents if self.world is not None else ()
+        lengths = {queue: [len(getattr(a.commands, queue)) for a in agents] for queue in QUEUES}
+        return {queue: (sum(n), max(n, default=0)) for queue, n in lengths.items()}
+
+    def snapshot(self, agents=None):
+        """{'latency': {stage: {source: Histogram.summary() (ms)}}, 'depth': {queue: {'total', 'max'}}}"""
+        latency = {}
+        for (stage, source), hist in self.stats.items():
+            latency.setdefault(stage, {})[source] = hist.summary(scale=1e-6)
+        depth = {queue: {'total': total, 'max': longest} for queue, (total, longest) in self.depths(agents).items()}
+        return {'latency': latency, 'depth': depth}
+
+    def prometheus(self, agents=None):
+        """the metrics, in the Prometheus text exposition format"""
+        lines = ['# HELP ai_command_latency_seconds Command pipeline latency, by stage and source priority class.',
+                 '# TYPE ai_command_latency_seconds histogram']
+        for (stage, source), hist in sorted(self.stats.items()):
+            labels = f'stage="{stage}",source="{source}"'
+            seen = 0
+            for i, n in enumerate(hist.buckets):
+                # (bucket i holds the values below 2**i ns; all of them are written, empty or not,
+                # for the series to stay the same from one scrape to the next)
+                seen += n
+                lines.append(f'ai_command_latency_seconds_bucket{{{labels},le="{(1 << i) / 1e9:.9g}"}} {seen}')
+            lines.append(f'ai_command_latency_seconds_bucket{{{labels},le="+Inf"}} {hist.count}')
+            lines.append(f'ai_command_latency_seconds_sum{{{labels}}} {hist.total / 1e9:.9g}')
+            lines.append(f'ai_command_latency_seconds_count{{{labels}}} {hist.count}')
+        depths = self.depths(agents)
+        for metric, i, doc in (('ai_command_queue_depth', 0, 'Commands queued, over all the agents.'),
+                               ('ai_command_queue_depth_max', 1, 'Longest command queue of an agent.')):
+            lines += [f'# HELP {metric} {doc}', f'# TYPE {metric} gauge']
+            lines += [f'{metric}{{queue="{queue}"}} {depths[queue][i]}' for queue in QUEUES]
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, path, agents=None):
+        """writes prometheus() to path (atomically: scrapers never see a partial file)"""
+        tmp = f'{path}.tmp'
+        with open(tmp, 'w') as f:
+            f.write(self.prometheus(agents))
+        os.replace(tmp, path)
+
+    def report(self):
+        lines = [f'{"stage":<10} {"source":<12} {"count":>9} {"mean ms":>9} {"p50 ms":>9} {"p99 ms":>9} {"max ms":>9}']
+        for (stage, source), hist in sorted(self.stats.items()):
+            s = hist.summary(scale=1e-6)
+            lines.append(f'{stage:<10} {source:<12} {s["count"]:>9} {s["mean"]:>9.3f} {s["p50"]:>9.3f} '
+                         f'{s["p99"]:>9.3f} {s["max"]:>9.3f}')
+        depths = self.depths()
+        lines.append('  '.join(f'{queue}: {total} queued (longest {longest})' for queue, (total, longest) in depths.items()))
+        return '\n'.join(lines)
+
+
+telemetry = Telemetry()
@@ -0,0 +1,107 @@
+"""
+Delegation churn benchmark: a population of Aggressive ships fighting to the death, each kill
+delegating to a new ApproachAndAttack, with the behaviour_pool ('pooled') and without it
+('fresh'). Reports, for each:
+- step throughput, and the number of sub-behaviours allocated (the rest were reused);
+- the memory allocated while stepping, and still held at the end or at the peak (traced
+  in a separate, untimed run);
+- the garbage collections run, and their pauses (total and longest).
+
+    python -m benchmarks.bench_behaviour_pool --agents 10000 --steps 100
+"""
+
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+
+from ai.behaviours.behaviour import behaviour_pool
+from ai.behaviours.ship_b.aggression import Aggressive
+from benchmarks.stubs import populate
+
+
+class GCPauses:
+    """collections and pause times of the garbage collector, through gc.callbacks"""
+
+    def __init__(self):
+        self.pauses = []
+        self._start = None
+
+    def __call__(self, phase, info):
+        if phase == 'start':
+            self._start = time.perf_counter()
+        elif self._start is not None:
+            self.pauses.append(time.perf_counter() - self._start)
+            self._start = None
+
+    def __enter__(self):
+        gc.callbacks.append(self)
+        return self
+
+    def __exit__(self, *exc):
+        gc.callbacks.remove(self)
+
+
+def population(agents, seed, pool_size):
+    rng = random.Random(seed)
+    random.seed(seed)
+    behaviour_pool.clear()
+    behaviour_pool.size = pool_size
+    behaviours = [Aggressive(s) for s in populate(agents, rng)]
+    gc.collect()
+    return behaviours
+
+
+def fight(behaviours, steps):
+    for _ in range(steps):
+        for b in behaviours:
+            b.step()
+
+
+def measure(agents, steps, seed, pool_size):
+    behaviours = population(agents, seed, pool_size)
+    with GCPauses() as pauses:
+        start = time.perf_counter()
+        fight(behaviours, steps)
+        elapsed = time.perf_counter() - start
+    created, reused = behaviour_pool.created, behaviour_pool.reused
+
+    behaviours = population(agents, seed, pool_size)
+    tracemalloc.start()
+    fight(behaviours, steps)
+    size, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'steps/s': agents * steps / elapsed,
+        'allocated': created,
+        'reused': reused,
+        'KiB': size / 1024, # still allocated at the end (garbage included)
+        'peak KiB': peak / 1024,
+        'collections': len(pauses.pauses),
+        'gc ms': sum(pauses.pauses) * 1000,
+        'max gc ms': max(pauses.pauses, default=0) * 1000,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--agents', type=int, default=10000)
+    parser.add_argument('--steps', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--pool-size', type=int, default=256)
+    args = parser.parse_args(argv)
+    size = behaviour_pool.size
+    try:
+        results = {'fresh': measure(args.agents, args.steps, args.seed, 0),
+                   'pooled': measure(args.agents, args.steps, args.seed, args.pool_size)}
+    finally:
+        behaviour_pool.clear()
+        behaviour_pool.size = size
+    print(f'{"":<8}' + ''.join(f'{metric:>14}' for metric in results['fresh']))
+    for name, metrics in results.items():
+        print(f'{name:<8}' + ''.join(f'{value:>14.0f}' for value in metrics.values()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""
+Command construction micro-benchmark, for the original dict-backed Command ('before') against
+the slotted one, with and without a CommandPool ('after'):
+- memory (bytes and allocated blocks) held by each live command;
+- emit -> execute throughput, and the number of Command objects allocated along the way;
+- a fleet-wide order to --fleet ships, as that many commands or as one GroupCommand.
+
+    python -m benchmarks.bench_command --commands 100000 --fleet 500
+"""
+
+import argparse
+import random
+import time
+import tracemalloc
+
+from ai.command import Command, CommandPool
+from benchmarks.stubs import Fleet, Player, Ship
+
+
+class LegacyCommand:
+    """the Command as it was: a dict-backed object, validated on construction"""
+    key = group = stamps = None # (no coalescing, no groups, no telemetry: see ControllableObject.emit_command)
+
+    def __init__(self, source, action, completion_check, *args, **kwargs):
+        assert hasattr(action, "__call__"), f"action needs to be a function, got {action} instead"
+        assert hasattr(action, "__self__"), f'action needs to be a bound method, got {action} instead'
+        if completion_check is not None:
+            assert hasattr(completion_check, "__call__")
+        self.source = source
+        self.action = action
+        self.completion_check = completion_check
+        self.args = args
+        self.kwargs = kwargs
+
+    @property
+    def is_done(self):
+        return self.completion_check() if self.completion_check else True
+
+    @property
+    def priority(self):
+        return self.source._cmd_priority
+
+    @property
+    def subject(self):
+        return self.action.__self__
+
+    def execute(self):
+        self.action(*self.args, **self.kwargs)
+
+
+def allocations(factory, source, action, n):
+    """(bytes, blocks) allocated per command, keeping n commands alive"""
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    keep = [factory(source, action, None, (i, i)) for i in range(n)]
+    stats = tracemalloc.take_snapshot().compare_to(before, 'filename')
+    tracemalloc.stop()
+    size = sum(s.size_diff for s in stats)
+    blocks = sum(s.count_diff for s in stats)
+    del keep
+    return size / n, blocks / n
+
+
+def throughput(factory, source, subject, n):
+    """
+    emit -> execute round trips per second: every row goes the way of emit_command, with
+    factory for the construction (a pooled command goes back to the source's pool when done)
+    """
+    start = time.perf_counter()
+    for i in range(n):
+        cmd = factory(source, subject.goto, None, (i, i))
+        source.commands.outgoing.queue(cmd)
+        subject.receive_command(cmd)
+        subject.update() # finishes the previous command, executes this one
+    return n / (time.perf_counter() - start)
+
+
+def warm(pool, source, action, n):
+    """fills pool with n free commands, as after a while of emitting and executing"""
+    pool.size = max(pool.size, n)
+    for _ in range(n - len(pool)):
+        pool.release(Command(source, action, None))
+    pool.created = 0
+
+
+def fleet_order(fleet, ships, group, rounds=20):
+    """orders per second: every ship goes somewhere (and is done at once), `rounds` times"""
+    start = time.perf_counter()
+    for i in range(rounds):
+        if group:
+            fleet.emit_group_command(ships, 'goto', None, (i, i))
+        else:
+            for ship in ships:
+                fleet.emit_command(ship.goto, None, (i, i))
+        for ship in ships:
+            ship.update() # executes
+            ship.update() # finishes
+    assert not fleet.commands.outgoing
+    return rounds / (time.perf_counter() - start)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--commands', type=int, default=100000)
+    parser.add_argument('--fleet', type=int, default=500)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(0)
+    player, ship = Player([]), Ship((0, 0), rng)
+    pool = CommandPool()
+    runs = {
+        'before (dict, validated)': LegacyCommand,
+        'after (slots)': Command,
+        'after (slots + pool)': pool.acquire,
+    }
+    print(f"{'':<26} {'bytes/cmd':>10} {'blocks/cmd':>11} {'emit->exec/s':>13} {'new cmds':>10}")
+    kept = min(args.commands, 20000)
+    for name, factory in runs.items():
+        pooled = factory == pool.acquire
+        Player.command_pool = pool if pooled else None # (the source's pool: see emit_command)
+        if pooled:
+            warm(pool, player, ship.goto, kept)
+        size, blocks = allocations(factory, player, ship.goto, kept)
+        if pooled:
+            warm(pool, player, ship.goto, kept)
+        rate = throughput(factory, player, ship, args.commands)
+        allocated = pool.created if pooled else args.commands
+        print(f"{name:<26} {size:>10.0f} {blocks:>11.1f} {rate:>13.0f} {allocated:>10}")
+    Player.command_pool = None
+
+    ships = [Ship((0, 0), rng) for _ in range(args.fleet)]
+    fleet = Fleet(ships)
+    single, group = fleet_order(fleet, ships, False), fleet_order(fleet, ships, True)
+    print(f"fleet orders/s ({args.fleet} ships): {single:.1f} as commands, {group:.1f} as a group command")
+
+
+if __name__ == '__main__':
+    main()
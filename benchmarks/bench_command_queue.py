@@ -0,0 +1,67 @@
+"""
+Heap-indexed CommandQueue vs the original deque-backed one.
+
+Simulates the steady state of a sender with `size` pending orders: every tick the
+subject takes its next command and the sender drops it from its outgoing queue
+(as ControllableObject._handle_command_execution does), then a new order is issued.
+
+    python -m benchmarks.bench_command_queue --sizes 100 1000 10000
+"""
+
+import argparse
+import random
+import time
+
+import settings
+from ai.command import Command, CommandQueue, DequeCommandQueue
+
+
+class _Agent:
+    def __init__(self, priority):
+        self._cmd_priority = priority
+
+    def goto(self, *args):
+        pass
+
+
+def _fill(backend, size, rng):
+    sources = [_Agent(p) for p in range(len(settings.command_priority_order))]
+    subject = _Agent(0)
+    incoming, outgoing = backend(subject), backend(sources[0])
+
+    def emit():
+        cmd = Command(rng.choice(sources), subject.goto, None)
+        prio = rng.random() < 0.1
+        outgoing.queue(cmd, priority=prio)
+        incoming.queue(cmd, priority=prio)
+
+    for _ in range(size):
+        emit()
+    return incoming, outgoing, emit
+
+
+def run(backend, size, ticks, seed=0):
+    incoming, outgoing, emit = _fill(backend, size, random.Random(seed))
+    start = time.perf_counter()
+    for _ in range(ticks):
+        cmd = incoming.get_next_command()
+        outgoing.remove(cmd)
+        emit()
+    return ticks / (time.perf_counter() - start)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--ticks', type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    print(f"{'pending':>8} {'deque ops/s':>14} {'heap ops/s':>14} {'speedup':>8}")
+    for size in args.sizes:
+        old = run(DequeCommandQueue, size, args.ticks)
+        new = run(CommandQueue, size, args.ticks)
+        print(f"{size:>8} {old:>14.0f} {new:>14.0f} {new / old:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Component store benchmark: stub Ships keeping their hot state (position, velocity, hull) as
+plain attributes ('attrs'), against Ships keeping it in a ComponentStore ('store', see
+ai.components). Reports, for each:
+- the memory allocated per ship (by its construction);
+- gathering the positions of all the ships into an array (ai.combat.positions);
+- a range check of every ship against a target (ai.combat.paired_fraction_in_range);
+- a physics step, moving every ship by its velocity (per ship, or ComponentStore.integrate);
+- a radius query, by a sweep over the ships (per ship, or ComponentStore.within).
+
+    python -m benchmarks.bench_components --ships 20000
+"""
+
+import argparse
+import gc
+import math
+import random
+import time
+import tracemalloc
+
+from ai.combat import paired_fraction_in_range, positions
+from ai.components import ComponentStore
+from benchmarks import stubs
+
+
+class Ship(stubs.Ship): # (named Ship: it gets the behaviours, and the command priority, of ships)
+    components = ComponentStore(pos=(float, 2), velocity=(float, 2), hull=float)
+
+
+def build(factory, n, seed):
+    rng = random.Random(seed)
+    gc.collect()
+    tracemalloc.start()
+    ships = stubs.populate(n, rng, factory=factory)
+    for s in ships:
+        s.velocity = (rng.uniform(-1, 1), rng.uniform(-1, 1))
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return ships, size / n
+
+
+def timed(f, repeat=5):
+    best = math.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def physics(ships, store, dt=1.):
+    if store is not None:
+        return lambda: store.integrate('pos', 'velocity', dt)
+
+    def step():
+        for s in ships:
+            x, y = s.pos
+            vx, vy = s.velocity
+            s.pos = (x + vx * dt, y + vy * dt)
+    return step
+
+
+def query(ships, store, radius=200.):
+    pos = ships[0].pos
+    if store is not None:
+        return lambda: store.within(pos, radius)
+    return lambda: [s for s in ships if math.hypot(s.pos[0] - pos[0], s.pos[1] - pos[1]) <= radius]
+
+
+def measure(factory, n, seed):
+    ships, per_ship = build(factory, n, seed)
+    store = factory.components
+    targets = ships[1:] + ships[:1]
+    return {'bytes/ship': per_ship,
+            'positions ms': timed(lambda: positions(ships)),
+            'in range ms': timed(lambda: paired_fraction_in_range(ships, targets)),
+            'physics ms': timed(physics(ships, store)),
+            'query ms': timed(query(ships, store))}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--ships', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    results = {'attrs': measure(stubs.Ship, args.ships, args.seed),
+               'store': measure(Ship, args.ships, args.seed)}
+    print(f'{"":<6}' + ''.join(f'{metric:>14}' for metric in results['attrs']))
+    for name, metrics in results.items():
+        print(f'{name:<6}' + ''.join(f'{value:>14.1f}' for value in metrics.values()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Sensor sweep benchmark: scans every ship of a world once (a full settings.timers['scan_rate']
+period), as independent per-ship SpatialIndex.within queries ('per-agent': the bare queries,
+without any contact tracking), and through the world-level sensor sweep of ai.sensors, per
+ship ('sweep') and shared within fleets flying in formation ('shared').
+
+    python -m benchmarks.bench_sensors --ships 20000 --fleet-size 10
+"""
+
+import argparse
+import random
+import time
+
+import settings
+from ai.scheduler import Scheduler
+from ai.sensors import Sensors
+from benchmarks.stubs import populate
+
+
+def world_of(ships):
+    world = Scheduler(budget=float('inf'))
+    for s in ships:
+        world.spatial.insert(s)
+    world.agents.update((s, {}) for s in ships)
+    return world
+
+
+def per_agent(world, ships):
+    start = time.perf_counter()
+    for s in ships:
+        world.spatial.within(s.pos, settings.scan_range, exclude=s)
+    return time.perf_counter() - start
+
+
+def sweep(world, ships, fleet_size=None):
+    sensors = Sensors(world)
+    if fleet_size:
+        for i in range(0, len(ships), fleet_size):
+            sensors.share(ships[i:i + fleet_size])
+    start = time.perf_counter()
+    for _ in sensors._slots:
+        world.wheel.advance()
+        sensors.sweep()
+    elapsed = time.perf_counter() - start
+    sensors.stop()
+    return elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--ships', type=int, default=20000)
+    parser.add_argument('--fleet-size', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    ships = populate(args.ships, rng)
+    # fleets fly in formation: their ships close to one another
+    for i in range(0, len(ships), args.fleet_size):
+        x, y = ships[i].pos
+        for s in ships[i + 1:i + args.fleet_size]:
+            s.pos = (x + rng.uniform(-20, 20), y + rng.uniform(-20, 20))
+    world = world_of(ships)
+
+    results = {'per-agent': per_agent(world, ships),
+               'sweep': sweep(world, ships),
+               'shared': sweep(world, ships, args.fleet_size)}
+    for name, elapsed in results.items():
+        print(f'{name:<10} {args.ships / elapsed:>12.0f} scans/s ({elapsed * 1000:.1f} ms per scan period)')
+
+
+if __name__ == '__main__':
+    main()
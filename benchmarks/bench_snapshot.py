@@ -0,0 +1,80 @@
+"""
+Saves the AI state of a world of stub Ships, Fleets and Players (see benchmarks.suite) with
+ai.snapshot (a full snapshot, then a delta after a tick), and with pickle and dill for
+comparison (the whole agents: they have no other state worth saving); reports the time
+taken and the size of the files.
+
+    python -m benchmarks.bench_snapshot --ships 10000 [--ticks 5]
+"""
+
+import argparse
+import os
+import pickle
+import random
+import sys
+import tempfile
+import time
+
+from ai.scheduler import Scheduler
+from ai.snapshot import Checkpoints
+from benchmarks.stubs import populate_world
+from benchmarks.suite import tick_all
+
+try:
+    import dill
+except ImportError:
+    dill = None
+
+
+def timed(f, *args):
+    start = time.perf_counter()
+    result = f(*args)
+    return result, time.perf_counter() - start
+
+
+def report(name, seconds, size=None):
+    size = '' if size is None else f'{size / 2**20:>10.2f} MB'
+    print(f'{name:<20} {1000 * seconds:>10.1f} ms {size}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--ships', type=int, default=10000)
+    parser.add_argument('--ticks', type=int, default=5, help='ticks run before the first save')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    random.seed(args.seed)
+    world = Scheduler(budget=float('inf'))
+    players, size = populate_world(world, args.ships, rng)
+    for _ in range(args.ticks):
+        tick_all(world, players, rng, size, 1)
+    agents = list(world.agents)
+    print(f'{len(agents)} agents')
+
+    with tempfile.TemporaryDirectory() as directory:
+        checkpoints = Checkpoints(directory)
+        path, seconds = timed(checkpoints.save, agents)
+        report('snapshot (full)', seconds, os.path.getsize(path))
+        world.tick()
+        path, seconds = timed(checkpoints.save, agents)
+        report('snapshot (delta)', seconds, os.path.getsize(path))
+        _, seconds = timed(checkpoints.restore, agents)
+        report('restore', seconds)
+
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 100000)) # (agents reference each other)
+    for name, module in (('pickle', pickle), ('dill', dill)):
+        if module is None:
+            print(f'{name:<20} not installed')
+            continue
+        try:
+            data, seconds = timed(module.dumps, agents)
+        except RecursionError:
+            print(f'{name:<20} too deep')
+            continue
+        report(name, seconds, len(data))
+
+
+if __name__ == '__main__':
+    main()
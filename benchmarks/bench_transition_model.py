@@ -0,0 +1,67 @@
+"""
+Steps a population of agents through the Aggressive (and, by delegation, ApproachAndAttack)
+behaviour graphs, and reports the throughput of Behaviour.step (or, with --batch, of
+ai.batch.BatchStepper).
+
+    python -m benchmarks.bench_transition_model --agents 100000 --steps 10 [--batch] [--profile] [--memo]
+
+Each round of steps is a tick for ai.memo (with settings.memoize_predicates, the preconditions are
+memoized); --memo reports the cache hits and misses.
+"""
+
+import argparse
+import gc
+import random
+import time
+
+from ai.batch import BatchStepper
+from ai.memo import memo
+from ai.profiling import profiler
+from ai.behaviours.ship_b.aggression import Aggressive, ApproachAndAttack
+from benchmarks.stubs import populate
+
+
+def run(behaviours, steps, batch=None):
+    start = time.perf_counter()
+    for _ in range(steps):
+        with memo.tick():
+            if batch is not None:
+                batch.step([Aggressive, ApproachAndAttack])
+                continue
+            for b in behaviours:
+                b.step()
+    return len(behaviours) * steps / (time.perf_counter() - start)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--agents', type=int, default=100000)
+    parser.add_argument('--steps', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--batch', action='store_true', help='step with ai.batch.BatchStepper')
+    parser.add_argument('--profile', action='store_true', help='report the slowest nodes (see ai.profiling)')
+    parser.add_argument('--memo', action='store_true', help='report the memoization hits and misses (see ai.memo)')
+    args = parser.parse_args(argv)
+    if args.profile:
+        profiler.enable()
+    batch = BatchStepper(args.seed) if args.batch else None
+
+    rng = random.Random(args.seed)
+    random.seed(args.seed)
+
+    ships = populate(args.agents, rng)
+    aggressive = run([Aggressive(s) for s in ships], args.steps, batch)
+    print(f'Aggressive:        {aggressive:>12.0f} steps/s ({args.agents} agents)')
+
+    ships = populate(args.agents, rng)
+    gc.collect() # drop the previous population (parents and subs reference each other)
+    attack = run([ApproachAndAttack(s, rng.choice(s.contacts)) for s in ships], args.steps, batch)
+    print(f'ApproachAndAttack: {attack:>12.0f} steps/s ({args.agents} agents)')
+    if args.profile:
+        print(profiler.report())
+    if args.memo:
+        print(memo.report())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""
+Headless stand-ins for the game objects the behaviours talk to (positions, hardpoints,
+scanning, moving and attacking), so that agents can be simulated without PyShip.
+"""
+
+import math
+from ai.combat import Armed
+from ai.command import ControllableObject
+
+
+class Hardpoint:
+    __slots__ = ('range',)
+
+    def __init__(self, range):
+        self.range = range
+
+
+class StubShip(Armed):
+    """just enough of a ship for the ai.behaviours.ship_b behaviours to run"""
+    speed = 5
+
+    def __init__(self, pos, rng, hardpoints=4, hull=10):
+        self.pos = pos
+        self.hardpoints = [Hardpoint(rng.uniform(10, 60)) for _ in range(hardpoints)]
+        self.hull = hull
+        self.contacts = []
+        self.engaged_targets = []
+
+    @property
+    def destroyed(self):
+        return self.hull <= 0
+
+    def scan(self):
+        return [c for c in self.contacts if not getattr(c, 'destroyed', True)] # (remote ones are out of sight)
+
+    def distance(self, other):
+        return math.hypot(self.pos[0] - other.pos[0], self.pos[1] - other.pos[1])
+
+    def move(self, pos):
+        dx, dy = pos[0] - self.pos[0], pos[1] - self.pos[1]
+        dist = math.hypot(dx, dy)
+        if dist <= self.speed:
+            self.pos = pos
+        else:
+            self.pos = (self.pos[0] + dx / dist * self.speed, self.pos[1] + dy / dist * self.speed)
+
+    def attack(self, target):
+        target.hull -= 1
+
+
+def populate(n, rng, size=None, contacts=8, factory=StubShip):
+    """n ships spread over a square map (so that there are ~ 1 ship per 50x50 area),
+    each one seeing `contacts` random others"""
+    size = size or math.sqrt(n) * 50
+    ships = [factory((rng.uniform(0, size), rng.uniform(0, size)), rng) for _ in range(n)]
+    for s in ships:
+        s.contacts = rng.sample(ships, min(contacts, n))
+        if s in s.contacts:
+            s.contacts.remove(s)
+    return ships
+
+
+# agents: the stubs above, driven through ControllableObject, and the fleets and players
+# commanding them. Ships pick up the settings.behaviour_modules['Ship'] behaviours.
+
+class Ship(ControllableObject, StubShip):
+    def __init__(self, pos, rng, hardpoints=4, hull=1000):
+        StubShip.__init__(self, pos, rng, hardpoints, hull)
+        ControllableObject.__init__(self)
+        self.destination = None
+
+    def move(self, pos):
+        StubShip.move(self, pos)
+        self.moved()
+
+    def goto(self, pos):
+        self.destination = pos
+
+    def arrived(self):
+        """completion check of goto: the ship cruises a step each time it is polled"""
+        if self.destination is None:
+            return True
+        self.move(self.destination)
+        if self.pos == self.destination:
+            self.destination = None
+            return True
+        return False
+
+
+class Fleet(ControllableObject):
+    def __init__(self, ships):
+        super().__init__()
+        self.ships = ships
+
+    def regroup(self, pos):
+        self.emit_group_command(self.ships, 'goto', 'arrived', pos)
+
+
+class Player(ControllableObject):
+    def __init__(self, fleets):
+        super().__init__()
+        self.fleets = fleets
+
+    def give_orders(self, rng, size):
+        for fleet in self.fleets:
+            self.emit_command(fleet.regroup, None, (rng.uniform(0, size), rng.uniform(0, size)))
+
+
+def populate_world(world, n, rng, fleet_size=10, fleets_per_player=10, contacts=8):
+    """n Ships, in Fleets of fleet_size, commanded by Players; all added to world (a Scheduler).
+    Returns the players and the size of the map."""
+    size = math.sqrt(n) * 50
+    ships = populate(n, rng, size, contacts, factory=Ship)
+    fleets = [Fleet(ships[i:i + fleet_size]) for i in range(0, n, fleet_size)]
+    players = [Player(fleets[i:i + fleets_per_player]) for i in range(0, len(fleets), fleets_per_player)]
+    for agent in ships + fleets + players:
+        world.add(agent)
+    return players, size
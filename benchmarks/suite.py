@@ -0,0 +1,223 @@
+"""
+Headless scaling benchmark: a world (ai.scheduler.Scheduler) of stub Ships in Fleets,
+commanded by Players, at several sizes. Every tick runs the agents' command queues and
+behaviour graphs; every --orders ticks, each Player sends all its fleets somewhere else,
+and the fleets relay the order to their ships.
+
+Reports, per size: ticks/s, p50/p99 tick latency, and the peak memory traced while the
+world is built and during the first --memory-ticks ticks (tracing is then switched off,
+so that it does not weigh on the timings). With --lod, the AI level of detail (ai.lod)
+is on, with a ship of each player as the viewer; with --sensors, the ships are scanned by
+the world-level sensor sweep (ai.sensors), sharing their contacts within each fleet. With
+--telemetry, the command pipeline latencies and queue depths (ai.telemetry) are reported
+too, and dumped (Prometheus text format) to the given file.
+
+    python -m benchmarks.suite run --sizes 1000 10000 100000 --ticks 100 --out results.json
+    python -m benchmarks.suite compare baseline.json results.json [--threshold 0.2]
+
+compare exits with status 1 if any metric regressed by more than the threshold.
+
+For deterministic runs, record a session's commands (see ai.replay) once, then replay it
+against each build, with the same --ships and --seed:
+
+    python -m benchmarks.suite record --ships 10000 --ticks 500 --log session.log
+    python -m benchmarks.suite replay --ships 10000 --log session.log
+"""
+
+import argparse
+import gc
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+import settings
+from ai.lod import LevelOfDetail
+from ai.sensors import Sensors
+from ai.telemetry import telemetry
+from ai.replay import Recorder, Replayer
+from ai.scheduler import Scheduler
+from benchmarks.stubs import populate_world
+
+
+# metric -> True if higher is better
+METRICS = {'ticks_per_s': True, 'p50_ms': False, 'p99_ms': False, 'peak_mb': False}
+
+
+def tick_all(world, players, rng, size, orders):
+    if world.tick_count % orders == 0:
+        for player in players:
+            player.give_orders(rng, size)
+    world.tick()
+
+
+def bench(n, ticks, seed=0, orders=50, memory_ticks=5, lod=False, sensors=False):
+    rng = random.Random(seed)
+    random.seed(seed)
+    gc.collect()
+
+    tracemalloc.start()
+    world = Scheduler(budget=float('inf')) # run every due job: we want the full cost of a tick
+    players, size = populate_world(world, n, rng)
+    if lod:
+        LevelOfDetail(world, [player.fleets[0].ships[0] for player in players])
+    if sensors:
+        sensors = Sensors(world)
+        for fleet in (fleet for player in players for fleet in player.fleets):
+            sensors.share(fleet.ships)
+    if telemetry.enabled:
+        telemetry.reset()
+        telemetry.watch(world)
+    for _ in range(memory_ticks):
+        tick_all(world, players, rng, size, orders)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(ticks):
+        t = time.perf_counter()
+        tick_all(world, players, rng, size, orders)
+        latencies.append(time.perf_counter() - t)
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {'agents': len(world.agents),
+            'ticks': ticks,
+            'ticks_per_s': ticks / elapsed,
+            'p50_ms': 1000 * latencies[len(latencies) // 2],
+            'p99_ms': 1000 * latencies[min(len(latencies) - 1, int(len(latencies) * .99))],
+            'mean_ms': 1000 * statistics.fmean(latencies),
+            'peak_mb': peak / 2**20}
+
+
+def record(n, ticks, log, seed=0, orders=50):
+    """plays `ticks` ticks of a world of n ships, with settings.ai_seed = seed, logging its commands to log"""
+    settings.ai_seed = seed
+    rng = random.Random(seed)
+    world = Scheduler(budget=float('inf'))
+    players, size = populate_world(world, n, rng)
+    with Recorder(log, world):
+        for _ in range(ticks):
+            tick_all(world, players, rng, size, orders)
+    return world
+
+
+def replay(n, log, seed=0):
+    """replays log onto a world of n ships, built as record() does; returns Replayer.replay's stats"""
+    settings.ai_seed = seed
+    replayer = Replayer(log).seed_uids()
+    world = Scheduler(budget=float('inf'))
+    populate_world(world, n, random.Random(seed))
+    gc.collect()
+    return replayer.replay(world)
+
+
+def run(args):
+    results = {}
+    if args.telemetry:
+        telemetry.enable()
+    print(f"{'ships':>8} {'agents':>8} {'ticks/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'peak MB':>9}")
+    for n in args.sizes:
+        r = results[str(n)] = bench(n, args.ticks, args.seed, args.orders, args.memory_ticks, args.lod,
+                                    args.sensors)
+        print(f"{n:>8} {r['agents']:>8} {r['ticks_per_s']:>10.1f} {r['p50_ms']:>9.2f} "
+              f"{r['p99_ms']:>9.2f} {r['peak_mb']:>9.1f}")
+        if args.telemetry:
+            print(telemetry.report())
+            telemetry.dump(args.telemetry)
+    if args.out:
+        meta = {'python': platform.python_version(), 'platform': platform.platform(),
+                'fps': settings.FPS, 'seed': args.seed, 'orders': args.orders, 'lod': args.lod,
+                'sensors': args.sensors,
+                'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+        with open(args.out, 'w') as f:
+            json.dump({'meta': meta, 'results': results}, f, indent=2)
+
+
+def compare(baseline, current, threshold):
+    """[(size, metric, baseline value, current value, relative change, regressed)]"""
+    rows = []
+    for size, base in baseline['results'].items():
+        cur = current['results'].get(size)
+        if cur is None:
+            continue
+        for metric, higher_is_better in METRICS.items():
+            if not base.get(metric):
+                continue
+            change = (cur[metric] - base[metric]) / base[metric]
+            worse = -change if higher_is_better else change
+            rows.append((size, metric, base[metric], cur[metric], change, worse > threshold))
+    return rows
+
+
+def run_compare(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    rows = compare(baseline, current, args.threshold)
+    print(f"{'ships':>8} {'metric':<12} {'baseline':>10} {'current':>10} {'change':>8}")
+    for size, metric, base, cur, change, regressed in rows:
+        flag = '  REGRESSION' if regressed else ''
+        print(f"{size:>8} {metric:<12} {base:>10.2f} {cur:>10.2f} {change:>+8.1%}{flag}")
+    return 1 if any(row[-1] for row in rows) else 0
+
+
+def run_replay(args):
+    r = replay(args.ships, args.log, args.seed)
+    print(f"{r['ticks']} ticks, {r['injected']} commands injected: {r['ticks_per_s']:.1f} ticks/s")
+    if r['diverged'] is not None:
+        print(f"diverged from the recording at tick {r['diverged']}")
+        return 1
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    p = commands.add_parser('run', help='run the benchmark')
+    p.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000], help='numbers of ships')
+    p.add_argument('--ticks', type=int, default=100)
+    p.add_argument('--orders', type=int, default=50, help='ticks between the orders of the players')
+    p.add_argument('--memory-ticks', type=int, default=5, help='ticks run with memory tracing on')
+    p.add_argument('--seed', type=int, default=0)
+    p.add_argument('--lod', action='store_true', help='with the AI level of detail on')
+    p.add_argument('--sensors', action='store_true', help='with the world-level sensor sweep on')
+    p.add_argument('--telemetry', metavar='PATH', help='with the command telemetry on, dumped to PATH')
+    p.add_argument('--out', help='JSON file to save the results to')
+
+    p = commands.add_parser('compare', help='compare two saved runs')
+    p.add_argument('baseline')
+    p.add_argument('current')
+    p.add_argument('--threshold', type=float, default=.2, help='relative change counted as a regression')
+
+    p = commands.add_parser('record', help='record the commands of a session')
+    p.add_argument('--ships', type=int, default=10000)
+    p.add_argument('--ticks', type=int, default=500)
+    p.add_argument('--orders', type=int, default=50, help='ticks between the orders of the players')
+    p.add_argument('--seed', type=int, default=0)
+    p.add_argument('--log', required=True)
+
+    p = commands.add_parser('replay', help='replay a recorded session, as fast as possible')
+    p.add_argument('--ships', type=int, default=10000)
+    p.add_argument('--seed', type=int, default=0)
+    p.add_argument('--log', required=True)
+
+    args = parser.parse_args(argv)
+    if args.command == 'run':
+        return run(args)
+    if args.command == 'record':
+        record(args.ships, args.ticks, args.log, args.seed, args.orders)
+        return 0
+    if args.command == 'replay':
+        return run_replay(args)
+    return run_compare(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
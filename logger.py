@@ -1,31 +1,81 @@
 import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
 import settings
 logging.basicConfig(format=settings.loggerformat)
 
+
+class _Message:
+    """the arguments of a logging call: they are only joined into a string when the record
+    is emitted (once, however many handlers there are)"""
+    __slots__ = ('msg', '_str')
+
+    def __init__(self, msg):
+        self.msg = msg
+        self._str = None
+
+    def __str__(self):
+        if self._str is None:
+            self._str = ' '.join(str(b) for b in self.msg)
+        return self._str
+
+
 class _logger:
     def __init__(self, logger):
         self.logger = logger
 
-    def _chain(self, *msg):
-        return ' '.join(str(b) for b in msg)
+    def _log(self, lvl, msg):
+        # check the level first: disabled calls cost neither formatting nor a LogRecord
+        if self.logger.isEnabledFor(lvl):
+            self.logger.log(lvl, _Message(msg))
 
     def _setLevel(self, lvl):
         self.logger.setLevel(lvl)
 
     def debug(self, *msg, **kwargs):
-        self.logger.debug(self._chain(*msg))
+        self._log(logging.DEBUG, msg)
 
     def info(self, *msg, **kwargs):
-        self.logger.info(self._chain(*msg))
+        self._log(logging.INFO, msg)
 
     def warning(self, *msg, **kwargs):
-        self.logger.warning(self._chain(*msg))
+        self._log(logging.WARNING, msg)
 
     def error(self, *msg, **kwargs):
-        self.logger.error(self._chain(*msg))
+        self._log(logging.ERROR, msg)
 
     def critical(self, *msg, **kwargs):
-        self.logger.critical(self._chain(*msg))
+        self._log(logging.CRITICAL, msg)
+
+
+_listener = None
+
+
+def start_async_logging():
+    """
+    Takes log I/O off the simulation thread: the handlers of the root logger are moved behind
+    an unbounded queue, which a background thread drains. Logging calls then only format the
+    record and enqueue it, and never block on I/O.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+    root = logging.getLogger()
+    records = queue.SimpleQueue()
+    _listener = QueueListener(records, *root.handlers, respect_handler_level=True)
+    root.handlers = [QueueHandler(records)]
+    _listener.start()
+    return _listener
+
+
+def stop_async_logging():
+    """flushes the queued records, and gives the handlers back to the root logger"""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    logging.getLogger().handlers = list(_listener.handlers)
+    _listener = None
 
 
 def getLogger(fname):
@@ -43,3 +93,7 @@ def getLogger(fname):
     logger._setLevel(dbglvl)
 
     return logger
+
+
+if settings.async_logging:
+    start_async_logging()
@@ -22,6 +22,12 @@ asteroid_gen_params = {
 # Forces rtrees to be re-evaluated instead of being pulled from memory.
 rtree_force_regen = False
 
+# modules implementing the behaviours of each agent class; imported when the first agent of that class is created.
+# (packages can also declare them through 'behaviour_dummy.behaviours' entry points)
+behaviour_modules = {
+    'Ship': ['ai.behaviours.ship_b'],
+}
+
 # triggers lazy loading of saved ship models instead of randomly generating new ones
 ship_loading = True
 
@@ -34,6 +40,37 @@ default_ship_model = 'fighter'
 # defines priority rules for command execution. If the ship's AI determines that the best target to shoot at is A, but fleet thinks it's B, the ship will shoot B (if fleet precedes ship in this setting).
 command_priority_order = ['player', 'aiplayer', 'colony', 'colonyfleet', 'fleet', 'ship']
 
+# behaviour traces: number of traced calls kept per behaviour (older ones are overwritten),
+# and fraction of the behaviours that are traced at all (see Behaviour._trace_rate, to set it per class)
+trace_capacity = 64
+trace_sample_rate = 1.0
+
+# halted sub-behaviours kept for reuse, per class, when delegating to a behaviour class (see
+# Behaviour.delegate); 0: no pooling
+behaviour_pool_size = 256
+
+# collects latency histograms of the behaviour steps, transitions and preconditions (see ai.profiling)
+profile_behaviours = False
+
+# seeds the random streams of the agents (ControllableObject.rng), which their behaviours break
+# ties with, so that runs can be replayed (see ai.replay); None: they all use the global random module
+ai_seed = None
+
+# caches the results of the @memoized methods (agent queries, expensive preconditions) for the
+# duration of a tick (see ai.memo)
+memoize = True
+# also memoizes every transition precondition (but the @mark.volatile ones). Off by default: for
+# cheap preconditions the bookkeeping costs more than it saves (bench_transition_model --memo tells)
+memoize_predicates = False
+
+# times the commands from emission to completion, and gauges the queues (see ai.telemetry); with
+# telemetry_path set, the metrics are also dumped there (Prometheus text format) every timers['telemetry_dump']
+command_telemetry = False
+telemetry_path = None
+
+# validates the arguments of every Command upon creation (slow: for debugging)
+debug_commands = False
+
 # auto-equips picked-up scrap (always succeeds if component, food... but slots only succeed if there is an empty slot)
 autoequip_pickup_ifempty = False
 
@@ -66,6 +103,9 @@ default_priority_seq = ['cockpits', 'engines', 'hardpoints', 'armors', 'thruster
 # number of scans after which tracked objects will stop being visible after trace is lost, to give ships a chance to regain it without them 'blinking' all time due to chance.
 tracking_timeout = 2
 
+# radius of the scans of the agents that do not set their own scan_range (see ai.sensors)
+scan_range = 200
+
 # distance at which ships can pick up pods and objects
 pickup_range = 2
 
@@ -91,9 +131,23 @@ timers = {
     # millisecs rate at which ships/fleet scan their surroundings
     'scan_rate': 5000,
     # rate at which a ship's population will need food -- or begin to starve
-    'pop_timer': 10000000
+    'pop_timer': 10000000,
+    # rate at which the agents are sorted into AI level of detail tiers (see ai.lod)
+    'lod_update': 500,
+    # rate at which the whole spatial index of a world catches up with the agents' positions
+    # (agents reporting their moves are always up to date: see ControllableObject.moved)
+    'spatial_refresh': 1000,
+    # rate at which the command telemetry is dumped to settings.telemetry_path (see ai.telemetry)
+    'telemetry_dump': 10000,
     }
 
+# AI level of detail (see ai.lod): (distance, slowdown) tiers. Agents within `distance` view
+# radii (render_distance tiles, plus the preload_window_padding) of a player-controlled agent
+# get their behaviours stepped `slowdown` times less often; None is the distance of the last tier.
+lod_tiers = ((1, 1), (2, 4), (None, 16))
+# agents only move to a farther tier once this fraction beyond its distance (no flickering at the border)
+lod_hysteresis = 0.1
+
 
 # if random() < this number, the slot is jettisoned upon component destruction, else disappears forever.
 slot_survival_chance = 0.3
@@ -119,6 +173,8 @@ MOON_IMG = "moon.png"
 BG_MUSIC = "space.flac"
 
 loggerformat = '%(name)s:%(levelname)s:%(lineno)d: %(message)s'
+# writes the logs from a background thread, so that log I/O never blocks the simulation
+async_logging = False
 _debuglevel = {
     'compositeobject':  0,
     'fleet':            0,
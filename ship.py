@@ -1,5 +1,5 @@
 from ai.command import ControllableObject
-from ai.behaviours import ship_b
+from ai.combat import Armed
 
-class Ship(ControllableObject):
+class Ship(ControllableObject, Armed):
     pass
@@ -0,0 +1,41 @@
+"""
+Agents shared by the command tests: a Player giving orders, and a Fleet carrying them out.
+"""
+
+import asyncio
+from ai.command import ControllableObject
+
+
+class Player(ControllableObject):
+    pass
+
+
+class Fleet(ControllableObject):
+    _timers = {'update': None}
+    goingto = None
+    arrived = None
+
+    def __init__(self):
+        super().__init__()
+        self.log = []
+
+    def goto(self, pos):
+        self.goingto = pos
+        # completion comes later, through the callback (for SIGNALLED orders)
+        self.arrived = self.executing.resolve
+
+    def dock(self):
+        # (a SIGNALLED order that completes at once, within its action)
+        self.executing.resolve()
+
+    async def travel(self, name, seconds):
+        self.log.append(f'leave {name}')
+        await asyncio.sleep(seconds)
+        self.log.append(f'reach {name}')
+
+    def note(self, name):
+        self.log.append(name)
+
+    def updates(self):
+        """the timer of the update job"""
+        return self.world.agents[self]['update']
@@ -0,0 +1,150 @@
+import asyncio
+import pytest
+from ai.behaviours.behaviour import Behaviour, mark
+from ai.scheduler import Scheduler
+from ai.tasks import NoLoopError
+from agents import Fleet, Player
+
+
+class Walk(Behaviour):
+    """exits after three steps"""
+    @mark.transition(post='walk', root=True)
+    def start(self):
+        self.agent.log.append('start')
+
+    @mark.transition(post=None)
+    def walk(self):
+        self.agent.log.append('walk')
+
+
+class Plan(Behaviour):
+    @mark.transition(post='done', root=True)
+    async def go(self):
+        self.agent.log.append('go')
+        await Walk(self.agent)
+        self.agent.log.append('back')
+
+    @mark.transition(post=None)
+    def done(self):
+        self.agent.log.append('done')
+
+
+def test_coroutine_commands():
+    async def main():
+        player, fleet = Player(), Fleet()
+        task = asyncio.ensure_future(fleet.run_commands(poll=0))
+        player.emit_command(fleet.travel, None, 'a', .01)
+        player.emit_command(fleet.note, None, 'b')
+        await asyncio.sleep(0) # the first command starts...
+        await asyncio.sleep(0) # ...and its task runs
+        assert fleet.log == ['leave a'] and fleet.executing is not None
+        player.emit_command(fleet.travel, None, 'c', 0)
+        await asyncio.sleep(.05)
+        assert fleet.log == ['leave a', 'reach a', 'b', 'leave c', 'reach c']
+        assert fleet.executing is None and not fleet.commands.incoming and not player.commands.outgoing
+        task.cancel()
+    asyncio.run(main())
+
+
+def test_polled_command():
+    async def main():
+        player, fleet = Player(), Fleet()
+        polls = []
+        check = lambda: polls.append(1) or len(polls) == 3
+        task = asyncio.ensure_future(fleet.run_commands(poll=0))
+        player.emit_command(fleet.note, check, 'a')
+        player.emit_command(fleet.note, None, 'b')
+        for _ in range(10):
+            await asyncio.sleep(0)
+        assert fleet.log == ['a', 'b'] and len(polls) == 3
+        task.cancel()
+    asyncio.run(main())
+
+
+def test_await_sub_behaviour():
+    agent = Fleet()
+    plan = Plan(agent)
+    asyncio.run(plan.run(period=0))
+    assert agent.log == ['go', 'start', 'walk', 'back', 'done']
+    assert plan.tm.asynchronous and not Walk.tm.asynchronous
+
+
+def test_sync_step_waits_for_coroutine_action():
+    async def main():
+        agent = Fleet()
+        plan = Plan(agent)
+        plan.step() # starts go() as a task
+        plan.step() # still busy: no-op
+        assert agent.log == [] and plan._busy is not None
+        await plan._busy
+        plan.step()
+        assert agent.log == ['go', 'start', 'walk', 'back', 'done']
+    asyncio.run(main())
+
+
+def test_coroutine_action_needs_a_loop():
+    plan = Plan(Fleet())
+    with pytest.raises(RuntimeError):
+        plan.step()
+    # nothing moved: the node is chosen anew, once there is a loop
+    assert plan.state is None and plan._busy is None and plan.agent.log == []
+    asyncio.run(plan.run(period=0))
+    assert plan.agent.log == ['go', 'start', 'walk', 'back', 'done']
+
+
+def test_coroutine_command_needs_a_loop():
+    player, fleet = Player(), Fleet()
+    cmd = player.emit_command(fleet.travel, None, 'a', 0)
+    with pytest.raises(NoLoopError):
+        fleet.execute_next_command()
+    fleet.update() # (logged)
+    # the command is still queued, and can run later
+    assert fleet.executing is None and list(fleet.commands.incoming) == [cmd]
+
+    async def main():
+        task = asyncio.ensure_future(fleet.run_commands(poll=0))
+        await asyncio.sleep(.01)
+        task.cancel()
+    asyncio.run(main())
+    assert fleet.log == ['leave a', 'reach a'] and not player.commands.outgoing
+
+
+class Failing(Behaviour):
+    @mark.transition(post=None, root=True)
+    async def crash(self):
+        raise ValueError('boom')
+
+
+def test_failed_coroutine_action_is_logged(caplog):
+    async def main():
+        b = Failing(Fleet())
+        b.step()
+        await asyncio.sleep(0)
+        b.step()
+        assert b._busy is None
+    asyncio.run(main())
+    assert "ValueError('boom')" in caplog.text
+
+
+def test_many_agents_wait_cheaply():
+    async def main():
+        player = Player()
+        fleets = [Fleet() for _ in range(2000)]
+        tasks = [asyncio.ensure_future(f.run_commands()) for f in fleets]
+        for f in fleets:
+            player.emit_command(f.travel, None, 'x', .05)
+        await asyncio.sleep(.3)
+        assert all(f.log == ['leave x', 'reach x'] for f in fleets)
+        assert not player.commands.outgoing
+        for t in tasks:
+            t.cancel()
+    asyncio.run(main())
+
+
+def test_coroutine_command_under_the_scheduler():
+    world = Scheduler(budget=1)
+    player, fleet = Player(), world.add(Fleet())
+    cmd = player.emit_command(fleet.travel, None, 'a', 0)
+    world.run(3) # no loop: the command waits, and the fleet sleeps
+    assert fleet.executing is None and list(fleet.commands.incoming) == [cmd]
+    assert world.agents[fleet]['update'].cancelled
@@ -0,0 +1,117 @@
+import random
+import attr
+import numpy as np
+import pytest
+from ai.batch import BatchStepper
+from ai.behaviours.behaviour import Behaviour, mark, EXIT
+
+
+@attr.s
+class Fork(Behaviour):
+    p = attr.ib(default=True)
+
+    def q(self):
+        return not self.p
+
+    @staticmethod
+    @mark.vectorized('p')
+    def p_batch(behaviours):
+        return np.array([b.p for b in behaviours])
+
+    @staticmethod
+    @mark.vectorized('q')
+    def q_batch(behaviours):
+        return ~Fork.p_batch(behaviours)
+
+    @mark.transition(post='b', pre='p')
+    @mark.transition(post='c', pre='q')
+    def a(self):
+        pass
+
+    @mark.action
+    def b(self):
+        pass
+
+    @mark.action
+    def c(self):
+        pass
+
+
+class Coin(Behaviour):
+    # two equally good choices: sampled at random
+    @mark.transition(post='heads')
+    @mark.transition(post='tails')
+    def toss(self):
+        pass
+
+    @mark.action
+    def heads(self):
+        pass
+
+    @mark.action
+    def tails(self):
+        pass
+
+
+@attr.s
+class Plain(Fork):
+    # p has no vectorized version here
+    def r(self):
+        return self.p
+
+    @mark.transition(post='b', pre='r')
+    @mark.transition(post='c', pre='q')
+    def a(self):
+        pass
+
+
+def test_batchable():
+    assert Fork.tm.batchable and Coin.tm.batchable
+    assert not Plain.tm.batchable
+
+
+@pytest.mark.parametrize('cls', [Fork, Plain])
+def test_same_as_per_agent_step(cls):
+    population = [cls(None, i % 3 == 0) for i in range(30)]
+    stepper = BatchStepper(seed=0)
+    stepper.step([cls])
+    assert all(b.node == 'a' for b in population)
+    stepper.step([cls])
+    assert [b.node for b in population] == ['b' if b.p else 'c' for b in population]
+    stepper.step([cls])
+    assert all(b.state == EXIT and b._halted for b in population)
+
+
+def test_seeded_sampling():
+    def run(seed):
+        population = [Coin(None) for _ in range(200)]
+        BatchStepper(seed).step([Coin])
+        BatchStepper(seed).step([Coin])
+        return [b.node for b in population]
+
+    first = run(42)
+    assert first == run(42)
+    assert 50 < first.count('heads') < 150
+
+
+def test_delegates_are_stepped_once():
+    parent, child = Fork(None), Coin(None)
+    stepper = BatchStepper(seed=0)
+    stepper.step([Fork])
+    parent.delegate(child)
+    assert stepper.population()[Coin] == [child]
+    stepper.step([Fork, Coin])
+    assert parent.node == 'a' and child.node == 'toss'
+    stepper.step([Fork, Coin])
+    assert parent.node == 'a' and child.node in ('heads', 'tails')
+
+
+def test_vectorized_range_check_matches_scalar():
+    from ai.behaviours.ship_b.aggression import ApproachAndAttack
+    from benchmarks.stubs import populate
+    rng = random.Random(0)
+    ships = populate(50, rng)
+    behaviours = [ApproachAndAttack(s, rng.choice(s.contacts)) for s in ships]
+    expected = [b.enemyinrange() for b in behaviours]
+    assert np.allclose(ApproachAndAttack.enemyinrange_batch(behaviours), expected)
+    assert list(ApproachAndAttack.enemyoutofrange_batch(behaviours)) == [b.enemyoutofrange() for b in behaviours]
@@ -0,0 +1,63 @@
+import attr
+from ai.behaviours.behaviour import Behaviour, BehaviourPool, behaviour_pool, mark
+
+
+@attr.s
+class Chase(Behaviour):
+    target = attr.ib()
+    laps = attr.ib(default=0, init=False)
+
+    @mark.transition(post='run', root=True)
+    def run(self):
+        self.laps += 1
+        if self.laps == 2:
+            self.halt()
+
+
+class HunterBehaviour(Behaviour):
+    _agentclass = 'Hunter'
+
+
+class Hunting(HunterBehaviour):
+    @mark.transition(post='hunt', root=True)
+    def hunt(self):
+        self.agent.hunts += 1
+        self.delegate(Chase, target=self.agent.hunts)
+
+
+class Hunter:
+    hunts = 0
+
+
+def test_reset():
+    c = Chase('agent', 'a')
+    c.step()
+    c.skip('run')
+    assert c.reset(target='b') is c
+    assert (c.agent, c.target, c.laps, c.state, c._next) == ('agent', 'b', 0, None, None)
+    assert Behaviour._live[id(c)] is c
+
+
+def test_delegation_reuses_halted_subs():
+    behaviour_pool.clear()
+    hunter = Hunting(Hunter())
+    hunter.step()
+    first = hunter.sub
+    assert first.target == 1 and first._parent is hunter and first._pooled
+    assert hunter.stack == [hunter, first] and hunter.active is first
+    for _ in range(2): # the chase runs twice, halting
+        hunter.step()
+    assert hunter.sub is first and first._halted and hunter.stack == [hunter]
+    hunter.step() # back to hunting
+    second = hunter.sub # the halted chase, recycled
+    assert second.target == 2 and second.laps == 0 and not second._halted
+    assert (behaviour_pool.created, behaviour_pool.reused) == (1, 1)
+
+
+def test_release():
+    pool = BehaviourPool(size=1)
+    hunter = Hunting(Hunter())
+    subs = [pool.acquire(Chase, hunter.agent, target=i) for i in range(2)]
+    for b in subs:
+        pool.release(b)
+    assert len(pool) == 1 and id(subs[0]) not in Behaviour._live
@@ -0,0 +1,21 @@
+import json
+from benchmarks import suite
+
+
+def test_bench_smoke():
+    r = suite.bench(50, ticks=5, orders=2, memory_ticks=2)
+    assert r['agents'] == 50 + 5 + 1 # ships, fleets of 10, one player
+    assert r['ticks_per_s'] > 0 and r['p99_ms'] >= r['p50_ms'] > 0
+    assert r['peak_mb'] > 0
+
+
+def test_compare(tmp_path):
+    base = {'results': {'1000': {'ticks_per_s': 100, 'p50_ms': 10, 'p99_ms': 20, 'peak_mb': 5}}}
+    cur = {'results': {'1000': {'ticks_per_s': 80, 'p50_ms': 10.5, 'p99_ms': 15, 'peak_mb': 5}}}
+    regressed = {metric for _, metric, *_, bad in suite.compare(base, cur, .1) if bad}
+    assert regressed == {'ticks_per_s'}
+
+    for name, data in (('a.json', base), ('b.json', cur)):
+        (tmp_path / name).write_text(json.dumps(data))
+    assert suite.main(['compare', str(tmp_path / 'a.json'), str(tmp_path / 'b.json'), '--threshold', '.1']) == 1
+    assert suite.main(['compare', str(tmp_path / 'a.json'), str(tmp_path / 'a.json')]) == 0
@@ -0,0 +1,19 @@
+from ai.command import SIGNALLED
+from agents import Fleet, Player
+
+
+def test_coalesced_orders_supersede_queued_ones():
+    p, s, other = Player(), Fleet(), Player()
+    first = p.emit_command(s.goto, SIGNALLED, (0, 0), coalesce='chase')
+    p.emit_command(s.goto, SIGNALLED, (5, 5))
+    theirs = other.emit_command(s.goto, SIGNALLED, (9, 9), coalesce='chase') # other source: another key
+    for i in range(1, 50):
+        last = p.emit_command(s.goto, SIGNALLED, (i, i), coalesce='chase')
+    assert len(p.commands.outgoing) == 2 and len(s.commands.incoming) == 3
+    assert first not in s.commands.incoming and theirs in s.commands.incoming
+    s.update()
+    assert s.executing is last and s.goingto == (49, 49) # in first's place in line
+    assert last not in p.commands.outgoing
+    s.arrived()
+    p.emit_command(s.goto, SIGNALLED, (50, 50), coalesce='chase') # nothing to supersede any more
+    assert len(s.commands.incoming) == 3
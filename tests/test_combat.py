@@ -0,0 +1,52 @@
+import math
+import random
+import numpy as np
+import pytest
+from ai.combat import Armed, fraction_in_range, paired_fraction_in_range, fleet_fraction_in_range
+
+
+class Hardpoint:
+    def __init__(self, range):
+        self.range = range
+
+
+class Gunship(Armed):
+    def __init__(self, pos, ranges):
+        self.pos = pos
+        self.hardpoints = [Hardpoint(r) for r in ranges]
+
+
+def scalar(agent, target):
+    dist = math.hypot(agent.pos[0] - target.pos[0], agent.pos[1] - target.pos[1])
+    ranges = [h.range for h in agent.hardpoints]
+    return sum(r >= dist for r in ranges) / len(ranges) if ranges else 0
+
+
+@pytest.fixture
+def fleet():
+    rng = random.Random(0)
+    return [Gunship((rng.uniform(0, 100), rng.uniform(0, 100)),
+                    [rng.uniform(5, 80) for _ in range(rng.randrange(0, 6))]) for _ in range(40)]
+
+
+def test_loadout_changes_update_ranges():
+    s = Gunship((0, 0), [30, 10])
+    assert list(s.hardpoint_ranges) == [10, 30]
+    laser = Hardpoint(20)
+    s.equip(laser)
+    assert list(s.hardpoint_ranges) == [10, 20, 30]
+    s.unequip(laser)
+    assert list(s.hardpoint_ranges) == [10, 30]
+    assert fraction_in_range(s, 15) == .5
+    assert fraction_in_range(Gunship((0, 0), []), 15) == 0
+
+
+def test_paired(fleet):
+    targets = fleet[::-1]
+    assert np.allclose(paired_fraction_in_range(fleet, targets), [scalar(a, t) for a, t in zip(fleet, targets)])
+
+
+def test_fleet_against_targets(fleet):
+    targets = fleet[:7]
+    expected = [[scalar(a, t) for t in targets] for a in fleet]
+    assert np.allclose(fleet_fraction_in_range(fleet, targets), expected)
@@ -0,0 +1,57 @@
+import pytest
+from ai.command import SIGNALLED
+from ai.scheduler import Scheduler
+from agents import Fleet, Player
+
+
+@pytest.fixture
+def world():
+    return Scheduler(budget=1)
+
+
+def test_signalled_completion():
+    p, s = Player(), Fleet()
+    cmd = p.emit_command(s.goto, SIGNALLED, (10, 10))
+    s.update()
+    assert s.executing is cmd and not cmd.is_done
+    s.update() # still waiting: is_done does not poll anything
+    assert s.executing is cmd
+    s.arrived()
+    assert cmd.is_done and s.executing is None
+
+
+def test_idle_agents_sleep(world):
+    ships = [world.add(Fleet()) for _ in range(10)]
+    world.run(2)
+    assert all(s.updates().cancelled for s in ships)
+    assert world.run(10) == 0
+
+
+def test_commands_wake_agents_up(world):
+    p, s = Player(), world.add(Fleet())
+    world.run(2)
+    first = p.emit_command(s.goto, SIGNALLED, (1, 1))
+    second = p.emit_command(s.goto, SIGNALLED, (2, 2))
+    assert not s.updates().cancelled
+    world.run(1)
+    assert s.executing is first
+    assert s.updates().cancelled # waiting for completion: no polling
+    assert world.run(5) == 0
+
+    s.arrived()
+    assert not s.updates().cancelled # more commands to go
+    world.run(1)
+    assert s.executing is second and s.goingto == (2, 2)
+    s.arrived()
+    assert s.updates().cancelled and s.executing is None
+
+
+def test_polled_commands_keep_agents_awake(world):
+    p, s = Player(), world.add(Fleet())
+    done = []
+    p.emit_command(s.goto, lambda: bool(done), (1, 1))
+    world.run(3)
+    assert s.executing is not None and not s.updates().cancelled
+    done.append(True)
+    world.run(2)
+    assert s.executing is None and s.updates().cancelled
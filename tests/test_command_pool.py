@@ -0,0 +1,71 @@
+import pytest
+import settings
+from ai.command import Command, CommandPool, ControllableObject, SIGNALLED
+from agents import Fleet, Player
+
+
+@pytest.fixture
+def items():
+    return Player(), Fleet()
+
+
+def test_slotted_command(items):
+    p, s = items
+    cmd = Command(p, s.goto, None, (10, 10))
+    assert not hasattr(cmd, '__dict__')
+    assert cmd.priority == settings.command_priority_order.index('player')
+    p._cmd_priority = 99 # captured at creation
+    assert cmd.priority != 99
+
+
+def test_validation_is_opt_in(items, monkeypatch):
+    p, s = items
+    Command(p, 'not a method', None)
+    monkeypatch.setattr(settings, 'debug_commands', True)
+    with pytest.raises(AssertionError):
+        Command(p, 'not a method', None)
+
+
+def test_pool_recycles_completed_commands(items, monkeypatch):
+    p, s = items
+    pool = CommandPool(size=2)
+    monkeypatch.setattr(ControllableObject, 'command_pool', pool)
+    first = p.emit_command(s.goto, None, (1, 1))
+    s.update()
+    assert s.goingto == (1, 1) and s.executing is first
+    s.update() # first is done: back to the pool
+    assert len(pool) == 1 and first.action is None
+
+    second = p.emit_command(s.goto, None, (2, 2))
+    assert second is first and pool.created == 1
+    s.update()
+    assert s.goingto == (2, 2)
+
+
+def test_commands_go_back_to_the_source_pool(items, monkeypatch):
+    p, s = items
+    pool = CommandPool()
+    monkeypatch.setattr(Player, 'command_pool', pool) # (the subject, a Fleet, has none)
+    for i in range(3):
+        p.emit_command(s.goto, None, (i, i))
+        s.update()
+        s.update()
+    assert s.goingto == (2, 2) and pool.created == 1 and len(pool) == 1
+    assert Fleet.command_pool is None
+
+
+def test_superseded_commands_are_not_reused(items, monkeypatch):
+    p, s = items
+    pool = CommandPool()
+    monkeypatch.setattr(Player, 'command_pool', pool)
+    busy = p.emit_command(s.goto, SIGNALLED, (0, 0))
+    s.update() # executing busy: the chase orders queue up
+    first = p.emit_command(s.goto, SIGNALLED, (1, 1), coalesce='chase')
+    last = p.emit_command(s.goto, SIGNALLED, (2, 2), coalesce='chase') # supersedes first
+    assert list(s.commands.incoming) == [last] and len(pool) == 0
+    first.resolve() # (its emitter still held it): no effect
+    assert first.action is not None and s.executing is busy and not busy.is_done
+
+    busy.resolve()
+    s.update()
+    assert s.executing is last and s.goingto == (2, 2)
@@ -0,0 +1,103 @@
+import random
+import pytest
+from ai.command import CommandQueue, DequeCommandQueue
+
+
+class Cmd:
+    key = None
+
+    def __init__(self, name, priority):
+        self.name = name
+        self.priority = priority
+
+    def __repr__(self):
+        return f'<{self.name}:{self.priority}>'
+
+
+@pytest.fixture
+def queue():
+    return CommandQueue(None)
+
+
+def test_empty(queue):
+    with pytest.raises(CommandQueue.EmptyQueueError):
+        queue.get_next_command()
+
+
+def test_priority_wins(queue):
+    low, high = Cmd('low', 5), Cmd('high', 0)
+    queue.queue(low)
+    queue.queue(high)
+    assert queue.get_next_command(keep=True) is high
+    assert len(queue) == 2
+    assert queue.get_next_command() is high
+    assert queue.get_next_command() is low
+    assert len(queue) == 0
+
+
+def test_fifo_within_priority_and_line_jumping(queue):
+    a, b, c = Cmd('a', 1), Cmd('b', 1), Cmd('c', 1)
+    queue.queue(a)
+    queue.queue(b)
+    assert queue.get_next_command(keep=True) is a # first received = first executed
+    queue.queue(c, priority=True)
+    assert queue.get_next_command(keep=True) is c # unless prioritised
+    assert list(queue) == [c, a, b]
+
+
+def test_remove(queue):
+    a, b = Cmd('a', 1), Cmd('b', 1)
+    queue.queue(a)
+    queue.queue(b)
+    queue.remove(a)
+    assert a not in queue
+    assert len(queue) == 1
+    assert queue.get_next_command() is b
+    with pytest.raises(ValueError):
+        queue.remove(a)
+
+
+def test_supersede(queue):
+    a, b, c = Cmd('a', 1), Cmd('b', 1), Cmd('c', 1)
+    a.key = c.key = 'goto'
+    queue.queue(a)
+    queue.queue(b)
+    assert queue.supersede(c) is a
+    assert list(queue) == [c, b] and a not in queue # in a's place in line
+    assert queue.supersede(Cmd('d', 1)) is None and len(queue) == 2
+
+    d = Cmd('d', 0) # with a different priority: moves accordingly
+    d.key = 'goto'
+    queue.queue(Cmd('e', 0))
+    assert queue.supersede(d) is c
+    assert list(queue)[0] is d and len(queue) == 3
+    assert queue.get_next_command() is d
+    e = Cmd('e', 1)
+    e.key = 'goto'
+    assert queue.supersede(e) is None # d is gone
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_same_order_as_deque_queue(seed):
+    rng = random.Random(seed)
+    heap, ref = CommandQueue(None), DequeCommandQueue(None)
+    pending = []
+    for i in range(2000):
+        op = rng.random()
+        if op < 0.5 or not pending:
+            cmd = Cmd(i, rng.randrange(6))
+            prio = rng.random() < 0.2
+            heap.queue(cmd, priority=prio)
+            ref.queue(cmd, priority=prio)
+            pending.append(cmd)
+        elif op < 0.75:
+            cmd = pending.pop(rng.randrange(len(pending)))
+            heap.remove(cmd)
+            ref.remove(cmd)
+        else:
+            cmd = ref.get_next_command()
+            assert heap.get_next_command() is cmd
+            pending.remove(cmd)
+        assert len(heap) == len(ref)
+    # execution order: by priority, then by position in the deque
+    assert list(heap) == sorted(ref._commands, key=lambda c: c.priority)
@@ -0,0 +1,66 @@
+import gc
+import pickle
+import numpy as np
+import pytest
+from ai.combat import positions
+from ai.command import ControllableObject
+from ai.components import ComponentStore
+
+
+class Drone(ControllableObject):
+    components = ComponentStore(capacity=2, pos=(float, 2), velocity=(float, 2), hull=float, kills=int)
+
+    def __init__(self, pos=None):
+        super().__init__()
+        if pos is not None:
+            self.pos = pos
+
+
+@pytest.fixture
+def store():
+    gc.collect() # (the drones of other tests free their entities)
+    return Drone.components
+
+
+def test_fields_are_views(store):
+    d = Drone((1, 2))
+    assert d.pos == (1., 2.) and d.hull is None and d.kills == 0 and 'pos' not in vars(d)
+    d.hull = 10
+    assert store['hull'][d._eid] == 10 and d.hull == 10.
+    store['pos'][d._eid] = (3, 4)
+    assert d.pos == (3., 4.)
+    d.pos = None
+    assert d.pos is None
+    assert Drone().pos is None # (no entity until a field is set)
+
+
+def test_growth_and_reuse(store):
+    drones = [Drone((i, 0)) for i in range(10)]
+    assert len(store) >= 10 and [d.pos[0] for d in drones] == list(range(10))
+    eid = drones[3]._eid
+    del drones[3]
+    gc.collect()
+    assert store.owner(eid) is None and np.isnan(store['pos'][eid]).all()
+    assert Drone((7, 7))._eid == eid
+
+
+def test_bulk_operations(store):
+    drones = [Drone((i * 10, 0)) for i in range(5)]
+    for d in drones:
+        d.velocity = (1, 1)
+    assert (positions(drones) == store.gather('pos', drones)).all()
+    assert set(store.within((0, 0), 15)) == set(drones[:2])
+    store.integrate('pos', 'velocity', .5)
+    assert drones[2].pos == (20.5, .5)
+    store.scatter('hull', drones, [5] * 5)
+    assert drones[4].hull == 5
+    with pytest.raises(ComponentStore.Error):
+        store.ids([Drone()])
+
+
+def test_pickle(store):
+    d = Drone((1, 2))
+    d.kills = 3
+    copy = pickle.loads(pickle.dumps(d))
+    assert copy._eid != d._eid and (copy.pos, copy.kills) == ((1., 2.), 3)
+    assert "_eid" not in vars(pickle.loads(pickle.dumps(Drone())))
@@ -0,0 +1,21 @@
+from ai.command import SIGNALLED
+from agents import Fleet, Player
+
+
+def test_group_command():
+    p = Player()
+    fleets = [Fleet() for _ in range(5)]
+    group = p.emit_group_command(fleets, Fleet.goto, SIGNALLED, (3, 4))
+    assert list(p.commands.outgoing) == [group] and len(group) == 5
+    assert all(len(f.commands.incoming) == 1 for f in fleets)
+    for f in fleets[:4]:
+        f.update()
+    assert group.executed == 4 and group.finished == 0 and group in p.commands.outgoing
+    fleets[4].update()
+    assert not p.commands.outgoing # everybody is on it
+    for f in fleets[:3]:
+        f.arrived()
+    assert group.finished == 3 and group.pending == 2 and not group.is_done
+    for f in fleets[3:]:
+        f.arrived()
+    assert group.is_done and all(f.goingto == (3, 4) and f.executing is None for f in fleets)
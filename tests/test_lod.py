@@ -0,0 +1,74 @@
+import pytest
+import settings
+from ai.behaviours.behaviour import Behaviour, mark
+from ai.command import ControllableObject
+from ai.lod import LevelOfDetail, view_radius
+from ai.scheduler import Scheduler
+
+
+class AIPlayerBehaviour(Behaviour):
+    _agentclass = 'AIPlayer'
+
+
+class Patrolling(AIPlayerBehaviour):
+    _lod_summary = 'summary'
+
+    @mark.transition(post='patrol', root=True)
+    def patrol(self):
+        self.agent.steps += 1
+
+    def summary(self):
+        self.agent.summaries += 1
+
+
+class AIPlayer(ControllableObject):
+    _timers = {}
+
+    def __init__(self, x):
+        super().__init__()
+        self.pos = (x, 0)
+        self.steps = self.summaries = 0
+
+
+@pytest.fixture
+def world(monkeypatch):
+    monkeypatch.setattr(settings, 'lod_tiers', ((1, 1), (2, 4), (None, 16)))
+    return Scheduler(budget=float('inf'))
+
+
+def test_tiers(world):
+    r = view_radius()
+    viewer, near, mid, far = (world.add(AIPlayer(x)) for x in (0, r / 2, r * 1.5, r * 10))
+    lod = LevelOfDetail(world, [viewer])
+    assert [lod.tier_of(a) for a in (viewer, near, mid, far)] == [0, 0, 1, 2]
+    world.run(64)
+    assert viewer.steps == near.steps == 64
+    assert mid.summaries == 16 and mid.steps == 0
+    assert far.summaries == 4
+
+    far.pos = (r / 4, 0) # comes near: full fidelity again, at once
+    world.spatial.refresh()
+    lod.update()
+    world.run(2)
+    assert lod.tier_of(far) == 0 and far.steps >= 1
+    lod.stop()
+    world.run(4)
+    assert mid.steps == 4
+
+
+def test_hysteresis_and_admission(world):
+    r = view_radius()
+    viewer = world.add(AIPlayer(0))
+    lod = LevelOfDetail(world, [viewer])
+    border = world.add(AIPlayer(r * 1.05))
+    assert lod.tier_of(border) == 1 # admitted into its tier
+    border.pos = (r * .9, 0)
+    world.spatial.refresh()
+    lod.update()
+    assert lod.tier_of(border) == 0
+    border.pos = (r * 1.05, 0) # not far enough to drop back
+    world.spatial.refresh()
+    lod.update()
+    assert lod.tier_of(border) == 0
+    world.remove(border)
+    assert border not in lod.tier
@@ -0,0 +1,56 @@
+import logging
+import pytest
+from logger import getLogger, start_async_logging, stop_async_logging
+
+
+class Expensive:
+    formatted = 0
+
+    def __str__(self):
+        Expensive.formatted += 1
+        return 'expensive'
+
+
+class Capture(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+@pytest.fixture
+def log():
+    log = getLogger('test_logger_module')
+    handler = Capture()
+    log.logger.addHandler(handler)
+    yield log, handler
+    log.logger.removeHandler(handler)
+
+
+def test_disabled_calls_do_not_format(log):
+    log, handler = log
+    log._setLevel(logging.INFO)
+    Expensive.formatted = 0
+    log.debug('costly:', Expensive())
+    assert Expensive.formatted == 0 and handler.messages == []
+    log.info('costly:', Expensive())
+    assert Expensive.formatted == 1 and handler.messages == ['costly: expensive']
+
+
+def test_async_logging():
+    root = logging.getLogger()
+    handler = Capture()
+    root.addHandler(handler)
+    try:
+        listener = start_async_logging()
+        assert start_async_logging() is listener
+        assert handler not in root.handlers
+        log = getLogger('test_async_logging')
+        log.warning('off', 'thread')
+        stop_async_logging()
+        assert handler in root.handlers
+        assert 'off thread' in handler.messages
+    finally:
+        root.removeHandler(handler)
@@ -0,0 +1,72 @@
+import random
+import settings
+from ai.behaviours.behaviour import Behaviour, mark
+from ai.behaviours.ship_b import aggression
+from ai.memo import memo, memoized
+from benchmarks.stubs import StubShip
+
+
+class Sensor:
+    def __init__(self):
+        self.calls = 0
+
+    @memoized
+    def scan(self, radius=1):
+        self.calls += 1
+        return self.calls * radius
+
+
+def test_cached_within_tick():
+    s = Sensor()
+    with memo.tick():
+        assert s.scan() == s.scan() == 1
+        assert s.scan(2) == s.scan(2) == 4
+        assert s.calls == 2
+    with memo.tick(): # a new tick: recomputed
+        assert s.scan() == 3
+    assert s.scan() == 4 and s.scan() == 5 # not cached outside of ticks
+    hits, misses = memo.stats['Sensor.scan']
+    assert hits >= 2 and misses >= 3
+
+
+def test_disabled(monkeypatch):
+    monkeypatch.setattr(memo, 'enabled', False)
+    s = Sensor()
+    with memo.tick():
+        assert s.scan() != s.scan()
+
+
+def test_memoize_predicates(monkeypatch):
+    monkeypatch.setattr(settings, 'memoize_predicates', True)
+
+    class MemoProbeBehaviour(Behaviour):
+        _agentclass = 'MemoProbe'
+
+    class Probing(MemoProbeBehaviour):
+        @mark.transition(pre='ready', post='probe', root=True)
+        @mark.transition(pre='fresh', post='probe')
+        def probe(self):
+            pass
+
+        def ready(self):
+            return True
+
+        @mark.volatile
+        def fresh(self):
+            return True
+
+    assert getattr(Probing.ready, '_memoized', False)
+    assert not getattr(Probing.fresh, '_memoized', False)
+
+
+def test_range_is_computed_once_per_choice(monkeypatch):
+    calls = []
+    fraction = aggression.fraction_in_range
+    monkeypatch.setattr(aggression, 'fraction_in_range', lambda *args: calls.append(1) or fraction(*args))
+    rng = random.Random(0)
+    ship, target = StubShip((0, 0), rng), StubShip((500, 0), rng)
+    b = aggression.ApproachAndAttack(ship, target=target)
+    with memo.tick():
+        b.step() # choosetarget
+        b.step() # enemyoutofrange and enemyinrange: one range computation
+    assert len(calls) == 1 and b.node == 'approach'
@@ -0,0 +1,73 @@
+import pytest
+from ai.behaviours.behaviour import Behaviour, mark
+from ai.profiling import Histogram, Profiler, profiler
+
+
+class Fork(Behaviour):
+    @mark.transition(post='left', pre='go_left', root=True)
+    @mark.transition(post='right', pre='go_right')
+    def start(self):
+        pass
+
+    @mark.transition(post=None)
+    def left(self):
+        pass
+
+    @mark.transition(post=None)
+    def right(self):
+        pass
+
+    def go_left(self):
+        return 1
+
+    def go_right(self):
+        return 0
+
+
+@pytest.fixture
+def profiling():
+    profiler.reset()
+    profiler.enable()
+    yield profiler
+    profiler.disable()
+    profiler.reset()
+
+
+def test_histogram():
+    h = Histogram()
+    for v in [1, 2, 3, 100, 1000]:
+        h.add(v)
+    assert h.count == 5 and h.total == 1106 and h.max == 1000
+    assert h.quantile(.5) == 4 # 3 is in the [2, 4) bucket
+    assert h.quantile(1) == 1000
+    assert Histogram().quantile(.5) == 0
+
+
+def test_disabled_records_nothing():
+    assert not profiler.enabled
+    b = Fork(None)
+    b.step()
+    assert profiler.stats == {}
+
+
+def test_profiled_step(profiling):
+    b = Fork(None)
+    b.step()
+    b.step()
+    assert b.node == 'left'
+    b.step() # exits the graph
+    snap = profiling.snapshot()['Fork']
+    assert snap['step'][None]['count'] == 3
+    assert snap['action']['start']['count'] == 1
+    assert snap['action']['left']['count'] == 1
+    assert snap['transition']['start']['count'] == 1
+    assert snap['pre'].keys() == {'go_left', 'go_right'}
+
+    top = profiling.top(2)
+    assert len(top) == 2 and all(kind in ('action', 'transition') for (_, kind, _), _ in top)
+    assert 'Fork' in profiling.report()
+
+
+def test_profiler_is_independent():
+    p = Profiler()
+    assert not p.enabled and p.snapshot() == {}
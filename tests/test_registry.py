@@ -0,0 +1,81 @@
+import sys
+import textwrap
+import pytest
+import settings
+from ai.behaviours.behaviour import Behaviour, get_behaviours, mark
+
+
+class Drone:
+    pass
+
+
+class DroneBehaviour(Behaviour):
+    _agentclass = 'Drone'
+
+
+class Patrol(DroneBehaviour):
+    @mark.action
+    def patrol(self):
+        pass
+
+
+def test_registry():
+    assert get_behaviours(Drone) == (Patrol,)
+    assert get_behaviours(Drone) is get_behaviours(Drone) # cached
+
+
+def test_new_subclasses_invalidate_the_cache():
+    before = get_behaviours(Drone)
+
+    class Guard(DroneBehaviour):
+        @mark.action
+        def guard(self):
+            pass
+
+    assert get_behaviours(Drone) == before + (Guard,)
+
+
+def test_modules_are_imported_lazily(tmp_path, monkeypatch):
+    (tmp_path / 'lazy_b.py').write_text(textwrap.dedent("""
+        from ai.behaviours import Behaviour, mark
+
+        class LazyBehaviour(Behaviour):
+            _agentclass = 'Lazy'
+
+        class Idle(LazyBehaviour):
+            @mark.action
+            def idle(self):
+                pass
+        """))
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setitem(settings.behaviour_modules, 'Lazy', ['lazy_b'])
+
+    class Lazy:
+        pass
+
+    assert 'lazy_b' not in sys.modules
+    assert [b.__name__ for b in get_behaviours(Lazy)] == ['Idle']
+    assert 'lazy_b' in sys.modules
+
+
+def test_failed_import_is_retried(tmp_path, monkeypatch):
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setitem(settings.behaviour_modules, 'Flaky', ['flaky_b'])
+
+    class Flaky:
+        pass
+
+    with pytest.raises(ImportError):
+        get_behaviours(Flaky)
+    (tmp_path / 'flaky_b.py').write_text(textwrap.dedent("""
+        from ai.behaviours import Behaviour, mark
+
+        class FlakyBehaviour(Behaviour):
+            _agentclass = 'Flaky'
+
+        class Wait(FlakyBehaviour):
+            @mark.action
+            def wait(self):
+                pass
+        """))
+    assert [b.__name__ for b in get_behaviours(Flaky)] == ['Wait']
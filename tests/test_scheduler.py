@@ -0,0 +1,102 @@
+import random
+import pytest
+import settings
+from ai.scheduler import Scheduler, TimerWheel, Timer
+
+
+@pytest.mark.parametrize('bits, horizon', [((8, 6, 6, 6), 50000), ((2, 2, 2), 200)])
+def test_timers_fire_on_time(bits, horizon):
+    # (2, 2, 2) spans 64 ticks: also covers timers parked beyond the wheel
+    wheel = TimerWheel(bits)
+    rng = random.Random(bits[0])
+    fired = {}
+    timers = []
+    for i in range(500):
+        t = wheel.schedule(Timer(i), rng.randrange(1, horizon))
+        timers.append(t)
+    expected = {t.callback: t.expires for t in timers}
+
+    while wheel.now < horizon:
+        for t in wheel.advance():
+            fired[t.callback] = wheel.now
+    assert fired == expected
+
+
+def test_cancelled_timer_does_not_fire():
+    wheel = TimerWheel()
+    t = wheel.schedule(Timer('x'), 300)
+    t.cancel()
+    assert not any(wheel.advance() for _ in range(400))
+
+
+class Agent:
+    _timers = {'update': None, 'scan': 'scan_rate', 'mine': 'mining_update_timer'}
+
+    def __init__(self):
+        self.behaviours = []
+        self.updates = self.scans = 0
+
+    def update(self):
+        self.updates += 1
+
+    def scan(self):
+        self.scans += 1
+
+
+def test_jobs_follow_settings_timers():
+    s = Scheduler(fps=100, budget=1)
+    agents = [s.add(Agent()) for _ in range(10)]
+    assert all(a.world is s for a in agents)
+    s.run(1000) # 10 seconds
+    for a in agents:
+        assert a.updates == 1000
+        assert a.scans == 10000 // settings.timers['scan_rate']
+
+
+def test_budget_defers_jobs():
+    s = Scheduler(fps=100, budget=0)
+    agents = [s.add(Agent()) for _ in range(10)]
+    assert s.tick() == 1 # always makes progress
+    s.run(100)
+    assert sum(a.updates + a.scans for a in agents) == 101
+
+
+def test_remove():
+    s = Scheduler(budget=1)
+    a = s.add(Agent())
+    s.remove(a)
+    s.run(10)
+    assert a.updates == 0 and a.world is None
+
+
+def test_spatial_index_follows_moves():
+    from ai.command import ControllableObject
+
+    class Mover(ControllableObject):
+        def __init__(self, pos):
+            super().__init__()
+            self.pos = pos
+
+    s = Scheduler(fps=100, budget=1)
+    reported, unreported = s.add(Mover((0, 0))), s.add(Mover((0, 0)))
+    s.run(1)
+    reported.pos = unreported.pos = (5000, 5000)
+    reported.moved()
+    s.run(1)
+    assert s.spatial.within((5000, 5000), 1) == [reported] # (no per-frame refresh)
+    s.run(s.ticks('spatial_refresh'))
+    assert set(s.spatial.within((5000, 5000), 1)) == {reported, unreported}
+
+
+def test_failing_job_keeps_its_timer(caplog):
+    class Flaky(Agent):
+        def update(self):
+            super().update()
+            if self.updates == 2:
+                raise ValueError('boom')
+
+    s = Scheduler(fps=100, budget=1)
+    a, b = s.add(Flaky()), s.add(Agent())
+    s.run(5)
+    assert a.updates == b.updates == 5
+    assert "ValueError('boom')" in caplog.text
@@ -0,0 +1,57 @@
+import pytest
+import settings
+from ai.scheduler import Scheduler
+from ai.sensors import Sensors
+
+
+class Probe:
+    _timers = {}
+    behaviours = ()
+    scan_range = None
+
+    def __init__(self, x, y=0):
+        self.pos = (x, y)
+
+
+@pytest.fixture
+def world(monkeypatch):
+    monkeypatch.setattr(settings, 'scan_range', 100)
+    monkeypatch.setattr(settings, 'tracking_timeout', 2)
+    monkeypatch.setitem(settings.timers, 'scan_rate', 1000 / settings.FPS) # a scan per tick
+    return Scheduler(budget=float('inf'))
+
+
+def test_tracking_timeout(world):
+    a, b, far = (world.add(Probe(x)) for x in (0, 50, 500))
+    sensors = Sensors(world)
+    world.run(1)
+    assert sensors.contacts(a) == [b] and sensors.contacts(far) == []
+    b.pos = (300, 0) # out of range: still tracked for a scan
+    world.spatial.update(b) # (what ControllableObject.moved does)
+    world.run(1)
+    assert sensors.contacts(a) == [b]
+    world.run(1)
+    assert sensors.contacts(a) == []
+    world.remove(a)
+    assert a not in sensors.tracks
+
+
+def test_shared_contacts(world):
+    left, right = world.add(Probe(0)), world.add(Probe(150))
+    enemy_left, enemy_right = world.add(Probe(-80)), world.add(Probe(230))
+    sensors = Sensors(world)
+    sensors.share([left, right])
+    world.run(1)
+    assert sensors.contacts(left) == sensors.contacts(right)
+    assert set(sensors.contacts(left)) == {enemy_left, enemy_right} # but not themselves
+    sensors.stop()
+    assert world.sensors is None
+
+
+def test_within_any(world):
+    probes = [world.add(Probe(x, y)) for x in range(0, 1000, 40) for y in range(0, 1000, 40)]
+    world.spatial.refresh()
+    points, radius = [(100, 100), (700, 300)], 90
+    expected = {p for p in probes for q in points if world.spatial.within(q, radius).count(p)}
+    assert set(world.spatial.within_any(points, radius)) == expected
+    assert probes[0] not in world.spatial.within_any(points, radius, exclude=[probes[0]])
@@ -0,0 +1,129 @@
+import pickle
+import pytest
+from ai.behaviours.behaviour import Behaviour, mark
+from ai.command import ControllableObject, SIGNALLED
+from ai.sharding import RemoteAgent, ShardedWorld, Strips
+
+
+class ColonyFleetBehaviour(Behaviour):
+    _agentclass = 'ColonyFleet'
+
+
+class Counting(ColonyFleetBehaviour):
+    steps = 0
+
+    @mark.transition(post='count', root=True)
+    def count(self):
+        self.steps += 1
+
+
+class ColonyFleet(ControllableObject):
+    """drifts by `velocity` every frame"""
+    _timers = {'update': None, 'drift': None}
+
+    def __init__(self, pos, velocity=(0, 0)):
+        super().__init__()
+        self.pos = pos
+        self.velocity = velocity
+        self.log = []
+        self.polls = 0
+
+    def drift(self):
+        self.pos = (self.pos[0] + self.velocity[0], self.pos[1] + self.velocity[1])
+
+    def note(self, value):
+        self.log.append(value)
+
+    def slowly(self):
+        """completion check: done every third poll"""
+        self.polls += 1
+        return self.polls % 3 == 0
+
+
+class Player(ControllableObject):
+    """sends one of its orders per frame"""
+    _timers = {'update': None, 'order': None}
+
+    def __init__(self, target, orders, check=None, coalesce=None):
+        super().__init__()
+        self.target = target
+        self.orders = list(orders)
+        self.check = check
+        self.coalesce = coalesce
+
+    def order(self):
+        if self.orders:
+            check = getattr(self.target, self.check) if self.check else None
+            self.emit_command(self.target.note, check, self.orders.pop(0), coalesce=self.coalesce)
+
+
+def test_strips():
+    strips = Strips(3, 100)
+    assert [strips((x, 0)) for x in (-5, 0, 99, 100, 250, 1000)] == [0, 0, 0, 1, 2, 2]
+
+
+def test_signalled_pickles_to_singleton():
+    assert pickle.loads(pickle.dumps(SIGNALLED)) is SIGNALLED
+
+
+def _world(processes):
+    world = ShardedWorld(Strips(2, 100), processes=processes, budget=float('inf'))
+    far = ColonyFleet((150, 0))
+    player = Player(far, ['a', 'b'])
+    world.add(far)
+    world.add(player, shard=0)
+    return world, player, far
+
+
+@pytest.mark.parametrize('processes', [False, True])
+def test_cross_shard_commands(processes):
+    world, player, far = _world(processes)
+    with world:
+        world.run(1) # player sends 'a'
+        assert world.collect()[far.uid].log == []
+        world.run(1) # 'a' delivered and executed; player sends 'b'
+        agents = world.collect()
+        assert agents[far.uid].log == ['a']
+        assert len(agents[player.uid].commands.outgoing) == 2 # not notified yet, of 'a'
+        world.run(3)
+        agents = world.collect()
+    assert agents[far.uid].log == ['a', 'b']
+    assert len(agents[player.uid].commands.outgoing) == 0
+    assert isinstance(agents[player.uid].target, (RemoteAgent, ColonyFleet))
+
+
+@pytest.mark.parametrize('processes', [False, True])
+def test_cross_shard_coalescing(processes):
+    world = ShardedWorld(Strips(2, 100), processes=processes, budget=float('inf'))
+    far = ColonyFleet((150, 0))
+    player = Player(far, ['a', 'b', 'c', 'd'], check='slowly', coalesce='orders')
+    world.add(far)
+    world.add(player, shard=0)
+    with world:
+        world.run(10) # 'b' and 'c' queue up behind 'a', and are superseded there in turn
+        agents = world.collect()
+    assert agents[far.uid].log == ['a', 'd']
+    assert len(agents[player.uid].commands.outgoing) == 0
+
+
+@pytest.mark.parametrize('processes', [False, True])
+def test_migration_keeps_queues_and_behaviours(processes):
+    world = ShardedWorld(Strips(2, 100), processes=processes, budget=float('inf'))
+    mover = ColonyFleet((90, 0), velocity=(5, 0))
+    player = Player(mover, ['a', 'b', 'c', 'd'], check='slowly')
+    world.add(mover)
+    world.add(player, shard=0)
+    with world:
+        world.run(3) # mover crosses x=100 at the end of the 2nd frame
+        assert world.directory[mover.uid] == 1
+        agents = world.collect()
+        moved = agents[mover.uid]
+        assert len(moved.commands.incoming) + (moved.executing is not None) >= 1
+        steps = moved.behaviours[0].steps
+        assert steps >= 1
+        world.run(20)
+        agents = world.collect()
+    moved = agents[mover.uid]
+    assert moved.log == ['a', 'b', 'c', 'd']
+    assert moved.behaviours[0].steps > steps
+    assert len(agents[player.uid].commands.outgoing) == 0
@@ -0,0 +1,136 @@
+import os
+import pytest
+from ai.behaviours.behaviour import Behaviour, mark
+from ai.command import ControllableObject, SIGNALLED
+from ai.snapshot import Checkpoints, Snapshot, restore
+
+
+class ColonyBehaviour(Behaviour):
+    _agentclass = 'Colony'
+
+
+class Growing(ColonyBehaviour):
+    population = 0
+
+    @mark.transition(post='shrink', root=True)
+    def grow(self):
+        self.population += 1
+
+    @mark.transition(post='grow')
+    def shrink(self):
+        pass
+
+
+class Sub(Behaviour):
+    target = None
+
+    @mark.transition(post='wait', root=True)
+    def wait(self):
+        pass
+
+
+class Colony(ControllableObject):
+    _timers = {'update': None}
+
+    def __init__(self):
+        super().__init__()
+        self.log = []
+
+    def note(self, *values, tag=None):
+        self.log.append((values, tag))
+
+    def ready(self):
+        return False
+
+
+def _colonies():
+    a, b, c = Colony(), Colony(), Colony()
+    a.emit_command(b.note, b.ready, 1, (2, 3), tag={'x': [a]})
+    a.emit_command(c.note, SIGNALLED, 'hi')
+    c.execute_next_command() # c.executing, SIGNALLED
+    b.behaviours[0].population = 5
+    b.behaviours[0].step()
+    sub = Sub(b)
+    sub.target = c
+    b.behaviours[0].delegate(sub)
+    return [a, b, c]
+
+
+def _state(agents):
+    return [(a.uid, [(cmd.source.uid, cmd.subject.uid, cmd.action.__name__, cmd.args, cmd.priority)
+                     for q in a.commands for cmd in q],
+             a.executing and a.executing.action.__name__,
+             [(type(b).__name__, b.state, vars(b).get('population'), b.trace is not None and list(b.trace),
+               type(b.sub).__name__, b.sub and b.sub.target.uid) for b in a.behaviours]) for a in agents]
+
+
+def test_full_snapshot_roundtrip(tmp_path):
+    agents = _colonies()
+    expected = _state(agents)
+    checkpoints = Checkpoints(str(tmp_path))
+    path = checkpoints.save(agents)
+    with Snapshot(path) as snap:
+        assert snap.full and len(snap.agents) == 3 and len(snap.commands) == 3 # a -> b on both sides, and c's
+
+    for agent in agents: # mess things up
+        for q in agent.commands:
+            q.clear()
+        agent.executing = None
+        agent.behaviours[0].sub = None
+        agent.behaviours[0].population = 0
+    checkpoints.restore(agents)
+    assert _state(agents) == expected
+
+    a, b, c = agents
+    cmd = b.commands.incoming[0]
+    assert cmd is a.commands.outgoing[0] # one command, on both sides
+    assert cmd.kwargs == {'tag': {'x': [a]}} and cmd.completion_check == b.ready
+    assert c.executing.completion_check is SIGNALLED
+    assert b.behaviours[0].sub._parent is b.behaviours[0]
+    cmd.execute()
+    assert b.log == [((1, (2, 3)), {'x': [a]})]
+
+
+def test_deltas_only_hold_changed_agents(tmp_path):
+    agents = _colonies()
+    checkpoints = Checkpoints(str(tmp_path))
+    checkpoints.save(agents)
+    path = checkpoints.save(agents)
+    with Snapshot(path) as snap:
+        assert not snap.full and len(snap.agents) == 0
+
+    a, b, c = agents
+    b.behaviours[0].sub.halt()
+    b.behaviours[0].step()
+    path = checkpoints.save(agents[:2]) # c is gone
+    with Snapshot(path) as snap:
+        assert snap.agents['uid'].tolist() == [b.uid] and snap.removed.tolist() == [c.uid]
+    expected = _state(agents[:2])
+
+    b.behaviours[0].population = 0
+    assert checkpoints.restore(agents) == agents[:2]
+    assert _state(agents[:2]) == expected
+    assert sorted(os.listdir(tmp_path)) == ['000000.full.snap', '000001.delta.snap', '000002.delta.snap']
+
+
+def test_full_every(tmp_path):
+    checkpoints = Checkpoints(str(tmp_path), full_every=2)
+    paths = [checkpoints.save(_colonies()) for _ in range(3)]
+    assert [p.split('.')[-2] for p in paths] == ['full', 'delta', 'full']
+
+
+def test_not_a_snapshot(tmp_path):
+    path = tmp_path / 'junk'
+    path.write_bytes(b'\0' * 64)
+    with pytest.raises(Snapshot.Error):
+        Snapshot(str(path))
+    assert restore([], []) == []
+
+
+def test_close_with_views_held(tmp_path):
+    path = Checkpoints(str(tmp_path)).save(_colonies())
+    snap = Snapshot(path)
+    uids = snap.agents['uid'] # a view on the mapping, still held
+    snap.close()
+    assert snap._map is None and len(uids) == 3
+    snap.close() # (again: no-op)
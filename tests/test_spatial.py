@@ -0,0 +1,65 @@
+import math
+import random
+import pytest
+import settings
+from ai.spatial import SpatialIndex
+
+
+class Thing:
+    def __init__(self, pos):
+        self.pos = pos
+
+
+@pytest.fixture
+def things():
+    rng = random.Random(0)
+    return [Thing((rng.uniform(-500, 500), rng.uniform(-500, 500))) for _ in range(300)]
+
+
+@pytest.fixture
+def index(things):
+    index = SpatialIndex(cell_size=50)
+    index.rebuild(things)
+    return index
+
+
+def brute_nearest(things, pos, k, radius=None, exclude=None):
+    d = lambda t: math.hypot(t.pos[0] - pos[0], t.pos[1] - pos[1])
+    ok = [t for t in things if t is not exclude and (radius is None or d(t) <= radius)]
+    return sorted(ok, key=d)[:k]
+
+
+@pytest.mark.parametrize('k', [1, 5])
+@pytest.mark.parametrize('pos', [(0, 0), (480, -490), (3000, 3000)])
+def test_nearest(index, things, k, pos):
+    assert index.nearest(pos, k) == brute_nearest(things, pos, k)
+
+
+def test_nearest_exclude_radius_predicate(index, things):
+    me = things[0]
+    assert index.nearest(me.pos, exclude=me) == brute_nearest(things, me.pos, 1, exclude=me)
+    assert index.nearest(me.pos, 100, radius=60) == brute_nearest(things, me.pos, 100, radius=60)
+    odd = index.nearest(me.pos, 3, predicate=lambda t: things.index(t) % 2)
+    assert all(things.index(t) % 2 for t in odd) and len(odd) == 3
+
+
+def test_within(index, things):
+    found = index.within((10, 10), 120)
+    assert set(found) == set(brute_nearest(things, (10, 10), len(things), radius=120))
+
+
+def test_moves(index, things, monkeypatch):
+    t = things[0]
+    t.pos = (10000, 10000)
+    index.refresh()
+    assert index.nearest((9999, 9999)) == [t]
+    monkeypatch.setattr(settings, 'rtree_force_regen', True)
+    t.pos = (-10000, 10000)
+    index.refresh()
+    assert index.nearest((-9999, 9999)) == [t]
+    index.remove(t)
+    assert t not in index and len(index) == len(things) - 1
+
+
+def test_empty():
+    assert SpatialIndex().nearest((0, 0)) == []
@@ -0,0 +1,75 @@
+import pytest
+import settings
+from ai.command import ControllableObject, SIGNALLED
+from ai.scheduler import Scheduler
+from ai.telemetry import Telemetry, telemetry as global_telemetry
+from agents import Fleet, Player
+
+
+@pytest.fixture
+def telemetry():
+    t = Telemetry()
+    t.enable()
+    yield t
+    t.disable()
+
+
+def test_latencies_by_source(telemetry):
+    player, fleet = Player(), Fleet()
+    for pos in range(3):
+        player.emit_command(fleet.goto, None, pos)
+    cmd = player.emit_command(fleet.goto, SIGNALLED, 9)
+    for _ in range(4):
+        fleet.update()
+    cmd.resolve()
+    fleet.update()
+    snap = telemetry.snapshot([player, fleet])
+    assert snap['latency']['total']['player']['count'] == 4
+    assert set(snap['latency']) == {'queued', 'execute', 'complete', 'total'}
+    assert snap['depth'] == {'incoming': {'total': 0, 'max': 0}, 'outgoing': {'total': 0, 'max': 0}}
+    assert cmd.stamps is None
+
+
+def test_disabled_costs_nothing(telemetry):
+    telemetry.disable()
+    player, fleet = Player(), Fleet()
+    cmd = player.emit_command(fleet.goto, None, 1)
+    assert cmd.stamps is None
+    fleet.update()
+    assert not telemetry.stats
+
+
+def test_prometheus_dump(telemetry, tmp_path):
+    player, fleet = Player(), Fleet()
+    player.emit_command(fleet.goto, None, 1)
+    player.emit_command(fleet.goto, None, 2)
+    fleet.update()
+    fleet.update() # (completes the first one)
+    path = tmp_path / 'metrics.prom'
+    telemetry.dump(str(path), [player, fleet])
+    lines = path.read_text().splitlines()
+    assert 'ai_command_latency_seconds_count{stage="queued",source="player"} 1' in lines
+    assert 'ai_command_latency_seconds_bucket{stage="queued",source="player",le="+Inf"} 1' in lines
+    buckets = [int(line.split()[-1]) for line in lines
+               if line.startswith('ai_command_latency_seconds_bucket{stage="queued",source="player"')]
+    assert len(buckets) == 65 and buckets == sorted(buckets) # (every bucket, cumulative)
+    assert 'ai_command_queue_depth{queue="outgoing"} 0' in lines
+    assert 'ai_command_queue_depth_max{queue="incoming"} 0' in lines
+
+
+def test_enabled_by_settings(monkeypatch):
+    monkeypatch.setattr(settings, 'command_telemetry', True)
+    world = Scheduler()
+    try:
+        assert ControllableObject.telemetry is global_telemetry and global_telemetry.world is world
+    finally:
+        global_telemetry.disable()
+        global_telemetry.watch(None)
+
+
+def test_synchronous_completion(telemetry):
+    player, fleet = Player(), Fleet()
+    cmd = player.emit_command(fleet.dock, SIGNALLED)
+    fleet.update()
+    assert fleet.executing is None and cmd.stamps is None
+    assert telemetry.snapshot([player, fleet])['latency']['total']['player']['count'] == 1
@@ -0,0 +1,84 @@
+import json
+import pytest
+import settings
+from ai.behaviours.behaviour import Behaviour, mark
+from ai.behaviours.trace import TraceBuffer, export_traces, read_binary_traces
+
+
+class PingPong(Behaviour):
+    @mark.transition(post='pong', root=True)
+    def ping(self):
+        pass
+
+    @mark.transition(post='ping')
+    def pong(self):
+        pass
+
+
+class Rare(PingPong):
+    _trace_rate = 0
+
+
+class Agent:
+    uid = 7
+
+
+def test_ring_buffer():
+    t = TraceBuffer(4)
+    for i in range(3):
+        t.append(i)
+    assert list(t) == [0, 1, 2]
+    for i in range(3, 10):
+        t.append(i)
+    assert list(t) == [6, 7, 8, 9] and len(t) == 4 and t.total == 10
+    assert t.recent(2) == [8, 9]
+
+
+def test_traces_are_bounded(monkeypatch):
+    monkeypatch.setattr(settings, 'trace_capacity', 8)
+    b = PingPong(None)
+    for _ in range(100):
+        b.step()
+    assert len(b.trace) == 8 and b.trace.total == 100
+    assert [b.tm.trace_ids[i] for i in b.trace.recent(2)] == ['ping', 'pong']
+
+
+def test_sampling():
+    b = Rare(None)
+    b.step()
+    assert b.trace is None
+
+
+@pytest.mark.parametrize('fmt', ['jsonl', 'bin'])
+def test_export(tmp_path, fmt):
+    b = PingPong(Agent())
+    for _ in range(3):
+        b.step()
+    path = tmp_path / f'traces.{fmt}'
+    assert export_traces(path, [b, Rare(None)], fmt=fmt) == 1
+    if fmt == 'jsonl':
+        traces = [json.loads(line) for line in path.read_text().splitlines()]
+    else:
+        traces = read_binary_traces(path)
+    assert traces == [{'behaviour': f'{__name__}:PingPong', 'agent': 7, 'total': 3, 'nodes': ['ping', 'pong', 'ping']}]
+
+
+@pytest.mark.parametrize('fmt', ['jsonl', 'bin'])
+def test_export_same_class_names(tmp_path, fmt):
+    class PingPong(Behaviour): # (as if per ship type, in another module)
+        @mark.transition(post='pang', root=True)
+        def pang(self):
+            pass
+
+    PingPong.__module__ = 'elsewhere'
+    ours, theirs = globals()['PingPong'](Agent()), PingPong(Agent())
+    ours.step()
+    theirs.step()
+    path = tmp_path / f'traces.{fmt}'
+    export_traces(path, [ours, theirs], fmt=fmt)
+    if fmt == 'jsonl':
+        traces = [json.loads(line) for line in path.read_text().splitlines()]
+    else:
+        traces = read_binary_traces(path)
+    assert [t['nodes'] for t in traces] == [['ping'], ['pang']]
+    assert traces[1]['behaviour'] == 'elsewhere:test_export_same_class_names.<locals>.PingPong'
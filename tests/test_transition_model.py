@@ -0,0 +1,110 @@
+import pytest
+import attr
+from ai.behaviours.behaviour import Behaviour, mark, EXIT
+
+
+@attr.s
+class Fork(Behaviour):
+    _p = attr.ib(default=True)
+    p = property(lambda self: self._p)
+    q = property(lambda self: not self._p)
+
+    @mark.transition(post='b', pre='p') # if p holds, next behaviour is b; else is c
+    @mark.transition(post='c', pre='q')
+    def a(self):
+        pass
+
+    @mark.action
+    def b(self):
+        pass
+
+    @mark.action
+    def c(self):
+        pass
+
+
+class Loop(Behaviour):
+    @mark.transition(post='b', root=True)
+    def a(self):
+        pass
+
+    @mark.transition(post='a')
+    def b(self):
+        pass
+
+
+def test_compiled_graph():
+    tm = Fork.tm
+    assert tm.names == ('a', 'b', 'c')
+    assert tm.root == 0
+    assert tm.leaves == (1, 2)
+    assert [post for _, _, post in tm.edges[0]] == [1, 2]
+    assert tm.transitions['a'][0].post == 'b'
+    assert Loop.tm.root == 0 and Loop.tm.leaves == ()
+
+
+def test_graph_is_per_class():
+    assert Behaviour.tm.names == ()
+    assert Fork.tm is not Loop.tm
+
+
+def test_unknown_post():
+    with pytest.raises(TypeError):
+        class Bad(Behaviour):
+            @mark.transition(post='nowhere')
+            def a(self):
+                pass
+
+
+def test_two_roots():
+    with pytest.raises(TypeError):
+        class Bad(Behaviour):
+            @mark.transition(post='b', root=True)
+            def a(self):
+                pass
+
+            @mark.transition(post='a', root=True)
+            def b(self):
+                pass
+
+
+@pytest.mark.parametrize('p, node', [(True, 'b'), (False, 'c')])
+def test_step(p, node):
+    b = Fork(None, p)
+    b.step()
+    assert b.node == 'a'
+    b.step()
+    assert b.node == node
+    assert list(b.trace) == [Fork.tm.index['a']]
+    b.step() # leaf reached: leaves the graph
+    assert b.state == EXIT and b._halted
+
+
+def test_cycle_and_skip():
+    b = Loop(None)
+    assert [b.step() or b.node for _ in range(3)] == ['a', 'b', 'a']
+    b.skip('a')
+    b.step()
+    assert b.node == 'a'
+
+
+def test_delegation():
+    parent, child = Loop(None), Fork(None)
+    parent.step()
+    parent.delegate(child)
+    parent.step()
+    assert child.node == 'a' and parent.node == 'a'
+    parent.step(), parent.step() # child to b, then out
+    assert child._halted
+    parent.step()
+    assert parent.node == 'b'
+
+
+def test_validation():
+    class NoRoot(Loop):
+        a = mark.transition(post='b')(Loop.a.__wrapped__)
+
+    for invalid in (Behaviour, NoRoot):
+        with pytest.raises(Behaviour.ValidationError):
+            invalid(None).validate()
+    Fork(None).validate()